@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: route assignment with pairwise haversine calls vs. a
+vectorized NumPy distance matrix and spatial-index nearest-route lookups.
+
+Run from the backend directory:
+    python benchmarks/distance_matrix_bench.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from routing import (  # noqa: E402
+    haversine_distance,
+    distance_matrix,
+    greedy_assign,
+    route_distance,
+)
+
+ORDER_COUNTS = [100, 1000, 5000]
+ORDERS_PER_RIDER = 10
+MUMBAI_CENTER = (19.0760, 72.8777)
+
+
+def make_points(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        MUMBAI_CENTER[0] + rng.normal(0, 0.05, n),
+        MUMBAI_CENTER[1] + rng.normal(0, 0.05, n),
+    ])
+
+
+def legacy_optimize(points, num_riders, max_orders):
+    """The previous implementation: pure-Python haversine inside nested loops"""
+    locs = [tuple(p) for p in points]
+    routes = [[] for _ in range(num_riders)]
+    for rider_idx in range(min(num_riders, len(locs))):
+        routes[rider_idx].append(rider_idx)
+
+    for order_idx in range(num_riders, len(locs)):
+        best_rider = 0
+        min_dist = float('inf')
+        for rider_idx in range(num_riders):
+            if len(routes[rider_idx]) >= max_orders:
+                continue
+            dist = haversine_distance(locs[order_idx], locs[routes[rider_idx][-1]])
+            if dist < min_dist:
+                min_dist = dist
+                best_rider = rider_idx
+        routes[best_rider].append(order_idx)
+
+    totals = []
+    for route in routes:
+        totals.append(sum(
+            haversine_distance(locs[route[i]], locs[route[i + 1]])
+            for i in range(len(route) - 1)
+        ))
+    return routes, totals
+
+
+def vectorized_optimize(points, num_riders, max_orders):
+    dist = distance_matrix(points)
+    routes = greedy_assign(points, num_riders, max_orders)
+    return routes, [route_distance(dist, r) for r in routes]
+
+
+def best_of(fn, *args, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    print(f"{'orders':>8} {'riders':>7} {'legacy ms':>11} {'numpy ms':>10} {'speedup':>8}")
+    for n in ORDER_COUNTS:
+        points = make_points(n)
+        num_riders = max(1, n // ORDERS_PER_RIDER)
+        max_orders = n // num_riders + 1
+
+        legacy_t, (legacy_routes, legacy_totals) = best_of(legacy_optimize, points, num_riders, max_orders)
+        numpy_t, (numpy_routes, numpy_totals) = best_of(vectorized_optimize, points, num_riders, max_orders)
+
+        # Both implementations must produce the same plan
+        assert legacy_routes == numpy_routes
+        assert np.allclose(legacy_totals, numpy_totals)
+
+        print(f"{n:>8} {num_riders:>7} {legacy_t * 1000:>11.1f} {numpy_t * 1000:>10.1f} "
+              f"{legacy_t / numpy_t:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Routing quality benchmark: every routing algorithm on synthetic city orders.
+
+Reports total km, the longest route (makespan, in km and estimated minutes),
+load balance and solve time, and compares quality against stored baselines
+in routing_baselines.json. Solve times are machine dependent and are shown
+for information only; km regressions beyond the tolerances are flagged.
+
+Run from the backend directory:
+    python benchmarks/routing_bench.py                 # compare with baselines
+    python benchmarks/routing_bench.py --check         # exit 1 on regression
+    python benchmarks/routing_bench.py --update-baselines
+    python benchmarks/routing_bench.py --sizes 100 1000
+    python benchmarks/routing_bench.py --objective makespan
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from routing import (  # noqa: E402
+    DEFAULT_TIME_BUDGET_MS,
+    ROUTING_ALGORITHMS,
+    ROUTING_OBJECTIVES,
+    distance_matrix,
+    estimate_duration_minutes,
+    route_distance,
+    solve_routes,
+)
+from synthetic_city import generate_city_orders  # noqa: E402
+
+BASELINES_PATH = Path(__file__).resolve().parent / "routing_baselines.json"
+ORDER_COUNTS = [100, 1000, 10000]
+ORDERS_PER_RIDER = 20
+SEED = 2024
+
+# Allowed quality drift before a result counts as a regression. Local search
+# is deadline-bound, so slower machines legitimately find slightly worse plans.
+TOTAL_KM_TOLERANCE = 0.03
+MAKESPAN_TOLERANCE = 0.10
+
+
+def scenario(n):
+    num_riders = max(1, n // ORDERS_PER_RIDER)
+    max_orders = n // num_riders + 1  # Same default as the optimize endpoint
+    return num_riders, max_orders
+
+
+def evaluate(points, num_riders, max_orders, algorithm, time_budget_ms, objective="distance"):
+    dist = distance_matrix(points)
+    start = time.perf_counter()
+    routes = solve_routes(points, num_riders, max_orders, algorithm, time_budget_ms, dist=dist,
+                          objective=objective)
+    solve_ms = (time.perf_counter() - start) * 1000
+
+    # Stops must be covered exactly once for the numbers to mean anything
+    visited = sorted(stop for route in routes for stop in route)
+    assert visited == list(range(len(points))), f"{algorithm} dropped or duplicated stops"
+
+    routes = [route for route in routes if route]
+    route_km = np.array([route_distance(dist, route) for route in routes])
+    stops = np.array([len(route) for route in routes])
+    longest = int(np.argmax(route_km))
+    return {
+        "total_km": round(float(route_km.sum()), 2),
+        "makespan_km": round(float(route_km[longest]), 2),
+        # Latest finish, which need not be the longest route in km
+        "makespan_minutes": max(estimate_duration_minutes(km, int(k)) for km, k in zip(route_km, stops)),
+        "riders_used": len(routes),
+        "max_stops": int(stops.max()),
+        "min_stops": int(stops.min()),
+        # Coefficient of variation of route length: 0 means perfectly even work
+        "km_cv": round(float(route_km.std() / route_km.mean()), 3) if route_km.mean() else 0.0,
+        "solve_ms": round(solve_ms, 1),
+    }
+
+
+def compare(result, baseline):
+    """Regression messages for ``result`` against its stored baseline"""
+    problems = []
+    if result["total_km"] > baseline["total_km"] * (1 + TOTAL_KM_TOLERANCE):
+        problems.append(f"total_km {result['total_km']} vs {baseline['total_km']}")
+    if result["makespan_km"] > baseline["makespan_km"] * (1 + MAKESPAN_TOLERANCE):
+        problems.append(f"makespan_km {result['makespan_km']} vs {baseline['makespan_km']}")
+    return problems
+
+
+def delta(value, base):
+    if not base:
+        return ""
+    return f"{(value - base) / base * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=ORDER_COUNTS)
+    parser.add_argument("--algorithms", nargs="+", default=list(ROUTING_ALGORITHMS),
+                        choices=ROUTING_ALGORITHMS)
+    parser.add_argument("--time-budget-ms", type=int, default=DEFAULT_TIME_BUDGET_MS)
+    parser.add_argument("--objective", default="distance", choices=ROUTING_OBJECTIVES)
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any result regresses")
+    args = parser.parse_args()
+
+    # Baselines are kept per objective; the original file held distance only
+    stored = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {"results": {}}
+    baselines = stored["results"] if args.objective == "distance" else stored.get(args.objective, {})
+    if baselines and stored.get("time_budget_ms") != args.time_budget_ms:
+        print(f"note: baselines were recorded with time_budget_ms={stored.get('time_budget_ms')}")
+
+    results = {}
+    regressions = []
+    print(f"{'orders':>7} {'riders':>6} {'algorithm':>9} {'total km':>10} {'vs base':>8} "
+          f"{'makespan km':>12} {'mins':>5} {'stops':>9} {'km cv':>6} {'solve ms':>9}")
+    for n in args.sizes:
+        points = generate_city_orders(n, seed=SEED)
+        num_riders, max_orders = scenario(n)
+        for algorithm in args.algorithms:
+            result = evaluate(points, num_riders, max_orders, algorithm, args.time_budget_ms, args.objective)
+            results.setdefault(str(n), {})[algorithm] = result
+            base = baselines.get(str(n), {}).get(algorithm)
+
+            print(f"{n:>7} {num_riders:>6} {algorithm:>9} {result['total_km']:>10.1f} "
+                  f"{delta(result['total_km'], base['total_km']) if base else '':>8} "
+                  f"{result['makespan_km']:>12.1f} {result['makespan_minutes']:>5} "
+                  f"{result['min_stops']:>4}-{result['max_stops']:<4} {result['km_cv']:>6.3f} "
+                  f"{result['solve_ms']:>9.1f}")
+            if base:
+                regressions += [f"{n} orders / {algorithm}: {p}" for p in compare(result, base)]
+
+    if args.update_baselines:
+        # Keep baselines for sizes/algorithms that were not re-run
+        for n, by_algorithm in results.items():
+            baselines.setdefault(n, {}).update(by_algorithm)
+        stored.update({
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "seed": SEED,
+            "orders_per_rider": ORDERS_PER_RIDER,
+            "time_budget_ms": args.time_budget_ms,
+        })
+        stored["results" if args.objective == "distance" else args.objective] = baselines
+        BASELINES_PATH.write_text(json.dumps(stored, indent=2) + "\n")
+        print(f"\nBaselines written to {BASELINES_PATH.name}")
+
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Geocoding for delivery addresses with a persistent cache.
+
+Orders placed before a customer set a map pin only carry a typed address.
+Addresses are normalised (case, punctuation, whitespace) into a cache key so
+that repeat customers resolve from the local SQLite cache without calling
+the API again. Cache misses are looked up concurrently on a small thread
+pool. Addresses the API cannot resolve are cached too, for a shorter time,
+so a bad address is not retried on every optimization.
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from googlemaps.exceptions import ApiError, HTTPError, Timeout, TransportError
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_SECONDS = 90 * 24 * 3600  # Buildings do not move
+NOT_FOUND_TTL_SECONDS = 24 * 3600  # Retry unresolvable addresses daily
+GEOCODE_WORKERS = 8
+GEOCODE_REGION = "in"  # Bias ambiguous addresses towards India
+
+_SEPARATORS = re.compile(r"[^\w,]+")
+
+
+def address_query(address: Optional[str], house_number: Optional[str] = None,
+                  building_name: Optional[str] = None) -> str:
+    """Full address text sent to the geocoder: house, building, then street address"""
+    parts = []
+    for part in (house_number, building_name, address):
+        part = (part or "").strip()
+        if part and part.lower() not in (p.lower() for p in parts):
+            parts.append(part)
+    return ", ".join(parts)
+
+
+def address_key(query: str) -> str:
+    """Cache key for an address: lowercase words, one comma between parts"""
+    parts = (" ".join(_SEPARATORS.sub(" ", part).split()) for part in query.lower().split(","))
+    return ",".join(part for part in parts if part)
+
+
+class GeocodeCache:
+    """(lat, lng) per address key; None marks an address the API could not resolve"""
+
+    def __init__(self, path, ttl_seconds: int = CACHE_TTL_SECONDS,
+                 not_found_ttl_seconds: int = NOT_FOUND_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.not_found_ttl_seconds = not_found_ttl_seconds
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Shared across threads; every access goes through the lock
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes ("
+                " address_key TEXT PRIMARY KEY,"
+                " latitude REAL,"
+                " longitude REAL,"
+                " fetched_at REAL NOT NULL)"
+            )
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Optional[Tuple[float, float]]]:
+        """Unexpired entries for ``keys``; a None value is a cached miss"""
+        found = {}
+        now = time.time()
+        keys = list(keys)
+        with self._lock:
+            # Chunked to stay under SQLite's parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT address_key, latitude, longitude, fetched_at FROM geocodes "
+                    f"WHERE address_key IN ({placeholders})",
+                    chunk,
+                )
+                for key, lat, lng, fetched_at in rows:
+                    ttl = self.ttl_seconds if lat is not None else self.not_found_ttl_seconds
+                    if fetched_at >= now - ttl:
+                        found[key] = (lat, lng) if lat is not None else None
+        return found
+
+    def put_many(self, entries: Dict[str, Optional[Tuple[float, float]]]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO geocodes (address_key, latitude, longitude, fetched_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, *(point or (None, None)), now) for key, point in entries.items()],
+            )
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM geocodes WHERE fetched_at < ? OR (latitude IS NULL AND fetched_at < ?)",
+                (now - self.ttl_seconds, now - self.not_found_ttl_seconds),
+            ).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Geocoder:
+    """
+    Batched, cached address lookups. ``client`` is a googlemaps.Client or
+    None, in which case only cached addresses resolve.
+    """
+
+    def __init__(self, client=None, cache: Optional[GeocodeCache] = None,
+                 max_workers: int = GEOCODE_WORKERS):
+        self.client = client
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="geocode")
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "lookups": 0,
+            "cache_hits": 0,
+            "api_calls": 0,
+            "not_found": 0,
+            "failures": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None and self.cache is not None
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["enabled"] = self.enabled
+        stats["cache_hit_rate"] = round(stats["cache_hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        return stats
+
+    def geocode_many(self, queries: Iterable[str]) -> Dict[str, Optional[Tuple[float, float]]]:
+        """
+        (lat, lng) or None for each distinct address in ``queries``, keyed by
+        the query text. Blocking; call it from a worker thread in async code.
+        """
+        queries = list(queries)
+        by_key: Dict[str, str] = {}
+        for query in queries:
+            key = address_key(query)
+            if key:
+                by_key.setdefault(key, query)
+        if not by_key:
+            return {}
+
+        cached = self.cache.get_many(list(by_key)) if self.cache is not None else {}
+        self._count(lookups=len(by_key), cache_hits=len(cached))
+        points = dict(cached)
+
+        missing = [key for key in by_key if key not in cached]
+        if missing and self.enabled:
+            results = self._executor.map(lambda key: (key, self._lookup(by_key[key])), missing)
+            fetched = {}
+            for key, (ok, point) in results:
+                points[key] = point
+                if ok:
+                    fetched[key] = point
+            if fetched:
+                self.cache.put_many(fetched)
+
+        keys_by_query = {query: address_key(query) for query in queries}
+        return {query: points.get(key) for query, key in keys_by_query.items() if key}
+
+    def _lookup(self, query: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        """One geocoding call: (answered, point). Unanswered lookups are not cached."""
+        try:
+            results = self.client.geocode(query, region=GEOCODE_REGION)
+        except (ApiError, HTTPError, Timeout, TransportError) as e:
+            self._count(api_calls=1, failures=1)
+            logger.warning(f"Geocoding failed for {query!r}: {e}")
+            return False, None
+        self._count(api_calls=1)
+        if not results:
+            self._count(not_found=1)
+            return True, None
+        location = results[0]["geometry"]["location"]
+        return True, (location["lat"], location["lng"])
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,77 @@
+"""
+Streaming order exports as CSV or NDJSON, optionally gzipped.
+
+export_chunks turns any async iterable of order documents (a Motor cursor in
+the server) into byte chunks of about CHUNK_BYTES, so a response holds one
+chunk in memory however many orders it covers. Gzip output is one stream
+compressed as it is produced.
+"""
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterable, AsyncIterator, List
+
+EXPORT_FORMATS = ("csv", "ndjson")
+CHUNK_BYTES = 64 * 1024
+
+# Columns, in order; items are also flattened for spreadsheets
+EXPORT_FIELDS = [
+    "id", "placed_at", "updated_at", "status", "customer_id", "customer_name",
+    "restaurant_id", "restaurant_name", "total_amount", "delivery_fee",
+    "delivery_address", "delivery_slot", "rider_id", "out_for_delivery_at",
+    "delivered_at", "cart_id",
+]
+CSV_COLUMNS = EXPORT_FIELDS + ["items", "item_count"]
+
+# Mongo projection for the fields an export reads
+EXPORT_PROJECTION = {"_id": 0, "items": 1, **{field: 1 for field in EXPORT_FIELDS}}
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def csv_row(order: dict) -> List:
+    items = order.get('items') or []
+    return [order.get(field) for field in EXPORT_FIELDS] + [
+        "; ".join(f"{item.get('name')} x {item.get('quantity')}" for item in items),
+        sum(item.get('quantity') or 0 for item in items),
+    ]
+
+
+def ndjson_line(order: dict) -> str:
+    record = {field: order.get(field) for field in EXPORT_FIELDS}
+    record["items"] = order.get('items') or []
+    return json.dumps(record, default=str, ensure_ascii=False) + "\n"
+
+
+async def export_chunks(orders: AsyncIterable[dict], fmt: str, compress: bool = False) -> AsyncIterator[bytes]:
+    """Encode ``orders`` as ``fmt`` (csv or ndjson) in chunks of about CHUNK_BYTES"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt}")
+    # wbits 31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+
+    def take() -> bytes:
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    if writer:
+        writer.writerow(CSV_COLUMNS)
+    async for order in orders:
+        if writer:
+            writer.writerow(csv_row(order))
+        else:
+            buffer.write(ndjson_line(order))
+        if buffer.tell() >= CHUNK_BYTES:
+            chunk = take()
+            if chunk:
+                yield chunk
+    chunk = take()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
@@ -0,0 +1,100 @@
+"""
+Daily order rollups for analytics.
+
+One rollup row per (day, restaurant, status) holds the number of orders and
+their summed total_amount, delivery fees and item quantities. The day is the
+local date the order was placed. Order writes move an order's values from
+the row of its old status to the row of its new one with $inc, so a time
+range is answered from at most days x restaurants x statuses small rows
+instead of scanning orders. rollup_deltas builds those increments; a rebuild
+feeds every order in a range through it with no previous status.
+"""
+from datetime import datetime, tzinfo
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ROLLUP_FIELDS = ("orders", "revenue", "delivery_fees", "items")
+MAX_ANALYTICS_DAYS = 366
+
+# Order fields the rollups need, as a Mongo projection
+ROLLUP_ORDER_PROJECTION = {
+    "_id": 0, "id": 1, "status": 1, "restaurant_id": 1, "placed_at": 1,
+    "total_amount": 1, "delivery_fee": 1, "items.quantity": 1,
+}
+
+RollupKey = Tuple[str, str, str]  # (YYYY-MM-DD, restaurant_id, status)
+
+
+def rollup_day(placed_at, tz: tzinfo) -> str:
+    """Local date an order was placed; placed_at is an ISO string or aware datetime"""
+    if isinstance(placed_at, str):
+        placed_at = datetime.fromisoformat(placed_at)
+    return placed_at.astimezone(tz).date().isoformat()
+
+
+def rollup_values(order: dict) -> Dict[str, float]:
+    return {
+        "orders": 1,
+        "revenue": order.get('total_amount') or 0,
+        "delivery_fees": order.get('delivery_fee') or 0,
+        "items": sum(item.get('quantity') or 0 for item in order.get('items') or []),
+    }
+
+
+def rollup_deltas(changes: Iterable[Tuple[dict, Optional[str], Optional[str]]], tz: tzinfo,
+                  into: Optional[Dict[RollupKey, Dict[str, float]]] = None) -> Dict[RollupKey, Dict[str, float]]:
+    """
+    Increments for (order, previous status, new status) changes; a previous
+    status of None is a new order. Adds to ``into`` when given, for rebuilds
+    that stream orders through in batches. Rows that cancel out are dropped.
+    """
+    deltas = {} if into is None else into
+    for order, before, after in changes:
+        if before == after or not order.get('placed_at'):
+            continue
+        day = rollup_day(order['placed_at'], tz)
+        values = rollup_values(order)
+        for status, sign in ((before, -1), (after, 1)):
+            if status is None:
+                continue
+            row = deltas.setdefault((day, order.get('restaurant_id'), status), dict.fromkeys(ROLLUP_FIELDS, 0))
+            for field in ROLLUP_FIELDS:
+                row[field] += sign * values[field]
+    return {key: row for key, row in deltas.items() if any(row.values())}
+
+
+def summarize_rollups(rows: Iterable[dict], group_by: str = "date") -> List[dict]:
+    """
+    Combine rollup rows across statuses per ``group_by`` value (date or
+    restaurant_id). Revenue, delivery fees and items count delivered orders
+    only; booked_revenue counts every order that was not cancelled.
+    """
+    groups: Dict[str, dict] = {}
+    for row in rows:
+        key = row[group_by]
+        group = groups.setdefault(key, {
+            group_by: key, "orders": 0, "delivered_orders": 0, "cancelled_orders": 0,
+            "booked_revenue": 0.0, "revenue": 0.0, "delivery_fees": 0.0, "items": 0,
+        })
+        group["orders"] += row['orders']
+        if row['status'] == "cancelled":
+            group["cancelled_orders"] += row['orders']
+            continue
+        group["booked_revenue"] += row['revenue']
+        if row['status'] == "delivered":
+            group["delivered_orders"] += row['orders']
+            group["revenue"] += row['revenue']
+            group["delivery_fees"] += row['delivery_fees']
+            group["items"] += row['items']
+    for group in groups.values():
+        for field in ("booked_revenue", "revenue", "delivery_fees"):
+            group[field] = round(group[field], 2)
+    return sorted(groups.values(), key=lambda group: group[group_by])
+
+
+def rollup_totals(groups: List[dict]) -> dict:
+    """Sum of summarize_rollups groups"""
+    fields = ("orders", "delivered_orders", "cancelled_orders", "booked_revenue", "revenue", "delivery_fees", "items")
+    totals = {field: sum(group[field] for group in groups) for field in fields}
+    for field in ("booked_revenue", "revenue", "delivery_fees"):
+        totals[field] = round(totals[field], 2)
+    return totals
@@ -0,0 +1,220 @@
+"""
+Parquet snapshots of orders and the wallet ledger for offline reporting.
+
+Each dataset is written under ``root/<dataset>/date=YYYY-MM-DD/`` (hive
+partitioning by the local day a record was created) as part files appended
+by every export run. A run exports the records that changed in
+[checkpoint, until), where ``until`` trails the clock slightly so writes
+still in flight are picked up by the next run, and then advances the
+checkpoint stored beside the files. A record that changes again is
+appended again; read_dataset keeps the latest version of each record.
+
+Writing is synchronous and CPU-bound; the server runs write_batch in a
+thread and fetches documents from Mongo in between.
+"""
+import fcntl
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timezone, tzinfo
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+ITEM = pa.struct([("menu_item_id", pa.string()), ("name", pa.string()),
+                  ("quantity", pa.int64()), ("price", pa.float64())])
+
+
+class Dataset(NamedTuple):
+    name: str  # Mongo collection and directory name
+    partition_field: str  # Records are partitioned by the local day of this timestamp
+    change_fields: Tuple[str, ...]  # A record changed when any of these timestamps moved
+    schema: pa.Schema
+
+
+ORDERS = Dataset("orders", "placed_at", ("updated_at",), pa.schema([
+    ("id", pa.string()),
+    ("customer_id", pa.string()),
+    ("customer_name", pa.string()),
+    ("restaurant_id", pa.string()),
+    ("restaurant_name", pa.string()),
+    ("status", pa.string()),
+    ("items", pa.list_(ITEM)),
+    ("total_amount", pa.float64()),
+    ("delivery_fee", pa.float64()),
+    ("delivery_address", pa.string()),
+    ("delivery_latitude", pa.float64()),
+    ("delivery_longitude", pa.float64()),
+    ("delivery_slot", pa.string()),
+    ("rider_id", pa.string()),
+    ("cart_id", pa.string()),
+    ("rating", pa.int64()),
+    ("placed_at", TIMESTAMP),
+    ("updated_at", TIMESTAMP),
+    ("out_for_delivery_at", TIMESTAMP),
+    ("delivered_at", TIMESTAMP),
+    ("changed_at", TIMESTAMP),
+]))
+
+WALLET_TRANSACTIONS = Dataset("wallet_transactions", "created_at", ("created_at", "completed_at"), pa.schema([
+    ("id", pa.string()),
+    ("user_id", pa.string()),
+    ("transaction_type", pa.string()),
+    ("amount", pa.float64()),
+    ("payment_method", pa.string()),
+    ("paytm_order_id", pa.string()),
+    ("paytm_txn_id", pa.string()),
+    ("order_id", pa.string()),
+    ("status", pa.string()),
+    ("description", pa.string()),
+    ("balance_before", pa.float64()),
+    ("balance_after", pa.float64()),
+    ("created_at", TIMESTAMP),
+    ("completed_at", TIMESTAMP),
+    ("changed_at", TIMESTAMP),
+]))
+
+DATASETS = (ORDERS, WALLET_TRANSACTIONS)
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+
+def to_timestamp(value) -> Optional[datetime]:
+    """Stored ISO strings (or datetimes) as aware UTC datetimes; None if unparseable"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _convert(value, kind: pa.DataType):
+    if value is None:
+        return None
+    if kind == TIMESTAMP:
+        return to_timestamp(value)
+    if kind == pa.float64():
+        return float(value) if isinstance(value, (int, float)) else None
+    if kind == pa.int64():
+        return int(value) if isinstance(value, (int, float)) else None
+    if kind == pa.string():
+        return str(value)
+    if kind == pa.list_(ITEM):
+        return [{field.name: _convert(item.get(field.name), field.type) for field in ITEM}
+                for item in value if isinstance(item, dict)]
+    return value
+
+
+def change_query(dataset: Dataset, since: Optional[str], until: str) -> dict:
+    """
+    Mongo filter for records whose change timestamps moved in [since, until).
+    Older rows may hold BSON datetimes rather than ISO strings, and Mongo
+    only compares values of the same type, so both forms are matched.
+    """
+    windows = []
+    for bound in (str, to_timestamp):
+        window = {"$lt": bound(until)}
+        if since is not None:
+            window["$gte"] = bound(since)
+        windows.append(window)
+    return {"$or": [{field: window} for field in dataset.change_fields for window in windows]}
+
+
+class ParquetExporter:
+    """Part files and checkpoints under ``root``, one directory per dataset"""
+
+    def __init__(self, root: Path, tz: tzinfo):
+        self.root = Path(root)
+        self.tz = tz
+
+    def _checkpoint_path(self, dataset: Dataset) -> Path:
+        return self.root / dataset.name / "_checkpoint.json"
+
+    def checkpoint(self, dataset: Dataset) -> dict:
+        """exported_until, rows and last_run_at of the last committed run; empty before the first"""
+        try:
+            return json.loads(self._checkpoint_path(dataset).read_text())
+        except FileNotFoundError:
+            return {}
+
+    def write_batch(self, dataset: Dataset, docs: List[dict], run_id: str) -> List[Path]:
+        """Write ``docs`` as one part file per local day; returns the files written"""
+        partitions = {}
+        for doc in docs:
+            created = to_timestamp(doc.get(dataset.partition_field))
+            day = created.astimezone(self.tz).date().isoformat() if created else "unknown"
+            record = {field.name: _convert(doc.get(field.name), field.type) for field in dataset.schema}
+            changes = [to_timestamp(doc.get(field)) for field in dataset.change_fields]
+            record["changed_at"] = max((c for c in changes if c is not None), default=None)
+            partitions.setdefault(day, []).append(record)
+
+        written = []
+        for day, records in partitions.items():
+            directory = self.root / dataset.name / f"date={day}"
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"part-{run_id}-{uuid.uuid4().hex[:8]}.parquet"
+            pq.write_table(pa.Table.from_pylist(records, schema=dataset.schema), path)
+            written.append(path)
+        return written
+
+    def discard(self, paths: List[Path]):
+        """Remove part files of a run that did not commit"""
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    def commit(self, dataset: Dataset, exported_until: str, rows: int):
+        """Advance the checkpoint; written to a temporary file first so it is never half-written"""
+        previous = self.checkpoint(dataset)
+        path = self._checkpoint_path(dataset)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps({
+            "exported_until": exported_until,
+            "rows": previous.get("rows", 0) + rows,
+            "last_run_rows": rows,
+            "last_run_at": datetime.now(timezone.utc).isoformat(),
+        }))
+        os.replace(temporary, path)
+
+    @contextmanager
+    def locked(self) -> Iterator[bool]:
+        """Hold the export lock if it is free; yields whether it was acquired"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "w") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def read_dataset(root: Path, dataset: Dataset, start: Optional[date] = None, end: Optional[date] = None):
+    """
+    The latest version of each record created on local days start..end, as
+    a pandas DataFrame with a ``date`` column from the partition
+    """
+    # The checkpoint file is skipped like any name starting with "_"
+    source = ds.dataset(Path(root) / dataset.name, format="parquet", partitioning=PARTITIONING)
+    condition = None
+    if start is not None:
+        condition = ds.field("date") >= start.isoformat()
+    if end is not None:
+        upper = ds.field("date") <= end.isoformat()
+        condition = upper if condition is None else condition & upper
+    frame = source.to_table(filter=condition).to_pandas()
+    if frame.empty:
+        return frame
+    return frame.sort_values("changed_at", kind="stable").drop_duplicates("id", keep="last").reset_index(drop=True)
@@ -0,0 +1,115 @@
+"""
+Live rider positions from batched GPS pings.
+
+Riders send pings in small batches. Each worker keeps the latest position
+per rider in memory for live reads, and buffers every ping until the server
+flushes the buffer to Mongo as one insert_many for the history plus one
+bulk write of the latest positions. Ingesting is a dict update and a list
+append, so a worker keeps up with thousands of pings per second. If Mongo
+is unavailable the buffer is capped at MAX_BUFFERED_PINGS and the oldest
+pings are dropped first.
+
+Latest positions are also kept in a SpatialIndex, including positions other
+workers flushed, so nearest-rider queries never touch the database.
+"""
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from spatial_index import SpatialIndex
+
+FLUSH_INTERVAL_SECONDS = 1.0
+MAX_BUFFERED_PINGS = 100_000
+MAX_PINGS_PER_BATCH = 500  # Per request; about 8 minutes of pings at 1 Hz
+HISTORY_TTL_SECONDS = 7 * 24 * 3600
+POSITION_FRESH_SECONDS = 10 * 60  # Older positions are not trusted for dispatch
+LIVE_INDEX_CELL_KM = 1.0
+
+# (latitude, longitude, recorded_at epoch seconds, speed m/s, heading degrees, accuracy m)
+Ping = Tuple[float, float, float, Optional[float], Optional[float], Optional[float]]
+
+
+class RiderTracker:
+    """Latest position per rider plus pings waiting to be written"""
+
+    def __init__(self, max_buffered: int = MAX_BUFFERED_PINGS):
+        self.max_buffered = max_buffered
+        self._latest: Dict[str, Ping] = {}
+        self._moved = set()  # Riders whose latest position is not written yet
+        self._pending: List[Tuple[str, Ping]] = []
+        self._stats = {"received": 0, "flushed": 0, "dropped": 0, "stale": 0}
+        self.index = SpatialIndex(cell_km=LIVE_INDEX_CELL_KM)
+
+    def ingest(self, rider_id: str, pings: Iterable[Ping]) -> int:
+        """Buffer ``pings`` for history and advance the rider's latest position"""
+        latest = self._latest.get(rider_id)
+        count = 0
+        for ping in pings:
+            self._pending.append((rider_id, ping))
+            count += 1
+            # Batches may arrive out of order after a rider regains signal
+            if latest is None or ping[2] >= latest[2]:
+                latest = ping
+            else:
+                self._stats["stale"] += 1
+        if latest is not None and latest is not self._latest.get(rider_id):
+            self._latest[rider_id] = latest
+            self._moved.add(rider_id)
+            self.index.insert(rider_id, latest[0], latest[1])
+        self._stats["received"] += count
+
+        overflow = len(self._pending) - self.max_buffered
+        if overflow > 0:
+            del self._pending[:overflow]
+            self._stats["dropped"] += overflow
+        return count
+
+    def observe(self, rider_id: str, ping: Ping) -> bool:
+        """Take a position another worker received; ignored unless it is newer"""
+        current = self._latest.get(rider_id)
+        if current is not None and current[2] >= ping[2]:
+            return False
+        self._latest[rider_id] = ping
+        self.index.insert(rider_id, ping[0], ping[1])
+        return True
+
+    def nearest(self, lat: float, lng: float, k: int, max_km: Optional[float] = None,
+                max_age_seconds: float = POSITION_FRESH_SECONDS) -> List[Tuple[str, float]]:
+        """Up to k (rider_id, distance_km) pairs with a recent position, nearest first"""
+        cutoff = time.time() - max_age_seconds
+        latest = self._latest
+        return self.index.nearest(lat, lng, k=k, max_km=max_km,
+                                  predicate=lambda rider_id: latest[rider_id][2] >= cutoff)
+
+    def latest(self, rider_ids: Optional[Iterable[str]] = None,
+               max_age_seconds: Optional[float] = None) -> Dict[str, Ping]:
+        """Latest known position per rider, optionally only recent ones"""
+        if rider_ids is None:
+            positions = dict(self._latest)
+        else:
+            positions = {r: self._latest[r] for r in rider_ids if r in self._latest}
+        if max_age_seconds is not None:
+            cutoff = time.time() - max_age_seconds
+            positions = {r: p for r, p in positions.items() if p[2] >= cutoff}
+        return positions
+
+    def take_pending(self) -> Tuple[List[Tuple[str, Ping]], Dict[str, Ping]]:
+        """Hand over buffered pings and moved riders' latest positions for writing"""
+        pending, self._pending = self._pending, []
+        moved = {rider_id: self._latest[rider_id] for rider_id in self._moved}
+        self._moved = set()
+        return pending, moved
+
+    def requeue(self, pending: List[Tuple[str, Ping]], moved: Dict[str, Ping]):
+        """Put back a batch whose write failed, ahead of anything newer"""
+        self._pending[:0] = pending
+        self._moved.update(moved)
+        overflow = len(self._pending) - self.max_buffered
+        if overflow > 0:
+            del self._pending[:overflow]
+            self._stats["dropped"] += overflow
+
+    def mark_flushed(self, count: int):
+        self._stats["flushed"] += count
+
+    def stats(self) -> dict:
+        return {**self._stats, "buffered": len(self._pending), "riders": len(self._latest)}
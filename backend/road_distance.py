@@ -0,0 +1,256 @@
+"""
+Road distances from the Google Distance Matrix API with a persistent cache.
+
+Points are rounded to ROUND_DECIMALS (about 11 m) so that repeat deliveries to
+the same building share cache entries. Missing pairs are fetched in
+rectangular blocks that stay within the API's per-request element limit, and
+results are kept in a small SQLite database for CACHE_TTL_SECONDS. Without an
+API key (or when a request fails) distances fall back to haversine.
+"""
+import logging
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from googlemaps.exceptions import ApiError, HTTPError, Timeout, TransportError
+
+from routing import haversine_matrix
+
+logger = logging.getLogger(__name__)
+
+ROUND_DECIMALS = 4
+CACHE_TTL_SECONDS = 7 * 24 * 3600  # Road networks change slowly; refresh weekly
+MAX_ELEMENTS_PER_REQUEST = 100  # origins x destinations per Distance Matrix call
+MAX_POINTS_PER_SIDE = 25  # origins (and destinations) per call
+ROAD_DISTANCE_MAX_STOPS = 100  # Larger batches would cost n^2 elements; use haversine
+
+# Square blocks keep origins x destinations within the element limit
+BLOCK_SIZE = min(MAX_POINTS_PER_SIDE, int(math.isqrt(MAX_ELEMENTS_PER_REQUEST)))
+
+
+def coordinate_key(lat: float, lng: float) -> str:
+    return f"{lat:.{ROUND_DECIMALS}f},{lng:.{ROUND_DECIMALS}f}"
+
+
+class DistanceCache:
+    """Road distances in km keyed by (origin, destination) coordinate keys"""
+
+    def __init__(self, path, ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Shared across the threadpool; every access goes through the lock
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS road_distances ("
+                " origin TEXT NOT NULL,"
+                " destination TEXT NOT NULL,"
+                " distance_km REAL NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (origin, destination))"
+            )
+
+    def get_many(self, pairs: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        """Cached distances for the given pairs that have not expired"""
+        found = {}
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            # Query by origin so each statement stays well under SQLite's parameter limit
+            by_origin: Dict[str, List[str]] = {}
+            for origin, destination in pairs:
+                by_origin.setdefault(origin, []).append(destination)
+            for origin, destinations in by_origin.items():
+                placeholders = ",".join("?" * len(destinations))
+                rows = self._conn.execute(
+                    f"SELECT destination, distance_km FROM road_distances "
+                    f"WHERE origin = ? AND fetched_at >= ? AND destination IN ({placeholders})",
+                    [origin, cutoff, *destinations],
+                )
+                for destination, km in rows:
+                    found[(origin, destination)] = km
+        return found
+
+    def put_many(self, entries: Dict[Tuple[str, str], float]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO road_distances (origin, destination, distance_km, fetched_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(o, d, km, now) for (o, d), km in entries.items()],
+            )
+
+    def purge_expired(self) -> int:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM road_distances WHERE fetched_at < ?", (cutoff,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _block_plan(missing: np.ndarray) -> List[Tuple[List[int], List[int]]]:
+    """Square BLOCK_SIZE tiles, each trimmed to the rows/columns it still needs"""
+    m = len(missing)
+    requests = []
+    for r0 in range(0, m, BLOCK_SIZE):
+        for c0 in range(0, m, BLOCK_SIZE):
+            block = missing[r0:r0 + BLOCK_SIZE, c0:c0 + BLOCK_SIZE]
+            if not block.any():
+                continue
+            rows = (np.flatnonzero(block.any(axis=1)) + r0).tolist()
+            cols = (np.flatnonzero(block.any(axis=0)) + c0).tolist()
+            requests.append((rows, cols))
+    return requests
+
+
+def _strip_plan(missing: np.ndarray) -> List[Tuple[List[int], List[int]]]:
+    """
+    Origins that miss exactly the same destinations share long, thin requests
+    (e.g. 1 x 25 for one new stop against many cached ones)
+    """
+    groups: Dict[Tuple[int, ...], List[int]] = {}
+    for i, row in enumerate(missing):
+        cols = tuple(np.flatnonzero(row).tolist())
+        if cols:
+            groups.setdefault(cols, []).append(i)
+    requests = []
+    for cols, rows in groups.items():
+        per_side = min(len(cols), MAX_POINTS_PER_SIDE)
+        origins_per_call = max(1, min(MAX_POINTS_PER_SIDE, MAX_ELEMENTS_PER_REQUEST // per_side))
+        for r0 in range(0, len(rows), origins_per_call):
+            for c0 in range(0, len(cols), per_side):
+                requests.append((rows[r0:r0 + origins_per_call], list(cols[c0:c0 + per_side])))
+    return requests
+
+
+def plan_requests(missing: np.ndarray) -> List[Tuple[List[int], List[int]]]:
+    """
+    Cover the True cells of a square ``missing`` mask with (origins, destinations)
+    requests inside the API limits, using whichever tiling needs fewer calls
+    """
+    blocks = _block_plan(missing)
+    if len(blocks) <= 1:
+        return blocks
+    strips = _strip_plan(missing)
+    return strips if len(strips) < len(blocks) else blocks
+
+
+class RoadDistanceProvider:
+    """
+    Distance matrices over the road network, served from the cache when
+    possible. ``client`` is a googlemaps.Client or None for haversine only.
+    """
+
+    def __init__(self, client=None, cache: Optional[DistanceCache] = None,
+                 max_stops: int = ROAD_DISTANCE_MAX_STOPS):
+        self.client = client
+        self.cache = cache
+        self.max_stops = max_stops
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "matrices": 0,
+            "fallback_matrices": 0,
+            "pair_lookups": 0,
+            "cache_hits": 0,
+            "api_calls": 0,
+            "api_elements": 0,
+            "api_calls_without_cache": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None and self.cache is not None
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["pair_lookups"]
+        stats["enabled"] = self.enabled
+        stats["cache_hit_rate"] = round(stats["cache_hits"] / lookups, 4) if lookups else 0.0
+        stats["api_calls_saved"] = stats["api_calls_without_cache"] - stats["api_calls"]
+        return stats
+
+    def matrix(self, coords) -> Tuple[np.ndarray, str]:
+        """
+        (n x n) road distances in km for the (lat, lng) rows of ``coords`` and
+        the source used: "road" or "haversine". The matrix may be asymmetric
+        (one-way streets). Blocking; call it from a worker thread in async code.
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        n = len(coords)
+        if not self.enabled or n < 2 or n > self.max_stops:
+            self._count(matrices=1, fallback_matrices=1)
+            return haversine_matrix(coords), "haversine"
+
+        # Stops that round to the same key share one row of the road matrix
+        keys = [coordinate_key(lat, lng) for lat, lng in coords]
+        unique_keys = list(dict.fromkeys(keys))
+        index_of = {key: i for i, key in enumerate(unique_keys)}
+        m = len(unique_keys)
+        unique_coords = np.array([[float(v) for v in key.split(",")] for key in unique_keys])
+
+        road = np.full((m, m), np.nan)
+        np.fill_diagonal(road, 0.0)
+        pairs = [(a, b) for a in unique_keys for b in unique_keys if a != b]
+        cached = self.cache.get_many(pairs)
+        for (a, b), km in cached.items():
+            road[index_of[a], index_of[b]] = km
+
+        missing = np.isnan(road)
+        off_diagonal = ~np.eye(m, dtype=bool)
+        requests = plan_requests(missing)
+        self._count(
+            matrices=1,
+            pair_lookups=len(pairs),
+            cache_hits=len(cached),
+            api_calls_without_cache=len(plan_requests(off_diagonal)),
+        )
+
+        fetched = {}
+        try:
+            for rows, cols in requests:
+                fetched.update(self._fetch(unique_keys, rows, cols, road))
+        except (ApiError, HTTPError, Timeout, TransportError) as e:
+            logger.warning(f"Distance Matrix request failed, using haversine for missing pairs: {e}")
+        finally:
+            if fetched:
+                self.cache.put_many(fetched)
+
+        # Pairs the API could not route (or never returned) use straight-line distance
+        unresolved = np.isnan(road)
+        if unresolved.any():
+            road[unresolved] = haversine_matrix(unique_coords)[unresolved]
+
+        idx = np.array([index_of[key] for key in keys])
+        return road[np.ix_(idx, idx)], "road"
+
+    def _fetch(self, keys: List[str], rows: List[int], cols: List[int],
+               road: np.ndarray) -> Dict[Tuple[str, str], float]:
+        """One Distance Matrix call; fills ``road`` and returns entries to cache"""
+        response = self.client.distance_matrix(
+            origins=[keys[i] for i in rows],
+            destinations=[keys[j] for j in cols],
+            mode="driving",
+        )
+        self._count(api_calls=1, api_elements=len(rows) * len(cols))
+        entries = {}
+        for i, row in zip(rows, response.get("rows", [])):
+            for j, element in zip(cols, row.get("elements", [])):
+                if i == j or element.get("status") != "OK":
+                    continue
+                km = element["distance"]["value"] / 1000
+                road[i, j] = km
+                entries[(keys[i], keys[j])] = km
+        return entries
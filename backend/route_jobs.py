@@ -0,0 +1,235 @@
+"""
+Background route optimization jobs.
+
+Local search is CPU-bound, so large solves are submitted to a process pool
+instead of running inside the request handler. Order coordinates (and a
+precomputed distance matrix, if any) are copied once into a shared-memory
+block that the worker maps directly; the last slot of the block is a
+progress value the worker writes and the API reads when polled. Only the
+remaining plan_routes options are pickled to the worker: scalars,
+``pickup_of`` and the trip ``pace``, whose arrays grow with the number of
+stops times the few hours of the delivery window rather than quadratically.
+
+Jobs are held in memory by the API process that accepted them, so clients
+must poll the same server process (sticky sessions when running several
+uvicorn workers).
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from routing import Pace, plan_routes
+
+ROUTE_JOB_WORKERS = int(os.environ.get('ROUTE_JOB_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+JOB_RETENTION_SECONDS = 3600  # Finished jobs are forgotten after an hour
+
+
+def _block_size(points: int, has_dist: bool) -> int:
+    """Float64 slots: coordinate pairs, optional distance matrix, progress"""
+    return 2 * points + (points * points if has_dist else 0) + 1
+
+
+class _ProgressSlot:
+    """Progress callback writing into the block's last slot until released"""
+
+    def __init__(self, view: np.ndarray):
+        self.view = view
+
+    def __call__(self, fraction: float):
+        if self.view is not None:
+            self.view[0] = fraction
+
+    def release(self):
+        self.view = None
+
+
+def _solve_shared(shm_name: str, n: int, num_pickups: int, has_dist: bool, options: Dict[str, Any]):
+    """
+    Worker entry point: solve the coordinates held in a shared-memory block.
+    The block holds the n stops followed by any pickup points; ``options``
+    are the remaining plan_routes arguments.
+    """
+    # Pool workers share the API process's resource tracker, which unlinks the
+    # block if the API dies before releasing it
+    shm = shared_memory.SharedMemory(name=shm_name)
+    points = n + num_pickups
+    size = _block_size(points, has_dist)
+    data = np.ndarray((size,), dtype=np.float64, buffer=shm.buf)
+    report = _ProgressSlot(data[size - 1:])
+    try:
+        coords = data[:2 * points].reshape(points, 2).copy()
+        dist = data[2 * points:2 * points + points * points].reshape(points, points).copy() if has_dist else None
+        plan = plan_routes(
+            coords[:n], dist=dist, progress=report,
+            pickup_coords=coords[n:] if num_pickups else None,
+            **options,
+        )
+        report(1.0)
+        return plan
+    finally:
+        # Views into the mapping must be gone before it can be closed
+        report.release()
+        del data
+        shm.close()
+
+
+class RouteJobManager:
+    """Submits routing jobs to a lazily started process pool and tracks them"""
+
+    def __init__(self, max_workers: int = ROUTE_JOB_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn keeps workers free of the API's event loop and Mongo threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def submit(self, coords, num_riders: int, max_orders: int, algorithm: str,
+               time_budget_ms: int, owner_id: str, context: Any = None, dist=None,
+               pickup_coords=None, pickup_of: Optional[List[int]] = None,
+               objective: str = "distance", window_minutes: Optional[float] = None,
+               pace: Optional[Pace] = None) -> str:
+        """
+        Queue a solve and return its job id; the result is plan_routes' RoutePlan.
+        ``dist`` is an optional distance matrix over the stops followed by any
+        pickups (e.g. road distances); the worker computes haversine distances
+        otherwise. ``context`` is kept for the caller.
+        """
+        self._prune()
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        n = len(coords)
+        if pickup_coords is not None:
+            pickup_coords = np.asarray(pickup_coords, dtype=np.float64).reshape(-1, 2)
+            coords = np.vstack([coords, pickup_coords])
+        num_pickups = len(coords) - n
+        points = len(coords)
+        has_dist = dist is not None
+        size = _block_size(points, has_dist)
+
+        shm = shared_memory.SharedMemory(create=True, size=size * 8)
+        data = np.ndarray((size,), dtype=np.float64, buffer=shm.buf)
+        data[:2 * points] = coords.ravel()
+        if has_dist:
+            data[2 * points:2 * points + points * points] = np.asarray(dist, dtype=np.float64).ravel()
+        data[size - 1] = 0.0
+
+        job_id = str(uuid.uuid4())
+        job = {
+            "id": job_id,
+            "owner_id": owner_id,
+            "context": context,
+            "created_at": time.time(),
+            "finished_at": None,
+            "shm": shm,
+            "progress_slot": data[size - 1:],
+            "progress": 0.0,
+            "future": None,
+        }
+        del data
+        options = {
+            "num_riders": num_riders,
+            "max_orders": max_orders,
+            "algorithm": algorithm,
+            "time_budget_ms": time_budget_ms,
+            "pickup_of": pickup_of,
+            "objective": objective,
+            "window_minutes": window_minutes,
+            "pace": pace,
+        }
+        args = (shm.name, n, num_pickups, has_dist, options)
+        try:
+            try:
+                job["future"] = self._pool().submit(_solve_shared, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); start a fresh pool once
+                self._executor = None
+                job["future"] = self._pool().submit(_solve_shared, *args)
+        except Exception:
+            self._release(job)
+            raise
+        with self._lock:
+            self._jobs[job_id] = job
+        job["future"].add_done_callback(lambda _: self._finish(job))
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def run_once(self, job: dict, key: str, start: Callable[[], Any]) -> Any:
+        """
+        The task (any future) kept on ``job`` under ``key``, started with
+        ``start`` by the first caller, or again if the last attempt failed.
+        Concurrent callers share it, e.g. to store a finished job's result once.
+        """
+        with self._lock:
+            task = job.get(key)
+            if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+                task = job[key] = start()
+            return task
+
+    def snapshot(self, job: dict) -> dict:
+        """Current status, progress and (once finished) result or error of a job"""
+        future = job["future"]
+        with self._lock:
+            slot = job["progress_slot"]
+            progress = float(slot[0]) if slot is not None else job["progress"]
+
+        if not future.done():
+            status = "running" if future.running() else "queued"
+            return {"status": status, "progress": round(progress, 3), "result": None, "error": None}
+        if future.cancelled():
+            return {"status": "cancelled", "progress": round(progress, 3), "result": None, "error": None}
+        error = future.exception()
+        if error is not None:
+            return {"status": "failed", "progress": round(progress, 3), "result": None, "error": str(error)}
+        return {"status": "completed", "progress": 1.0, "result": future.result(), "error": None}
+
+    def _finish(self, job: dict):
+        with self._lock:
+            job["finished_at"] = time.time()
+            self._release(job)
+
+    @staticmethod
+    def _release(job: dict):
+        """Copy out the last progress value, then close and unlink the shared block"""
+        shm = job["shm"]
+        if shm is None:
+            return
+        job["progress"] = float(job["progress_slot"][0])
+        job["progress_slot"] = None
+        job["shm"] = None
+        shm.close()
+        shm.unlink()
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] is not None and job["finished_at"] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        """Cancel queued jobs, stop the workers and free every shared block"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        with self._lock:
+            for job in self._jobs.values():
+                self._release(job)
@@ -0,0 +1,1134 @@
+"""
+Route optimization helpers for delivery planning.
+
+Pure functions only (no database access) so they can be imported by the API,
+benchmarks and background workers alike.
+"""
+import math
+import time
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from spatial_index import SpatialIndex, knn_graph, suggest_cell_km
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_distance(loc1: tuple, loc2: tuple) -> float:
+    """Calculate distance between two lat/lng points in kilometers"""
+    lat1, lon1 = loc1
+    lat2, lon2 = loc2
+
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dlon / 2) ** 2)
+
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_matrix(coords: np.ndarray) -> np.ndarray:
+    """
+    Full pairwise haversine distance matrix (km) for an (N, 2) array of
+    lat/lng points, computed in a single vectorized pass.
+
+    Points are mapped to unit vectors so the haversine term becomes
+    (1 - u_i . u_j) / 2 and the whole matrix comes out of one matrix product;
+    only sqrt/arcsin run element-wise. Agrees with haversine_distance to
+    well under a metre.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    lat = np.radians(coords[:, 0])
+    lng = np.radians(coords[:, 1])
+    cos_lat = np.cos(lat)
+    unit = np.column_stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)])
+
+    a = unit @ unit.T
+    np.subtract(1.0, a, out=a)
+    a *= 0.5
+    # Rounding can push the dot product just past +/-1
+    np.clip(a, 0.0, 1.0, out=a)
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
+    a *= 2 * EARTH_RADIUS_KM
+    return a
+
+
+# Above this many stops a dense float64 matrix costs more memory (8 * N^2
+# bytes) than it saves; distances are then computed on demand
+DENSE_MATRIX_LIMIT = 2000
+
+
+class HaversineRows:
+    """
+    Matrix-like view of haversine distances computed on demand, for stop
+    counts too large for a dense matrix. ``d[i][j]`` computes one pair and
+    ``d[rows, cols]`` computes the requested pairs element-wise.
+    """
+
+    def __init__(self, coords: np.ndarray):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        lat = np.radians(coords[:, 0])
+        lng = np.radians(coords[:, 1])
+        cos_lat = np.cos(lat)
+        self._unit = np.column_stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)])
+        self._unit_rows = self._unit.tolist()
+        self.shape = (len(coords), len(coords))
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows, cols = key
+            dot = (self._unit[rows] * self._unit[cols]).sum(axis=-1)
+            a = np.clip((1.0 - dot) * 0.5, 0.0, 1.0)
+            return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+        return _HaversineRow(self._unit_rows, key)
+
+
+class _HaversineRow:
+    __slots__ = ("_units", "_origin")
+
+    def __init__(self, units: List[List[float]], i: int):
+        self._units = units
+        self._origin = units[i]
+
+    def __getitem__(self, j: int) -> float:
+        x1, y1, z1 = self._origin
+        x2, y2, z2 = self._units[j]
+        a = (1.0 - (x1 * x2 + y1 * y2 + z1 * z2)) * 0.5
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))) if a > 0 else 0.0
+
+
+def distance_matrix(coords: np.ndarray):
+    """Dense haversine matrix for small inputs, an on-demand HaversineRows view otherwise"""
+    if len(coords) <= DENSE_MATRIX_LIMIT:
+        return haversine_matrix(coords)
+    return HaversineRows(coords)
+
+
+def order_coordinates(orders: Sequence[dict]) -> np.ndarray:
+    """(N, 2) array of delivery lat/lng for the given orders"""
+    return np.array(
+        [(o['delivery_latitude'], o['delivery_longitude']) for o in orders],
+        dtype=np.float64
+    ).reshape(-1, 2)
+
+
+def greedy_assign(coords: np.ndarray, num_riders: int, max_orders: int) -> List[List[int]]:
+    """
+    Assign stops to riders: each rider is seeded with one stop, then every
+    remaining stop is appended to the route whose last stop is nearest.
+    Returns a list of routes, each a list of indices into ``coords``.
+
+    Route tails live in a spatial index so each nearest-route lookup only
+    touches nearby riders instead of scanning all of them.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    routes = [[] for _ in range(num_riders)]
+
+    # Start with first order for each rider
+    seeded = min(num_riders, n)
+    tails = SpatialIndex(suggest_cell_km(coords[:max(seeded, 1)], points_per_cell=1.0),
+                         reference_lat=float(coords[:, 0].mean()) if n else None)
+    points = coords.tolist()
+    for rider_idx in range(seeded):
+        routes[rider_idx].append(rider_idx)
+        if max_orders > 1:
+            tails.insert(rider_idx, *points[rider_idx])
+
+    # Assign remaining orders to nearest existing route that still has room;
+    # full routes drop out of the index
+    for order_idx in range(seeded, n):
+        lat, lng = points[order_idx]
+        nearest = tails.nearest(lat, lng, k=1)
+        best_rider = nearest[0][0] if nearest else 0  # Every route full: overflow onto the first rider
+
+        routes[best_rider].append(order_idx)
+        if len(routes[best_rider]) >= max_orders:
+            tails.remove(best_rider)
+        elif best_rider in tails:
+            tails.insert(best_rider, lat, lng)
+
+    return routes
+
+
+def route_distance(dist, route: Sequence[int]) -> float:
+    """Total length (km) of a route visiting ``route`` stops in order"""
+    if len(route) < 2:
+        return 0.0
+    idx = np.asarray(route)
+    return float(dist[idx[:-1], idx[1:]].sum())
+
+
+AVERAGE_SPEED_KMPH = 30
+STOP_SERVICE_MINUTES = 5
+
+
+def estimate_duration_minutes(distance_km: float, num_stops: int) -> int:
+    """Estimate duration (assuming 30 km/h average speed + 5 min per stop)"""
+    return int((distance_km / AVERAGE_SPEED_KMPH) * 60 + num_stops * STOP_SERVICE_MINUTES)
+
+
+class Pace(NamedTuple):
+    """
+    Travel times per node and hour: ``minutes_per_km[node, h]`` for driving
+    to the node and ``dwell_minutes[node, h]`` spent there, where column h is
+    the h-th clock hour of the trip and departure is ``start_minute`` minutes
+    into the first one. Built from learned speeds (see travel_model).
+    """
+    minutes_per_km: np.ndarray
+    dwell_minutes: np.ndarray
+    start_minute: float = 0.0
+
+    def hour(self, elapsed: float) -> int:
+        """Column for ``elapsed`` minutes after departure; later hours reuse the last"""
+        return min(int((self.start_minute + elapsed) // 60), self.minutes_per_km.shape[1] - 1)
+
+    def dwell(self, node: int, elapsed: float) -> float:
+        return float(self.dwell_minutes[node, self.hour(elapsed)])
+
+
+def arrival_minutes(dist, path: Sequence[int], pace: Optional[Pace] = None) -> List[float]:
+    """
+    Minutes after leaving the first node of ``path`` at which each node is
+    reached, driving at AVERAGE_SPEED_KMPH and spending STOP_SERVICE_MINUTES
+    at every node before moving on, or at the times ``pace`` gives
+    """
+    arrivals = []
+    elapsed = 0.0
+    for k, node in enumerate(path):
+        if k > 0:
+            km = dist[path[k - 1]][node]
+            if pace is None:
+                elapsed += km / AVERAGE_SPEED_KMPH * 60 + STOP_SERVICE_MINUTES
+            else:
+                elapsed += pace.dwell(path[k - 1], elapsed)
+                elapsed += km * float(pace.minutes_per_km[node, pace.hour(elapsed)])
+        arrivals.append(elapsed)
+    return arrivals
+
+
+# Capacitated vehicle routing
+#
+# Routes are open paths (riders do not return to the restaurant). A solve is
+# a spatial seed (sweep or k-means clustering) followed by local search:
+# 2-opt within a route, 2-opt* tail exchange between routes and Or-opt
+# segment moves within and between routes, all bounded by a time budget.
+
+ROUTING_ALGORITHMS = ("greedy", "sweep", "kmeans")
+# "distance" minimises total km; "makespan" then shortens the route that
+# finishes last, trading some km for an earlier end to the delivery round
+ROUTING_OBJECTIVES = ("distance", "makespan")
+MAKESPAN_SEARCH_SHARE = 0.75  # Budget share for the distance search before balancing
+DEFAULT_TIME_BUDGET_MS = 2000
+NEIGHBOUR_COUNT = 10
+OR_OPT_MAX_SEGMENT = 3
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LNG_EQUATOR = 111.320
+
+
+def project_km(coords: np.ndarray, center=None) -> np.ndarray:
+    """Equirectangular projection of lat/lng to planar km around ``center`` (default: the centroid)"""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    center = coords.mean(axis=0) if center is None else np.asarray(center, dtype=np.float64)
+    scale_lng = KM_PER_DEG_LNG_EQUATOR * math.cos(math.radians(center[0]))
+    return np.column_stack([
+        (coords[:, 1] - center[1]) * scale_lng,
+        (coords[:, 0] - center[0]) * KM_PER_DEG_LAT,
+    ])
+
+
+def balanced_sizes(n: int, num_routes: int) -> List[int]:
+    """Split n stops into num_routes loads that differ by at most one"""
+    base, extra = divmod(n, num_routes)
+    return [base + 1 if i < extra else base for i in range(num_routes)]
+
+
+def sweep_seed(coords: np.ndarray, num_riders: int, center=None) -> List[List[int]]:
+    """
+    Sweep clustering: sort stops by polar angle around the centroid (or the
+    depot, when routes start from one) and cut the sweep into equally loaded
+    sectors.
+
+    With many riders, single sectors become long thin wedges, so stops are
+    first split by distance from the centre into about sqrt(riders) / 2
+    concentric bands and each band is swept on its own.
+    """
+    n = len(coords)
+    k = min(num_riders, n)
+    xy = project_km(coords, center)
+    radius = np.hypot(xy[:, 0], xy[:, 1])
+    angles = np.arctan2(xy[:, 1], xy[:, 0])
+    loads = balanced_sizes(n, k)
+    num_bands = max(1, round(math.sqrt(k) / 2))
+
+    by_radius = np.argsort(radius, kind="stable")
+    routes = []
+    start = 0
+    first_rider = 0
+    for band_riders in balanced_sizes(k, num_bands):
+        band_loads = loads[first_rider:first_rider + band_riders]
+        first_rider += band_riders
+        members = by_radius[start:start + sum(band_loads)]
+        start += sum(band_loads)
+
+        order = members[np.argsort(angles[members], kind="stable")]
+        # Start the sweep at the widest angular gap so no sector straddles it
+        sorted_angles = angles[order]
+        gaps = np.diff(np.append(sorted_angles, sorted_angles[0] + 2 * np.pi))
+        order = np.roll(order, -((int(np.argmax(gaps)) + 1) % len(order)))
+
+        offset = 0
+        for load in band_loads:
+            routes.append([int(i) for i in order[offset:offset + load]])
+            offset += load
+    return routes
+
+
+def _capacitated_assignment(sq: np.ndarray, capacity: int) -> List[List[int]]:
+    """
+    Assign points to clusters closest-pair-first, each cluster up to
+    capacity. Only each point's few nearest clusters are ranked; stragglers
+    whose near clusters all filled up go to the nearest one with room.
+    """
+    n, k = sq.shape
+    near = min(k, 16)
+    candidates = np.argpartition(sq, near - 1, axis=1)[:, :near] if near < k else np.tile(np.arange(k), (n, 1))
+    candidate_sq = np.take_along_axis(sq, candidates, axis=1)
+    clusters = [[] for _ in range(k)]
+    assigned = np.zeros(n, dtype=bool)
+    full = np.zeros(k, dtype=bool)
+    for flat in np.argsort(candidate_sq, axis=None, kind="stable").tolist():
+        point, slot = divmod(flat, near)
+        cluster = int(candidates[point, slot])
+        if assigned[point] or full[cluster]:
+            continue
+        clusters[cluster].append(point)
+        assigned[point] = True
+        full[cluster] = len(clusters[cluster]) >= capacity
+    for point in np.flatnonzero(~assigned).tolist():
+        cluster = int(np.argmin(np.where(full, np.inf, sq[point])))
+        clusters[cluster].append(point)
+        full[cluster] = len(clusters[cluster]) >= capacity
+    return clusters
+
+
+def kmeans_seed(coords: np.ndarray, num_riders: int, capacity: int, iterations: int = 5,
+                seed: int = 0, deadline: Optional[float] = None) -> List[List[int]]:
+    """
+    k-means clustering (k-means++ initialisation) with capacity-constrained
+    refinement: after a few plain Lloyd iterations, centers are re-fitted to
+    the capacity-respecting assignment so they migrate towards dense areas
+    instead of spilling their overflow onto distant clusters. Refinement
+    stops early once ``deadline`` (a perf_counter value) has passed.
+    """
+    n = len(coords)
+    k = min(num_riders, n)
+    xy = project_km(coords)
+    rng = np.random.default_rng(seed)
+
+    centers = np.empty((k, 2))
+    centers[0] = xy[rng.integers(n)]
+    closest_sq = ((xy - centers[0]) ** 2).sum(axis=1)
+    for c in range(1, k):
+        cumulative = np.cumsum(closest_sq)
+        if cumulative[-1] > 0:
+            pick = int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side="right"))
+        else:
+            pick = int(rng.integers(n))
+        centers[c] = xy[min(pick, n - 1)]
+        closest_sq = np.minimum(closest_sq, ((xy - centers[c]) ** 2).sum(axis=1))
+
+    point_sq = (xy ** 2).sum(axis=1)[:, None]
+
+    def squared_distances(centers):
+        return point_sq - 2 * xy @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+
+    def refit(labels):
+        counts = np.bincount(labels, minlength=k)
+        occupied = counts > 0
+        new_centers = centers.copy()
+        new_centers[occupied, 0] = np.bincount(labels, weights=xy[:, 0], minlength=k)[occupied] / counts[occupied]
+        new_centers[occupied, 1] = np.bincount(labels, weights=xy[:, 1], minlength=k)[occupied] / counts[occupied]
+        return new_centers
+
+    def out_of_time():
+        return deadline is not None and time.perf_counter() >= deadline
+
+    for _ in range(iterations):
+        new_centers = refit(squared_distances(centers).argmin(axis=1))
+        if np.allclose(new_centers, centers) or out_of_time():
+            break
+        centers = new_centers
+
+    clusters = _capacitated_assignment(squared_distances(centers), capacity)
+    for _ in range(iterations):
+        if out_of_time():
+            break
+        labels = np.empty(n, dtype=np.int64)
+        for c, members in enumerate(clusters):
+            labels[members] = c
+        new_centers = refit(labels)
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+        clusters = _capacitated_assignment(squared_distances(centers), capacity)
+    return clusters
+
+
+def nearest_neighbour_sequence(coords: np.ndarray, stops: Sequence[int], start=None) -> List[int]:
+    """
+    Order a cluster as a nearest-neighbour path starting from its outermost
+    stop, or from the stop closest to ``start`` (lat, lng) when given
+    """
+    if len(stops) <= 1 or (len(stops) == 2 and start is None):
+        return list(stops)
+    remaining = list(stops)
+    if start is not None:
+        sub = haversine_matrix(np.vstack([coords[np.asarray(remaining)], start]))
+        current = int(np.argmin(sub[-1, :-1]))
+        sub = sub[:-1, :-1]
+    else:
+        sub = haversine_matrix(coords[np.asarray(remaining)])
+        current = int(np.argmax(sub.sum(axis=1)))
+    path = [remaining[current]]
+    visited = np.zeros(len(remaining), dtype=bool)
+    visited[current] = True
+    for _ in range(len(remaining) - 1):
+        row = np.where(visited, np.inf, sub[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        path.append(remaining[current])
+    return path
+
+
+def nearest_neighbours(coords: np.ndarray, k: int) -> List[List[int]]:
+    """The k closest other stops for every stop, nearest first"""
+    return knn_graph(coords, k)
+
+
+class _LocalSearch:
+    """
+    Improves a set of open routes in place under a capacity and a deadline.
+    ``starts`` optionally gives each route a fixed first node in ``dist``
+    (e.g. the pickup depot) that is never moved.
+    """
+
+    def __init__(self, dist, routes: List[List[int]], capacity: int,
+                 neighbours: List[List[int]], deadline: float,
+                 progress: Optional[Callable[[], None]] = None,
+                 starts: Optional[List[Optional[int]]] = None,
+                 minutes_per_km: float = 60 / AVERAGE_SPEED_KMPH,
+                 stop_minutes: float = STOP_SERVICE_MINUTES):
+        # Plain nested lists are several times faster to index than ndarrays
+        self.d = dist.tolist() if isinstance(dist, np.ndarray) else dist
+        self.minutes_per_km = minutes_per_km
+        self.stop_minutes = stop_minutes
+        self.routes = routes
+        self.capacity = capacity
+        self.neighbours = neighbours
+        self.deadline = deadline
+        self.progress = progress or (lambda: None)
+        self.starts = starts or [None] * len(routes)
+        self.route_of = {}
+        for r, route in enumerate(routes):
+            for node in route:
+                self.route_of[node] = r
+        self.costs = [self.path_cost(route, self.starts[r]) for r, route in enumerate(routes)]
+
+    def path_cost(self, route: Sequence[int], start: Optional[int] = None) -> float:
+        d = self.d
+        cost = sum(d[route[i]][route[i + 1]] for i in range(len(route) - 1))
+        if start is not None and route:
+            cost += d[start][route[0]]
+        return cost
+
+    def expired(self) -> bool:
+        return time.perf_counter() >= self.deadline
+
+    def run(self):
+        improved = True
+        while improved and not self.expired():
+            improved = False
+            for r in range(len(self.routes)):
+                improved |= self.two_opt(r)
+                self.progress()
+            improved |= self.or_opt()
+            improved |= self.two_opt_star()
+
+    def _set_route(self, r: int, route: List[int], cost: float):
+        self.routes[r] = route
+        self.costs[r] = cost
+        for node in route:
+            self.route_of[node] = r
+
+    def _route_matrix(self, nodes: List[int]):
+        """
+        Distances among ``nodes`` for repeated lookups. On-demand matrices are
+        evaluated once here with numpy instead of pair by pair in the loops.
+        """
+        if not isinstance(self.d, HaversineRows):
+            return self.d
+        idx = np.asarray(nodes, dtype=np.intp)
+        sub = self.d[idx[:, None], idx[None, :]].tolist()
+        return {a: dict(zip(nodes, row)) for a, row in zip(nodes, sub)}
+
+    def two_opt(self, r: int) -> bool:
+        """Reverse sub-paths of one route while that shortens it"""
+        route = self.routes[r]
+        start = self.starts[r]
+        d = self._route_matrix(route + ([start] if start is not None else []))
+        n = len(route)
+        improved_any = False
+        improved = True
+        while improved and not self.expired():
+            improved = False
+            for i in range(n - 1):
+                a_prev = route[i - 1] if i > 0 else start
+                a = route[i]
+                for j in range(i + 1, n):
+                    b = route[j]
+                    b_next = route[j + 1] if j + 1 < n else None
+                    before = (d[a_prev][a] if a_prev is not None else 0.0) + \
+                             (d[b][b_next] if b_next is not None else 0.0)
+                    after = (d[a_prev][b] if a_prev is not None else 0.0) + \
+                            (d[a][b_next] if b_next is not None else 0.0)
+                    if after < before - 1e-9:
+                        route[i:j + 1] = route[i:j + 1][::-1]
+                        a = route[i]
+                        improved = improved_any = True
+        if improved_any:
+            self.costs[r] = self.path_cost(route, start)
+        return improved_any
+
+    def _removal_gain(self, route: List[int], i: int, length: int, start: Optional[int]) -> float:
+        """Distance saved by cutting route[i:i+length] out and joining its neighbours"""
+        d = self.d
+        prev = route[i - 1] if i > 0 else start
+        nxt = route[i + length] if i + length < len(route) else None
+        first, last = route[i], route[i + length - 1]
+        gain = 0.0
+        if prev is not None:
+            gain += d[prev][first]
+        if nxt is not None:
+            gain += d[last][nxt]
+        if prev is not None and nxt is not None:
+            gain -= d[prev][nxt]
+        return gain
+
+    def or_opt(self) -> bool:
+        """Relocate segments of 1..3 stops next to one of their nearest neighbours"""
+        improved_any = False
+        for r in range(len(self.routes)):
+            self.progress()
+            for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+                i = 0
+                while i + length <= len(self.routes[r]):
+                    if self.expired():
+                        return improved_any
+                    if self._try_relocate(r, i, length):
+                        improved_any = True
+                    else:
+                        i += 1
+        return improved_any
+
+    def _insertion_cost(self, route: List[int], pos: int, seg: List[int], start: Optional[int]) -> float:
+        """Distance added by inserting seg before route[pos]"""
+        d = self.d
+        a = route[pos - 1] if pos > 0 else start
+        b = route[pos] if pos < len(route) else None
+        added = 0.0
+        if a is not None:
+            added += d[a][seg[0]]
+        if b is not None:
+            added += d[seg[-1]][b]
+        if a is not None and b is not None:
+            added -= d[a][b]
+        return added
+
+    def _try_relocate(self, r: int, i: int, length: int) -> bool:
+        route = self.routes[r]
+        segment = route[i:i + length]
+        remaining = route[:i] + route[i + length:]
+        gain = self._removal_gain(route, i, length, self.starts[r])
+        best = None
+        best_delta = -1e-9
+
+        for anchor in self.neighbours[segment[0]] + self.neighbours[segment[-1]]:
+            r2 = self.route_of[anchor]
+            if r2 == r:
+                if anchor in segment:
+                    continue
+                target = remaining
+            else:
+                # Keep every requested rider in use and every route within capacity
+                if not remaining or len(self.routes[r2]) + length > self.capacity:
+                    continue
+                target = self.routes[r2]
+            p = target.index(anchor)
+            # Insert right before or right after the anchor, in either direction
+            for pos in (p, p + 1):
+                for seg in (segment, segment[::-1]):
+                    delta = self._insertion_cost(target, pos, seg, self.starts[r2]) - gain
+                    if delta < best_delta:
+                        best_delta = delta
+                        best = (r2, pos, seg)
+
+        if best is None:
+            return False
+        r2, pos, seg = best
+        if r2 == r:
+            new_route = remaining[:pos] + seg + remaining[pos:]
+            self._set_route(r, new_route, self.path_cost(new_route, self.starts[r]))
+        else:
+            target = self.routes[r2]
+            new_target = target[:pos] + seg + target[pos:]
+            self._set_route(r, remaining, self.path_cost(remaining, self.starts[r]))
+            self._set_route(r2, new_target, self.path_cost(new_target, self.starts[r2]))
+        return True
+
+    def duration(self, r: int) -> float:
+        """Minutes route r takes, counting a service stop at its start node"""
+        stops = len(self.routes[r]) + (self.starts[r] is not None)
+        return self.costs[r] * self.minutes_per_km + stops * self.stop_minutes
+
+    def balance(self) -> bool:
+        """Move stops off the route that finishes last while that brings the latest finish forward"""
+        improved_any = False
+        while not self.expired():
+            durations = [self.duration(r) for r in range(len(self.routes))]
+            worst = max(range(len(durations)), key=durations.__getitem__)
+            if not self._shed(worst, durations):
+                break
+            improved_any = True
+        return improved_any
+
+    def _shed(self, r: int, durations: List[float]) -> bool:
+        """
+        Relocate a segment of the latest-finishing route r. Moves are ranked by
+        the resulting latest finish over all routes, then by the km they add,
+        so stops are not dragged far once r is no longer the bottleneck.
+        """
+        route = self.routes[r]
+        minutes_per_km, stop_minutes = self.minutes_per_km, self.stop_minutes
+        idle = min(range(len(self.routes)), key=durations.__getitem__)
+        # Latest finish among the routes a move leaves untouched
+        ranked = sorted(range(len(durations)), key=durations.__getitem__, reverse=True)[:3]
+
+        def untouched_finish(r2):
+            return next((durations[q] for q in ranked if q not in (r, r2)), 0.0)
+
+        best = None
+        best_key = None
+
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            if len(route) - length < 1:
+                break
+            for i in range(len(route) - length + 1):
+                segment = route[i:i + length]
+                gain = self._removal_gain(route, i, length, self.starts[r])
+                finish_r = durations[r] - gain * minutes_per_km - length * stop_minutes
+
+                # Next to a nearby stop on another route, or anywhere on the least busy route
+                candidates = []
+                for anchor in self.neighbours[segment[0]] + self.neighbours[segment[-1]]:
+                    r2 = self.route_of[anchor]
+                    if r2 != r:
+                        p = self.routes[r2].index(anchor)
+                        candidates += [(r2, p), (r2, p + 1)]
+                if idle != r:
+                    candidates += [(idle, p) for p in range(len(self.routes[idle]) + 1)]
+
+                for r2, pos in candidates:
+                    if len(self.routes[r2]) + length > self.capacity:
+                        continue
+                    for seg in (segment, segment[::-1]):
+                        added = self._insertion_cost(self.routes[r2], pos, seg, self.starts[r2])
+                        finish_r2 = durations[r2] + added * minutes_per_km + length * stop_minutes
+                        if max(finish_r, finish_r2) >= durations[r] - 1e-9:
+                            continue
+                        key = (round(max(finish_r, finish_r2, untouched_finish(r2)), 6), added - gain)
+                        if best_key is None or key < best_key:
+                            best_key = key
+                            best = (i, length, r2, pos, seg)
+
+        if best is None:
+            return False
+        i, length, r2, pos, seg = best
+        remaining = route[:i] + route[i + length:]
+        target = self.routes[r2]
+        new_target = target[:pos] + seg + target[pos:]
+        self._set_route(r, remaining, self.path_cost(remaining, self.starts[r]))
+        self._set_route(r2, new_target, self.path_cost(new_target, self.starts[r2]))
+        self.two_opt(r)
+        self.two_opt(r2)
+        return True
+
+    def two_opt_star(self) -> bool:
+        """Exchange route tails between two routes (inter-route 2-opt)"""
+        improved_any = False
+        for u in range(len(self.route_of)):
+            if self.expired():
+                break
+            ru = self.route_of[u]
+            for v in self.neighbours[u]:
+                rv = self.route_of[v]
+                if rv == ru:
+                    continue
+                a, b = self.routes[ru], self.routes[rv]
+                i, q = a.index(u), b.index(v)
+                # u becomes the predecessor of v: a[:i+1] + b[q:], b[:q] + a[i+1:]
+                new_a = a[:i + 1] + b[q:]
+                new_b = b[:q] + a[i + 1:]
+                if len(new_a) > self.capacity or len(new_b) > self.capacity or not new_b:
+                    continue
+                cost_a = self.path_cost(new_a, self.starts[ru])
+                cost_b = self.path_cost(new_b, self.starts[rv])
+                if cost_a + cost_b < self.costs[ru] + self.costs[rv] - 1e-9:
+                    self._set_route(ru, new_a, cost_a)
+                    self._set_route(rv, new_b, cost_b)
+                    improved_any = True
+                    break
+        return improved_any
+
+
+def check_capacity(n: int, num_riders: int, max_orders: int):
+    """Raise ValueError when the riders cannot carry every order between them"""
+    if num_riders * max_orders < n:
+        raise ValueError(
+            f"{n} orders exceed the capacity of {num_riders} riders x {max_orders} orders"
+        )
+
+
+def solve_routes(
+    coords: np.ndarray,
+    num_riders: int,
+    max_orders: int,
+    algorithm: str = "sweep",
+    time_budget_ms: int = DEFAULT_TIME_BUDGET_MS,
+    dist=None,
+    progress: Optional[Callable[[float], None]] = None,
+    depot=None,
+    objective: str = "distance",
+    minutes_per_km: float = 60 / AVERAGE_SPEED_KMPH,
+    stop_minutes: float = STOP_SERVICE_MINUTES,
+) -> List[List[int]]:
+    """
+    Capacitated routing of the stops in ``coords`` over ``num_riders`` riders
+    with at most ``max_orders`` stops each. Returns routes as lists of stop
+    indices in visiting order. ``dist`` may pass in a precomputed
+    distance_matrix(coords) to avoid building it twice. ``progress`` is called
+    with the fraction of the time budget used so far (0..1).
+
+    When ``depot`` (lat, lng) is given every route starts there, e.g. at the
+    pickup restaurant; ``dist`` must then cover the stops followed by the
+    depot as its last row. Routes still list stop indices only.
+
+    ``objective`` "makespan" spends the last part of the budget moving stops
+    off whichever route finishes last (see ROUTING_OBJECTIVES), timing routes
+    at ``minutes_per_km`` plus ``stop_minutes`` per stop.
+    """
+    if algorithm not in ROUTING_ALGORITHMS:
+        raise ValueError(f"Unknown routing algorithm: {algorithm}")
+    if objective not in ROUTING_OBJECTIVES:
+        raise ValueError(f"Unknown routing objective: {objective}")
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if algorithm == "greedy":
+        return greedy_assign(coords, num_riders, max_orders)
+
+    n = len(coords)
+    if n == 0:
+        return []
+    check_capacity(n, num_riders, max_orders)
+
+    started = time.perf_counter()
+    deadline = started + time_budget_ms / 1000
+
+    def report():
+        if progress is not None:
+            progress(min(1.0, (time.perf_counter() - started) * 1000 / time_budget_ms))
+
+    if dist is None:
+        dist = distance_matrix(coords if depot is None else np.vstack([coords, depot]))
+    elif isinstance(dist, np.ndarray) and not np.array_equal(dist, dist.T):
+        # 2-opt reverses sub-paths, which assumes d[a][b] == d[b][a]; search
+        # asymmetric (road) distances on their average instead
+        dist = (dist + dist.T) / 2
+    if algorithm == "kmeans":
+        # Leave at least half of the budget for local search
+        clusters = kmeans_seed(coords, num_riders, max_orders, deadline=started + time_budget_ms / 2000)
+    else:
+        clusters = sweep_seed(coords, num_riders, center=depot)
+    routes = [nearest_neighbour_sequence(coords, c, start=depot) for c in clusters]
+    report()
+
+    starts = None if depot is None else [n] * len(routes)
+    neighbours = nearest_neighbours(coords, NEIGHBOUR_COUNT)
+    if objective == "makespan":
+        # Split what is left after seeding, which kmeans may have used half of
+        now = time.perf_counter()
+        search_deadline = now + MAKESPAN_SEARCH_SHARE * max(0.0, deadline - now)
+        search = _LocalSearch(dist, routes, max_orders, neighbours, search_deadline, report, starts,
+                              minutes_per_km, stop_minutes)
+        search.run()
+        search.deadline = deadline
+        search.balance()
+    else:
+        search = _LocalSearch(dist, routes, max_orders, neighbours, deadline, report, starts)
+        search.run()
+    return search.routes
+
+
+def pickup_tour(dist, pickups: Sequence[int], first_stop: Optional[int]) -> List[int]:
+    """
+    Visiting order for a route's pickup nodes: start with the one farthest from
+    the first delivery and hop to the nearest remaining one, so the tour ends
+    next to the deliveries
+    """
+    remaining = list(pickups)
+    if len(remaining) <= 1 or first_stop is None:
+        return remaining
+    current = max(remaining, key=lambda p: dist[p][first_stop])
+    tour = [current]
+    remaining.remove(current)
+    while remaining:
+        current = min(remaining, key=lambda p: dist[current][p])
+        tour.append(current)
+        remaining.remove(current)
+    return tour
+
+
+def _pickup_groups(dist, n: int, pickup_of: Sequence[int], num_riders: int,
+                   max_orders: int, merge_within_km: float = 0.0) -> List[List[int]]:
+    """
+    Group stops by pickup node. When there are too few riders to give every
+    pickup its own routes, or when pickups are within ``merge_within_km`` of
+    each other, the groups with the closest pickups are merged so their
+    riders collect from several restaurants.
+    """
+    members: dict = {}
+    for stop, pickup in enumerate(pickup_of):
+        members.setdefault(int(pickup), []).append(stop)
+    groups = [(sorted({pickup}), stops) for pickup, stops in members.items()]
+
+    def riders_needed(gs):
+        return sum(math.ceil(len(stops) / max_orders) for _, stops in gs)
+
+    while len(groups) > 1:
+        best = None
+        for a in range(len(groups)):
+            for b in range(a + 1, len(groups)):
+                gap = min(dist[n + p][n + q] for p in groups[a][0] for q in groups[b][0])
+                if best is None or gap < best[0]:
+                    best = (gap, a, b)
+        gap, a, b = best
+        if gap >= merge_within_km and riders_needed(groups) <= num_riders:
+            break
+        merged = (sorted(groups[a][0] + groups[b][0]), groups[a][1] + groups[b][1])
+        groups = [g for i, g in enumerate(groups) if i not in (a, b)] + [merged]
+    return groups
+
+
+class RoutePlan(NamedTuple):
+    """
+    Output of plan_routes. Per route: stop indices in visiting order, pickup
+    indices visited before them, km for the whole trip, each stop's arrival
+    in minutes after departure, and the minute the last stop is finished.
+    ``unserved`` lists stops dropped because they fall outside the window.
+    """
+    routes: List[List[int]]
+    pickups: List[List[int]]
+    route_km: List[float]
+    etas: List[List[float]]
+    finish_minutes: List[float]
+    unserved: List[int]
+
+
+def plan_routes(
+    coords: np.ndarray,
+    num_riders: int,
+    max_orders: int,
+    algorithm: str = "sweep",
+    time_budget_ms: int = DEFAULT_TIME_BUDGET_MS,
+    dist=None,
+    progress: Optional[Callable[[float], None]] = None,
+    pickup_coords=None,
+    pickup_of: Optional[Sequence[int]] = None,
+    objective: str = "distance",
+    window_minutes: Optional[float] = None,
+    merge_pickups_km: float = 0.0,
+    pace: Optional[Pace] = None,
+) -> RoutePlan:
+    """
+    Solve routes, schedule them and measure them.
+
+    In pickup-and-delivery mode ``pickup_coords`` holds the restaurants and
+    ``pickup_of[i]`` the restaurant of stop i; every route starts at its
+    restaurant(s), and its km and ETAs include the pickup legs. ``dist`` then
+    covers the stops followed by the pickups.
+
+    ``merge_pickups_km`` lets routes share pickups that are within that
+    distance of each other even when there are riders to spare.
+
+    ``window_minutes`` is a hard delivery window measured from departure:
+    stops the rider would reach after it are cut from the end of their route
+    and reported as unserved.
+
+    ``pace`` (over the same nodes as ``dist``) times the schedule; the solver
+    balances makespan on its average speed and dwell.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    timing = {}
+    if pace is not None:
+        timing = {"minutes_per_km": float(pace.minutes_per_km.mean()),
+                  "stop_minutes": float(pace.dwell_minutes.mean())}
+    if pickup_coords is None:
+        if dist is None:
+            dist = distance_matrix(coords)
+        routes = solve_routes(coords, num_riders, max_orders, algorithm, time_budget_ms, dist, progress,
+                              objective=objective, **timing)
+        pickups = [[] for _ in routes]
+    else:
+        pickup_coords = np.asarray(pickup_coords, dtype=np.float64).reshape(-1, 2)
+        if dist is None:
+            dist = distance_matrix(np.vstack([coords, pickup_coords]))
+        routes, pickups = _solve_pickup_routes(coords, pickup_coords, pickup_of, num_riders, max_orders,
+                                               algorithm, time_budget_ms, dist, progress, objective,
+                                               merge_pickups_km, **timing)
+    return schedule_routes(dist, n, routes, pickups, window_minutes, pace)
+
+
+def schedule_routes(dist, n: int, routes: List[List[int]], pickups: List[List[int]],
+                    window_minutes: Optional[float] = None, pace: Optional[Pace] = None) -> RoutePlan:
+    """
+    ETAs and km for routes that are already decided, as a RoutePlan. Pickup
+    p is node n + p in ``dist``; stops past ``window_minutes`` are unserved.
+    ``pace`` replaces the default speed and stop time.
+    """
+    served_routes, route_km, etas, finish_minutes, unserved = [], [], [], [], []
+    for route, route_pickups in zip(routes, pickups):
+        path = [n + p for p in route_pickups] + route
+        arrivals = arrival_minutes(dist, path, pace)[len(route_pickups):]
+        if window_minutes is not None:
+            # Arrivals only grow along a route, so the late stops are a suffix
+            on_time = sum(1 for minute in arrivals if minute <= window_minutes)
+            unserved += route[on_time:]
+            route, arrivals = route[:on_time], arrivals[:on_time]
+            path = [n + p for p in route_pickups] + route
+        served_routes.append(route)
+        route_km.append(route_distance(dist, path))
+        etas.append(arrivals)
+        if not route:
+            finish_minutes.append(0.0)
+        elif pace is None:
+            finish_minutes.append(arrivals[-1] + STOP_SERVICE_MINUTES)
+        else:
+            finish_minutes.append(arrivals[-1] + pace.dwell(route[-1], arrivals[-1]))
+    return RoutePlan(served_routes, pickups, route_km, etas, finish_minutes, unserved)
+
+
+# Restaurants closer than this share routes when pooled across vendors
+POOL_MERGE_KM = 2.0
+
+
+class PoolingResult(NamedTuple):
+    """A pooled plan and, for comparison, the same stops planned per pickup"""
+    plan: RoutePlan
+    separate_km: float
+    separate_riders: int
+
+
+def pool_routes(
+    coords: np.ndarray,
+    pickup_coords,
+    pickup_of: Sequence[int],
+    num_riders: int,
+    max_orders: int,
+    algorithm: str = "sweep",
+    time_budget_ms: int = DEFAULT_TIME_BUDGET_MS,
+    objective: str = "distance",
+    window_minutes: Optional[float] = None,
+    merge_pickups_km: float = POOL_MERGE_KM,
+    pace: Optional[Pace] = None,
+) -> PoolingResult:
+    """
+    Plan stops from several pickups (e.g. restaurants of different vendors)
+    with one shared set of riders; pickups within ``merge_pickups_km`` of
+    each other share multi-pickup routes. The baseline plans each pickup's stops on their own with the
+    fewest riders that can carry them, under the same window and a share
+    of the same time budget.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    pickup_coords = np.asarray(pickup_coords, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    plan = plan_routes(coords, num_riders, max_orders, algorithm, time_budget_ms,
+                       pickup_coords=pickup_coords, pickup_of=pickup_of,
+                       objective=objective, window_minutes=window_minutes,
+                       merge_pickups_km=merge_pickups_km, pace=pace)
+
+    separate_km, separate_riders = 0.0, 0
+    for pickup in sorted(set(int(p) for p in pickup_of)):
+        stops = [i for i, p in enumerate(pickup_of) if p == pickup]
+        alone_pace = None
+        if pace is not None:
+            rows = stops + [n + pickup]
+            alone_pace = Pace(pace.minutes_per_km[rows], pace.dwell_minutes[rows], pace.start_minute)
+        alone = plan_routes(coords[stops], math.ceil(len(stops) / max_orders), max_orders, algorithm,
+                            max(1, time_budget_ms * len(stops) / n),
+                            pickup_coords=pickup_coords[[pickup]], pickup_of=[0] * len(stops),
+                            objective=objective, window_minutes=window_minutes, pace=alone_pace)
+        separate_km += sum(alone.route_km)
+        separate_riders += sum(1 for route in alone.routes if route)
+    return PoolingResult(plan, separate_km, separate_riders)
+
+
+def repair_routes(
+    dist,
+    routes: List[List[int]],
+    max_orders: int,
+    insert: Sequence[int] = (),
+    removed: Sequence[int] = (),
+    locked: Optional[set] = None,
+) -> Tuple[List[List[int]], List[int]]:
+    """
+    Patch an existing plan by cheapest insertion instead of solving again.
+
+    The stops in ``insert`` and the movable stops of the ``removed`` routes are
+    placed one at a time, always taking the cheapest (stop, route, position)
+    left. Stops in ``locked`` (already with their rider) keep their route and
+    order, and nothing is inserted before them; a removed route keeps only
+    its locked stops. Returns the new routes (same indices) and the stops
+    that found no route with spare capacity.
+    """
+    locked = locked or set()
+    routes = [list(route) for route in routes]
+    removed = set(removed)
+    pending = list(insert)
+    for r in removed:
+        pending += [stop for stop in routes[r] if stop not in locked]
+        routes[r] = [stop for stop in routes[r] if stop in locked]
+
+    open_routes = [r for r in range(len(routes)) if r not in removed]
+    # Distances to and from each pending stop as plain lists, and every open
+    # route's leg lengths, keep the position scans free of matrix lookups
+    size = dist.shape[0]
+    if isinstance(dist, np.ndarray):
+        to_stop = {stop: dist[:, stop].tolist() for stop in pending}
+        from_stop = {stop: dist[stop].tolist() for stop in pending}
+    else:
+        everyone = np.arange(size)
+        from_stop = {stop: dist[np.full(size, stop), everyone].tolist() for stop in pending}
+        to_stop = from_stop  # On-demand matrices are haversine, hence symmetric
+
+    def legs(route: List[int]) -> List[float]:
+        return [dist[a][b] for a, b in zip(route, route[1:])]
+
+    route_legs = {r: legs(routes[r]) for r in open_routes}
+    first_free = {
+        r: max((i + 1 for i, stop in enumerate(routes[r]) if stop in locked), default=0)
+        for r in open_routes
+    }
+
+    def insertion(stop: int, r: int) -> Tuple[float, int]:
+        """Cheapest (added km, position) for ``stop`` in route r"""
+        route = routes[r]
+        if len(route) >= max_orders:
+            return math.inf, -1
+        to_s, from_s, leg = to_stop[stop], from_stop[stop], route_legs[r]
+        best = (math.inf, -1)
+        for pos in range(first_free[r], len(route) + 1):
+            if pos == 0:
+                added = from_s[route[0]] if route else 0.0
+            elif pos == len(route):
+                added = to_s[route[-1]]
+            else:
+                added = to_s[route[pos - 1]] + from_s[route[pos]] - leg[pos - 1]
+            if added < best[0]:
+                best = (added, pos)
+        return best
+
+    # Every pending stop's cheapest slot per route, and the best of those;
+    # inserting into route r only invalidates the entries for r
+    options = {stop: {r: insertion(stop, r) for r in open_routes} for stop in pending}
+
+    def best_route(stop: int) -> Optional[int]:
+        return min(options[stop], key=lambda r: options[stop][r][0], default=None)
+
+    best = {stop: best_route(stop) for stop in pending}
+    unassigned = []
+    while options:
+        stop = min(options, key=lambda s: options[s][best[s]][0] if best[s] is not None else math.inf)
+        r = best[stop]
+        if r is None or options[stop][r][0] == math.inf:
+            unassigned += list(options)
+            break
+        routes[r].insert(options[stop][r][1], stop)
+        route_legs[r] = legs(routes[r])
+        del options[stop], best[stop]
+        for other in options:
+            previous = options[other][r][0]
+            options[other][r] = insertion(other, r)
+            if best[other] == r and options[other][r][0] > previous:
+                best[other] = best_route(other)
+            elif options[other][r][0] < options[other][best[other]][0]:
+                best[other] = r
+    return routes, unassigned
+
+
+def _solve_pickup_routes(coords, pickup_coords, pickup_of, num_riders, max_orders, algorithm,
+                         time_budget_ms, dist, progress, objective, merge_pickups_km=0.0,
+                         **timing):
+    """Routes (stop indices) and the pickups each one visits first, in order"""
+    n = len(coords)
+    if algorithm != "greedy":
+        check_capacity(n, num_riders, max_orders)
+    groups = _pickup_groups(dist, n, pickup_of, num_riders, max_orders, merge_pickups_km)
+
+    # Riders go to each group in proportion to its orders, never below what
+    # its capacity needs; leftover riders go to the largest remainders
+    needed = [math.ceil(len(stops) / max_orders) for _, stops in groups]
+    share = [num_riders * len(stops) / n for _, stops in groups]
+    riders = [max(need, int(s)) for need, s in zip(needed, share)]
+    by_remainder = sorted(range(len(groups)), key=lambda g: share[g] - int(share[g]), reverse=True)
+    i = 0
+    while sum(riders) < num_riders:
+        riders[by_remainder[i % len(groups)]] += 1
+        i += 1
+    while sum(riders) > num_riders:
+        # Only possible when a single group needs more riders than exist
+        g = max(range(len(groups)), key=lambda g: riders[g] - needed[g])
+        riders[g] -= 1
+
+    routes, pickups = [], []
+    done_ms = 0.0
+    for (group_pickups, stops), group_riders in zip(groups, riders):
+        # The pickup nearest the group's deliveries anchors its routes
+        centroid = coords[stops].mean(axis=0)
+        anchor = min(group_pickups, key=lambda p: haversine_distance(tuple(pickup_coords[p]), tuple(centroid)))
+        idx = np.array(stops + [n + anchor])
+        sub = dist[np.ix_(idx, idx)] if isinstance(dist, np.ndarray) else \
+            distance_matrix(np.vstack([coords[stops], pickup_coords[anchor]]))
+        budget = max(1, time_budget_ms * len(stops) / n)
+
+        def group_progress(fraction, done_ms=done_ms, budget=budget):
+            if progress is not None:
+                progress(min(1.0, (done_ms + fraction * budget) / time_budget_ms))
+
+        group_routes = solve_routes(coords[stops], group_riders, max_orders, algorithm, budget,
+                                    dist=sub, progress=group_progress, depot=pickup_coords[anchor],
+                                    objective=objective, **timing)
+        done_ms += budget
+        for route in group_routes:
+            route = [stops[i] for i in route]
+            needed_pickups = sorted({int(pickup_of[stop]) for stop in route}) or [anchor]
+            tour = pickup_tour(dist, [n + p for p in needed_pickups], route[0] if route else None)
+            routes.append(route)
+            pickups.append([node - n for node in tour])
+    return routes, pickups
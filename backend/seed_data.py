@@ -79,6 +79,8 @@ async def seed_database():
             "name": "John Rider",
             "role": "rider",
             "phone": "+1234567894",
+            "active_deliveries": 0,
+            "last_assigned_at": None,
             "created_at": datetime.now(timezone.utc).isoformat()
         },
         {
@@ -88,6 +90,8 @@ async def seed_database():
             "name": "Sarah Rider",
             "role": "rider",
             "phone": "+1234567895",
+            "active_deliveries": 0,
+            "last_assigned_at": None,
             "created_at": datetime.now(timezone.utc).isoformat()
         },
         {
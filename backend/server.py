@@ -1,22 +1,68 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Response
 from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone, time, timedelta
+from datetime import datetime, timezone, time, timedelta, date
+from zoneinfo import ZoneInfo
 from passlib.context import CryptContext
 import jwt
 from jwt.exceptions import InvalidTokenError
 import googlemaps
-import math
 import csv
 import io
+import math
+import re
+import base64
+import json
+import asyncio
+from contextlib import asynccontextmanager
+import numpy as np
+
+from routing import (
+    distance_matrix,
+    order_coordinates,
+    plan_routes,
+    pool_routes,
+    repair_routes,
+    schedule_routes,
+    check_capacity,
+    HaversineRows,
+    ROUTING_ALGORITHMS,
+    ROUTING_OBJECTIVES,
+    DEFAULT_TIME_BUDGET_MS,
+)
+from spatial_index import SpatialIndex, bounding_box
+from route_jobs import RouteJobManager
+from road_distance import DistanceCache, RoadDistanceProvider
+from geocoding import GeocodeCache, Geocoder, address_query
+from travel_model import HISTORY_DAYS, TravelModel, extract_legs, fit_travel_model
+from order_rollups import (
+    MAX_ANALYTICS_DAYS,
+    ROLLUP_FIELDS,
+    ROLLUP_ORDER_PROJECTION,
+    rollup_day,
+    rollup_deltas,
+    rollup_totals,
+    summarize_rollups,
+)
+from order_export import EXPORT_FORMATS, EXPORT_PROJECTION, MEDIA_TYPES, export_chunks
+from parquet_export import DATASETS, ParquetExporter, change_query
+from rider_tracking import (
+    FLUSH_INTERVAL_SECONDS,
+    HISTORY_TTL_SECONDS,
+    MAX_PINGS_PER_BATCH,
+    POSITION_FRESH_SECONDS,
+    RiderTracker,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -40,6 +86,57 @@ if GOOGLE_MAPS_API_KEY and GOOGLE_MAPS_API_KEY != 'YOUR_GOOGLE_MAPS_API_KEY_HERE
     except Exception as e:
         logger.warning(f"Failed to initialize Google Maps client: {e}")
 
+# Road distances for route optimization, cached on disk (haversine without a key)
+ROAD_DISTANCE_CACHE_PATH = os.environ.get('ROAD_DISTANCE_CACHE_PATH', str(ROOT_DIR / 'road_distance_cache.sqlite3'))
+road_distances = RoadDistanceProvider(gmaps, DistanceCache(ROAD_DISTANCE_CACHE_PATH) if gmaps else None)
+
+# Coordinates for orders that only have a typed address, cached on disk
+GEOCODE_CACHE_PATH = os.environ.get('GEOCODE_CACHE_PATH', str(ROOT_DIR / 'geocode_cache.sqlite3'))
+geocoder = Geocoder(gmaps, GeocodeCache(GEOCODE_CACHE_PATH) if gmaps else None)
+
+# Live rider positions; pings are buffered here and flushed to Mongo in batches
+rider_tracker = RiderTracker()
+rider_position_flusher: Optional[asyncio.Task] = None
+# Rider loads (active_deliveries) are checked against their orders periodically
+RIDER_LOADS_VERIFY_SECONDS = 3600
+RIDER_LOADS_SETTLE_SECONDS = 5  # Drift must last this long to be corrected
+rider_load_verifier: Optional[asyncio.Task] = None
+rider_positions_synced_at: Optional[str] = None  # Cursor over last_position_at for other workers' pings
+
+# Learned speed and dwell per area and hour, rebuilt from delivery history
+# in the background; until the first build the routing defaults apply
+travel_model = TravelModel()
+travel_model_refresher: Optional[asyncio.Task] = None
+TRAVEL_MODEL_REBUILD_SECONDS = 6 * 3600
+TRAVEL_MODEL_CHECK_SECONDS = 15 * 60  # How often workers look for a newer model
+
+# Platform counters for the admin dashboard, kept current with $inc on every
+# write and recounted from the collections periodically to correct drift
+PLATFORM_COUNTERS_ID = "platform"
+COUNTERS_VERIFY_SECONDS = 3600
+COUNTERS_QUIET_ATTEMPTS = 5  # Recounts, a second apart, looking for no counted write in flight
+counters_verifier: Optional[asyncio.Task] = None
+counters_stuck_in_flight = 0  # Writes in flight throughout the last deferred verification
+order_rollup_backfill: Optional[asyncio.Task] = None  # First build of daily_rollups, if empty
+
+# Parquet snapshots of orders and the wallet ledger for reporting off the
+# primary; each run appends what changed since the last checkpoint
+PARQUET_EXPORT_DIR = os.environ.get('PARQUET_EXPORT_DIR', str(ROOT_DIR / 'parquet'))
+PARQUET_EXPORT_INTERVAL_SECONDS = 3600
+PARQUET_EXPORT_LAG_SECONDS = 120  # Changes younger than this wait for the next run
+PARQUET_BATCH_ROWS = 20_000
+parquet_export_scheduler: Optional[asyncio.Task] = None
+
+# Rider suggestions: a rider this many km further away is as good as one
+# carrying one more order
+LOAD_PENALTY_KM = 2.0
+SUGGESTION_MAX_ACTIVE_DELIVERIES = 3
+SUGGESTION_CANDIDATES = 20  # Nearest riders considered per order before load ranking
+
+# Pooled routing reads orders pinned inside the service area; orders without
+# a pin are geocoded only from restaurants this close to it
+POOLED_UNPINNED_REACH_KM = 10.0
+
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -121,6 +218,8 @@ class Restaurant(BaseModel):
     rating: float = 0.0
     delivery_time: str = "7:00 AM - 11:00 AM"
     is_active: bool = True
+    latitude: Optional[float] = None  # Pickup location for route optimization
+    longitude: Optional[float] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class RestaurantCreate(BaseModel):
@@ -128,6 +227,8 @@ class RestaurantCreate(BaseModel):
     description: str
     cuisine: str
     image_url: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class MenuItem(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -216,25 +317,103 @@ class RouteOptimizationRequest(BaseModel):
     order_ids: List[str]
     num_riders: int
     max_orders_per_rider: Optional[int] = None
+    algorithm: str = "greedy"  # greedy, sweep, kmeans
+    time_budget_ms: int = DEFAULT_TIME_BUDGET_MS  # Local search budget for sweep/kmeans
+    road_distances: bool = False  # Use cached Google road distances when a Maps key is configured
+    include_pickups: bool = False  # Start each route at the restaurant(s) its orders are collected from
+    objective: str = "makespan"  # makespan (earliest last delivery) or distance (fewest km)
 
 class OptimizedRoute(BaseModel):
     rider_index: int
+    rider_id: Optional[str] = None
     order_ids: List[str]
     orders: List[dict]
     total_distance_km: float
     estimated_duration_minutes: int
+    pickup_restaurant_ids: List[str] = []  # Visited in this order before the deliveries
+    stop_etas: List[str] = []  # Arrival time per order (ISO), aligned with order_ids
+    finish_time: Optional[str] = None
 
 class RouteOptimizationResponse(BaseModel):
     routes: List[OptimizedRoute]
     total_orders: int
     total_riders: int
+    algorithm: str = "greedy"
+    distance_source: str = "haversine"  # haversine or road
+    include_pickups: bool = False
+    objective: str = "makespan"
+    window_start: Optional[str] = None  # Departure: slot start, or now if the slot has begun
+    window_end: Optional[str] = None
+    latest_finish: Optional[str] = None
+    unserviceable_order_ids: List[str] = []  # Cannot be delivered before window_end
+    unassigned_order_ids: List[str] = []  # Repairs only: no rider had spare capacity
+    plan_id: Optional[str] = None  # Stored in route_plans
+
+class PooledRouteRequest(BaseModel):
+    latitude: float  # Centre of the service area
+    longitude: float
+    radius_km: float = 5.0
+    num_riders: Optional[int] = None  # Default: the fewest riders that can carry every order; capped at those available
+    max_orders_per_rider: int = 20
+    algorithm: str = "sweep"
+    time_budget_ms: int = DEFAULT_TIME_BUDGET_MS
+    objective: str = "makespan"
+
+class PooledRouteResponse(RouteOptimizationResponse):
+    restaurant_count: int
+    riders_available: int  # Available riders located inside the service area
+    pooled_distance_km: float
+    separate_distance_km: float  # Same orders optimized one restaurant at a time
+    separate_riders: int
+    rider_km_saved: float
+
+class RepairRoute(BaseModel):
+    rider_index: int
+    order_ids: List[str]  # Current visiting order
+    rider_id: Optional[str] = None
+
+class RouteRepairRequest(BaseModel):
+    plan_id: Optional[str] = None  # A stored plan to repair; its routes are used when routes is empty
+    routes: List[RepairRoute] = []  # The plan being repaired, e.g. from /vendor/optimize-routes
+    new_order_ids: List[str] = []  # Ready orders to slot into the plan
+    removed_rider_indices: List[int] = []  # Riders dropping out; their stops are redistributed
+    max_orders_per_rider: Optional[int] = None
+    road_distances: bool = False  # Cached road distances; implied when the stored plan used them
+
+class RouteOptimizationJob(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed, failed, cancelled
+    progress: float  # Fraction of the solve time budget used, 0..1
+    total_orders: int
+    result: Optional[RouteOptimizationResponse] = None
+    error: Optional[str] = None
+
+class RiderPing(BaseModel):
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    recorded_at: Optional[datetime] = None  # Device time; defaults to when the batch arrives
+    speed: Optional[float] = None  # m/s
+    heading: Optional[float] = None  # Degrees clockwise from north
+    accuracy: Optional[float] = None  # Metres
+
+class RiderPingBatch(BaseModel):
+    pings: List[RiderPing] = Field(min_length=1, max_length=MAX_PINGS_PER_BATCH)
+
+class RiderSuggestionRequest(BaseModel):
+    order_ids: List[str]
+    as_group: bool = False  # Rank riders for taking all the orders together
+    limit: int = Field(default=5, ge=1, le=50)
+    max_km: Optional[float] = None
+    max_active_deliveries: int = SUGGESTION_MAX_ACTIVE_DELIVERIES
 
 class BatchRiderAssignment(BaseModel):
     rider_id: str
     order_ids: List[str]
+    rider_index: Optional[int] = None  # Route of the plan given by plan_id
 
 class BatchAssignmentRequest(BaseModel):
     routes: List[BatchRiderAssignment]
+    plan_id: Optional[str] = None  # Record the riders on this stored plan for their manifests
 
 # Admin Models
 class AddWalletMoneyRequest(BaseModel):
@@ -311,6 +490,200 @@ def get_next_delivery_slot() -> str:
     tomorrow = now + timedelta(days=1)
     return f"{tomorrow.strftime('%Y-%m-%d')} Morning (7-11 AM)"
 
+# The morning slot is a hard delivery window in the restaurants' local time
+DELIVERY_TIMEZONE = ZoneInfo(os.environ.get('DELIVERY_TIMEZONE', 'Asia/Kolkata'))
+DELIVERY_WINDOW_START = time(7, 0)
+DELIVERY_WINDOW_END = time(11, 0)
+
+def delivery_window(orders: List[dict]) -> tuple:
+    """
+    Departure time and window end for delivering ``orders``: the earliest
+    booked slot, starting now instead if that slot is already under way
+    """
+    slot_dates = sorted(o['delivery_slot'][:10] for o in orders if o.get('delivery_slot'))
+    try:
+        slot_date = date.fromisoformat(slot_dates[0])
+    except (IndexError, ValueError):
+        slot_date = datetime.now(DELIVERY_TIMEZONE).date()
+    
+    window_start = datetime.combine(slot_date, DELIVERY_WINDOW_START, DELIVERY_TIMEZONE)
+    window_end = datetime.combine(slot_date, DELIVERY_WINDOW_END, DELIVERY_TIMEZONE)
+    departure = max(window_start, datetime.now(DELIVERY_TIMEZONE))
+    return departure, window_end
+
+# Platform counters
+# One document holding users per role, orders per status, delivered revenue
+# and restaurant counts. Writers go through counted_write: in_flight counts
+# writes whose data may have changed before their deltas landed, and version
+# moves with every mark, so the verifier can tell whether a recount raced one.
+@asynccontextmanager
+async def counted_write():
+    """
+    Wrap a data write; add its {dotted counter field: delta} to the yielded
+    dict. The write is marked in flight before the data changes and the
+    deltas land with the unmark, also if the write fails part way.
+    
+    Counter writes are best-effort: a failure is logged and never fails the
+    data write (e.g. a checkout before its wallet debit). Without the mark
+    the deltas are dropped; a lost unmark leaves a stuck mark. Either way
+    verify_platform_counters corrects the counters.
+    """
+    inc = {}
+    try:
+        await db.counters.update_one(
+            {"_id": PLATFORM_COUNTERS_ID}, {"$inc": {"in_flight": 1, "version": 1}}, upsert=True
+        )
+        marked = True
+    except Exception:
+        logger.exception("Could not mark a counted write in flight; its counter deltas are dropped")
+        marked = False
+    try:
+        yield inc
+    finally:
+        if marked:
+            try:
+                await db.counters.update_one(
+                    {"_id": PLATFORM_COUNTERS_ID},
+                    {"$inc": {**{field: delta for field, delta in inc.items() if delta}, "in_flight": -1, "version": 1}},
+                    upsert=True
+                )
+            except Exception:
+                logger.exception(f"Could not apply counter deltas {inc}; the counter verifier corrects them")
+
+def status_change_counters(before_status: Optional[str], after_status: str, amount: float) -> dict:
+    """Counter deltas for an order moving between statuses; delivery recognizes its revenue"""
+    if before_status == after_status:
+        return {}
+    inc = {f"orders.{after_status}": 1}
+    if before_status is not None:
+        inc[f"orders.{before_status}"] = -1
+    if after_status == "delivered":
+        inc["revenue.delivered"] = amount or 0
+    elif before_status == "delivered":
+        inc["revenue.delivered"] = -(amount or 0)
+    return inc
+
+async def count_platform() -> dict:
+    """Counters recomputed from the collections, one grouped aggregation each, run concurrently"""
+    users_by_role, orders_by_status, restaurants_by_active = await asyncio.gather(
+        db.users.aggregate([{"$group": {"_id": "$role", "count": {"$sum": 1}}}]).to_list(None),
+        db.orders.aggregate([{"$group": {
+            "_id": "$status", "count": {"$sum": 1}, "revenue": {"$sum": "$total_amount"}
+        }}]).to_list(None),
+        db.restaurants.aggregate([{"$group": {"_id": "$is_active", "count": {"$sum": 1}}}]).to_list(None),
+    )
+    delivered = next((row for row in orders_by_status if row['_id'] == "delivered"), {})
+    return {
+        "users": {row['_id']: row['count'] for row in users_by_role if row['_id']},
+        "orders": {row['_id']: row['count'] for row in orders_by_status if row['_id']},
+        "revenue": {"delivered": delivered.get('revenue', 0)},
+        "restaurants": {
+            "total": sum(row['count'] for row in restaurants_by_active),
+            "active": sum(row['count'] for row in restaurants_by_active if row['_id'] is True),
+        },
+    }
+
+def counter_drift(stored: dict, actual: dict) -> dict:
+    """{dotted field: actual - stored} for every counter that disagrees"""
+    drift = {}
+    for group in ("users", "orders", "revenue", "restaurants"):
+        stored_group, actual_group = stored.get(group) or {}, actual[group]
+        for key in set(stored_group) | set(actual_group):
+            delta = actual_group.get(key, 0) - stored_group.get(key, 0)
+            if abs(delta) > 1e-6:
+                drift[f"{group}.{key}"] = round(delta, 2)
+    return drift
+
+async def verify_platform_counters() -> dict:
+    """
+    Recount the platform counters and overwrite them when the recount cannot
+    have raced a counted write: none was in flight when it started and none
+    began before the overwrite. Retries a few times before deferring to the
+    next run. Returns the drift found and whether the correction was applied.
+    """
+    global counters_stuck_in_flight
+    lowest_in_flight = None
+    for attempt in range(COUNTERS_QUIET_ATTEMPTS):
+        if attempt:
+            await asyncio.sleep(1)
+        stored = await db.counters.find_one({"_id": PLATFORM_COUNTERS_ID}) or {}
+        actual = await count_platform()
+        drift = counter_drift(stored, actual)
+        in_flight = stored.get('in_flight', 0)
+        lowest_in_flight = in_flight if lowest_in_flight is None else min(lowest_in_flight, in_flight)
+        # Marks of a worker that died mid-write never clear; a level held since
+        # the last verification counts as no write in flight
+        if in_flight and in_flight != counters_stuck_in_flight:
+            continue
+        try:
+            result = await db.counters.update_one(
+                {"_id": PLATFORM_COUNTERS_ID, "version": stored.get('version')},
+                {"$set": {**actual, "in_flight": 0, "version": stored.get('version', 0),
+                          "verified_at": datetime.now(timezone.utc).isoformat()}},
+                upsert=True
+            )
+            applied = result.matched_count == 1 or result.upserted_id is not None
+        except DuplicateKeyError:
+            # The first counted write created the document while it was being counted
+            applied = False
+        if applied:
+            break
+    else:
+        applied = False
+    counters_stuck_in_flight = 0 if applied else lowest_in_flight
+    if drift and stored:
+        logger.warning(f"Platform counters drifted: {drift}" + ("" if applied else "; correction deferred"))
+    return {"drift": drift, "applied": applied}
+
+async def verify_platform_counters_periodically():
+    while True:
+        try:
+            await verify_platform_counters()
+        except Exception:
+            logger.exception("Platform counter verification failed")
+        await asyncio.sleep(COUNTERS_VERIFY_SECONDS)
+
+# User search
+# Each user carries search_keys: the lowercased name from each of its words
+# on ("asha patel", "patel"), email and phone digits. Prefix search is an anchored regex on that one multikey
+# field, so it is an index range scan whichever of the three matches.
+def user_search_keys(name: Optional[str], email: Optional[str], phone: Optional[str]) -> List[str]:
+    keys = set()
+    words = (name or "").lower().split()
+    keys.update(" ".join(words[i:]) for i in range(len(words)))
+    if email:
+        keys.add(email.strip().lower())
+    digits = re.sub(r"\D", "", phone or "")
+    if digits:
+        keys.add(digits)
+        # Numbers are usually typed without the country code
+        if len(digits) > 10:
+            keys.add(digits[-10:])
+    return sorted(keys)
+
+def user_search_prefix(q: str) -> str:
+    """The search_keys prefix a query matches: phone digits, or the lowercased words"""
+    q = q.strip().lower()
+    if re.fullmatch(r"[\d\s+()-]+", q):
+        return re.sub(r"\D", "", q)
+    return " ".join(q.split())
+
+def utc_isoformat(moment: datetime) -> str:
+    """A query bound comparable with stored timestamps; naive datetimes are taken as UTC"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat()
+
+def encode_user_cursor(user: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps([user['created_at'], user['id']]).encode()).decode()
+
+def decode_user_cursor(cursor: str) -> tuple:
+    try:
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, user_id
+
 # Auth Routes
 @api_router.post("/auth/register")
 async def register(user_data: UserCreate):
@@ -330,25 +703,32 @@ async def register(user_data: UserCreate):
     user_dict = user.model_dump()
     user_dict['password'] = hash_password(user_data.password)
     user_dict['created_at'] = user_dict['created_at'].isoformat()
-    
-    await db.users.insert_one(user_dict)
-    
-    # Auto-create restaurant for vendors
-    if user_data.role == "vendor":
-        restaurant = Restaurant(
-            vendor_id=user.id,
-            name=user_data.name,
-            description="Welcome! Update your description in the menu management section.",
-            cuisine="Various",
-            image_url=None,
-            rating=0.0,
-            delivery_time="7:00 AM - 11:00 AM",
-            is_active=True
-        )
+    user_dict['search_keys'] = user_search_keys(user.name, user.email, user.phone)
+    if user_data.role == "rider":
+        user_dict['active_deliveries'] = 0
+        user_dict['last_assigned_at'] = None
+    
+    async with counted_write() as counts:
+        await db.users.insert_one(user_dict)
+        counts[f"users.{user_data.role}"] = 1
         
-        restaurant_dict = restaurant.model_dump()
-        restaurant_dict['created_at'] = restaurant_dict['created_at'].isoformat()
-        await db.restaurants.insert_one(restaurant_dict)
+        # Auto-create restaurant for vendors
+        if user_data.role == "vendor":
+            restaurant = Restaurant(
+                vendor_id=user.id,
+                name=user_data.name,
+                description="Welcome! Update your description in the menu management section.",
+                cuisine="Various",
+                image_url=None,
+                rating=0.0,
+                delivery_time="7:00 AM - 11:00 AM",
+                is_active=True
+            )
+            
+            restaurant_dict = restaurant.model_dump()
+            restaurant_dict['created_at'] = restaurant_dict['created_at'].isoformat()
+            await db.restaurants.insert_one(restaurant_dict)
+            counts.update({"restaurants.total": 1, "restaurants.active": 1})
     
     token = create_access_token({"user_id": user.id, "role": user.role})
     return {"token": token, "user": user}
@@ -363,6 +743,7 @@ async def login(credentials: UserLogin):
     
     # Remove password from response
     user.pop('password', None)
+    user.pop('search_keys', None)
     return {"token": token, "user": user}
 
 @api_router.get("/auth/me", response_model=User)
@@ -579,13 +960,17 @@ async def create_restaurant(restaurant_data: RestaurantCreate, current_user: dic
         name=restaurant_data.name,
         description=restaurant_data.description,
         cuisine=restaurant_data.cuisine,
-        image_url=restaurant_data.image_url
+        image_url=restaurant_data.image_url,
+        latitude=restaurant_data.latitude,
+        longitude=restaurant_data.longitude
     )
     
     restaurant_dict = restaurant.model_dump()
     restaurant_dict['created_at'] = restaurant_dict['created_at'].isoformat()
     
-    await db.restaurants.insert_one(restaurant_dict)
+    async with counted_write() as counts:
+        await db.restaurants.insert_one(restaurant_dict)
+        counts.update({"restaurants.total": 1, "restaurants.active": int(restaurant.is_active)})
     return restaurant
 
 # Menu Routes
@@ -751,6 +1136,30 @@ async def update_restaurant_image(image_data: RestaurantImageUpdate, current_use
     
     return {"message": "Restaurant image updated successfully", "image_url": image_data.image_url}
 
+class RestaurantLocationUpdate(BaseModel):
+    latitude: float
+    longitude: float
+
+@api_router.patch("/vendor/restaurant/location")
+async def update_restaurant_location(location: RestaurantLocationUpdate, current_user: dict = Depends(get_current_user)):
+    """Set the restaurant's pickup coordinates used by route optimization"""
+    if current_user['role'] != 'vendor':
+        raise HTTPException(status_code=403, detail="Only vendors can update restaurant location")
+    
+    if not (-90 <= location.latitude <= 90 and -180 <= location.longitude <= 180):
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    
+    restaurant = await db.restaurants.find_one({"vendor_id": current_user['id']})
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    
+    await db.restaurants.update_one(
+        {"id": restaurant['id']},
+        {"$set": {"latitude": location.latitude, "longitude": location.longitude}}
+    )
+    
+    return {"message": "Restaurant location updated successfully", "latitude": location.latitude, "longitude": location.longitude}
+
 # Order Routes
 @api_router.post("/orders", response_model=Order)
 async def create_order(order_data: OrderCreate, current_user: dict = Depends(get_current_user)):
@@ -799,7 +1208,9 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
     order_dict['placed_at'] = order_dict['placed_at'].isoformat()
     order_dict['updated_at'] = order_dict['updated_at'].isoformat()
     
-    await db.orders.insert_one(order_dict)
+    async with counted_write() as counts:
+        await db.orders.insert_one(order_dict)
+        counts[f"orders.{order.status}"] = 1
     
     # Deduct amount from wallet
     new_balance = wallet_balance - total_amount
@@ -827,6 +1238,7 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
     debit_dict['completed_at'] = debit_dict['completed_at'].isoformat()
     
     await db.wallet_transactions.insert_one(debit_dict)
+    await apply_order_rollups([(order_dict, None, order.status)])
     
     return order
 
@@ -861,6 +1273,7 @@ async def create_multi_vendor_orders(order_data: MultiVendorOrderCreate, current
     
     # Create orders for each restaurant
     created_orders = []
+    new_orders = []  # As stored, for the rollups
     delivery_slot = get_next_delivery_slot()
     parent_order_id = str(uuid.uuid4())  # Link all orders from same cart
     
@@ -896,8 +1309,12 @@ async def create_multi_vendor_orders(order_data: MultiVendorOrderCreate, current
         order_dict['placed_at'] = order_dict['placed_at'].isoformat()
         order_dict['updated_at'] = order_dict['updated_at'].isoformat()
         
-        await db.orders.insert_one(order_dict)
         created_orders.append(order)
+        new_orders.append(order_dict)
+    if new_orders:
+        async with counted_write() as counts:
+            await db.orders.insert_many(new_orders)
+            counts["orders.placed"] = len(new_orders)
     
     # Deduct total amount from wallet
     new_balance = wallet_balance - grand_total
@@ -926,6 +1343,7 @@ async def create_multi_vendor_orders(order_data: MultiVendorOrderCreate, current
         transaction_dict['completed_at'] = transaction_dict['completed_at'].isoformat()
     
     await db.wallet_transactions.insert_one(transaction_dict)
+    await apply_order_rollups([(o, None, o['status']) for o in new_orders])
     
     return {
         "message": f"Successfully created {len(created_orders)} orders",
@@ -1010,6 +1428,243 @@ async def get_order(order_id: str, current_user: dict = Depends(get_current_user
     
     return order
 
+# Daily order rollups
+# daily_rollups holds one row per (local day placed, restaurant, status).
+# Order writes move each order's values between its status rows with $inc;
+# analytics endpoints read these rows instead of scanning orders.
+async def apply_order_rollups(changes: List[tuple]):
+    """
+    Apply (order, previous status, new status) changes to the daily rollups
+    in one write. The orders are already written, so a failure is logged
+    rather than raised; /admin/analytics/rebuild recomputes the days.
+    """
+    deltas = rollup_deltas(changes, DELIVERY_TIMEZONE)
+    if not deltas:
+        return
+    try:
+        await db.daily_rollups.bulk_write([
+            UpdateOne({"date": day, "restaurant_id": restaurant_id, "status": status}, {"$inc": values}, upsert=True)
+            for (day, restaurant_id, status), values in deltas.items()
+        ], ordered=False)
+    except Exception:
+        logger.exception(f"Daily rollup update failed for days {sorted({day for day, _, _ in deltas})}")
+
+def local_day_bounds(start: date, end: date) -> tuple:
+    """UTC ISO bounds [since, until) of local days start..end, to compare with placed_at"""
+    since = datetime.combine(start, time(0), DELIVERY_TIMEZONE).astimezone(timezone.utc).isoformat()
+    until = datetime.combine(end + timedelta(days=1), time(0), DELIVERY_TIMEZONE).astimezone(timezone.utc).isoformat()
+    return since, until
+
+async def rebuild_order_rollups(start: date, end: date) -> int:
+    """
+    Recompute the rollups of local days start..end from the orders placed on
+    them, replacing what is stored. Returns the number of rollup rows.
+    """
+    since, until = local_day_bounds(start, end)
+    rows, batch = {}, []
+    async for order in db.orders.find({"placed_at": {"$gte": since, "$lt": until}}, ROLLUP_ORDER_PROJECTION):
+        batch.append((order, None, order.get('status')))
+        if len(batch) == 1000:
+            rollup_deltas(batch, DELIVERY_TIMEZONE, into=rows)
+            batch = []
+    rollup_deltas(batch, DELIVERY_TIMEZONE, into=rows)
+    
+    date_range = {"date": {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+    stored = await db.daily_rollups.find(date_range, {"_id": 0, "date": 1, "restaurant_id": 1, "status": 1}).to_list(None)
+    operations = [
+        UpdateOne({"date": day, "restaurant_id": restaurant_id, "status": status},
+                  {"$set": {field: values[field] for field in ROLLUP_FIELDS}}, upsert=True)
+        for (day, restaurant_id, status), values in rows.items()
+    ] + [
+        DeleteOne({"date": row['date'], "restaurant_id": row['restaurant_id'], "status": row['status']})
+        for row in stored if (row['date'], row['restaurant_id'], row['status']) not in rows
+    ]
+    if operations:
+        await db.daily_rollups.bulk_write(operations, ordered=False)
+    return len(rows)
+
+async def backfill_order_rollups():
+    """Build rollups for the whole order history the first time there are none"""
+    if await db.daily_rollups.find_one({}, {"_id": 1}):
+        return
+    first = await db.orders.find({"placed_at": {"$exists": True}}, {"_id": 0, "placed_at": 1}).sort("placed_at", 1).to_list(1)
+    if not first:
+        return
+    start = date.fromisoformat(rollup_day(first[0]['placed_at'], DELIVERY_TIMEZONE))
+    try:
+        rows = await rebuild_order_rollups(start, datetime.now(DELIVERY_TIMEZONE).date())
+    except Exception:
+        logger.exception("Daily rollup backfill failed")
+        return
+    logger.info(f"Backfilled {rows} daily rollup rows from {start}")
+
+# Parquet snapshots
+# Orders and wallet_transactions are appended to day-partitioned Parquet files
+# under PARQUET_EXPORT_DIR. Each run exports what changed since the dataset's
+# checkpoint; a file lock keeps two workers from exporting at once.
+parquet_exporter = ParquetExporter(Path(PARQUET_EXPORT_DIR), DELIVERY_TIMEZONE)
+
+async def export_parquet_dataset(dataset, until: str) -> int:
+    """Append records of ``dataset`` changed since its checkpoint and before ``until``; returns the rows written"""
+    since = parquet_exporter.checkpoint(dataset).get('exported_until')
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    cursor = db[dataset.name].find(change_query(dataset, since, until), {"_id": 0}, batch_size=1000)
+    written, batch, rows = [], [], 0
+    try:
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) == PARQUET_BATCH_ROWS:
+                written += await asyncio.to_thread(parquet_exporter.write_batch, dataset, batch, run_id)
+                rows += len(batch)
+                batch = []
+        if batch:
+            written += await asyncio.to_thread(parquet_exporter.write_batch, dataset, batch, run_id)
+            rows += len(batch)
+    except BaseException:
+        # Without a checkpoint the next run exports the same records again
+        parquet_exporter.discard(written)
+        raise
+    parquet_exporter.commit(dataset, until, rows)
+    return rows
+
+async def export_parquet_snapshots() -> Optional[dict]:
+    """Export every dataset; None if another worker is exporting"""
+    with parquet_exporter.locked() as acquired:
+        if not acquired:
+            return None
+        until = (datetime.now(timezone.utc) - timedelta(seconds=PARQUET_EXPORT_LAG_SECONDS)).isoformat()
+        return {dataset.name: await export_parquet_dataset(dataset, until) for dataset in DATASETS}
+
+async def export_parquet_snapshots_periodically():
+    while True:
+        try:
+            exported = await export_parquet_snapshots()
+            if exported:
+                logger.info(f"Exported Parquet snapshots: {exported}")
+        except Exception:
+            logger.exception("Parquet snapshot export failed")
+        await asyncio.sleep(PARQUET_EXPORT_INTERVAL_SECONDS)
+
+# Order status transitions
+# Each rider document carries active_deliveries (orders out for delivery with
+# them) and last_assigned_at. Every write that changes an order's status or
+# rider goes through transition_order or apply_rider_loads to keep them exact.
+# Set when an order enters these statuses; travel_model learns from them
+STATUS_TIMESTAMP_FIELDS = {
+    "out-for-delivery": "out_for_delivery_at",
+    "delivered": "delivered_at",
+}
+
+def delivered_on_time(delivery_slot: Optional[str], delivered_at: str) -> Optional[bool]:
+    """Whether a delivery at ``delivered_at`` made its booked slot's window; None without a slot"""
+    try:
+        slot_date = date.fromisoformat((delivery_slot or "")[:10])
+    except ValueError:
+        return None
+    window_end = datetime.combine(slot_date, DELIVERY_WINDOW_END, DELIVERY_TIMEZONE)
+    return datetime.fromisoformat(delivered_at) <= window_end
+
+def active_rider(order: dict) -> Optional[str]:
+    """The rider whose load includes ``order``, if it is out for delivery"""
+    if order.get('status') == "out-for-delivery":
+        return order.get('rider_id')
+    return None
+
+async def apply_rider_loads(changes: List[tuple], now: str):
+    """Apply (previous active rider, new active rider) pairs to rider loads in one write"""
+    deltas = {}
+    for before, after in changes:
+        if before == after:
+            continue
+        if before:
+            deltas[before] = deltas.get(before, 0) - 1
+        if after:
+            deltas[after] = deltas.get(after, 0) + 1
+    operations = [
+        UpdateOne(
+            {"id": rider_id, "role": "rider"},
+            {"$inc": {"active_deliveries": delta}, **({"$set": {"last_assigned_at": now}} if delta > 0 else {})}
+        )
+        for rider_id, delta in deltas.items() if delta
+    ]
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+
+async def rider_load_drift() -> dict:
+    """{rider_id: (stored load, orders out for delivery)} for every rider where they differ"""
+    riders, rows = await asyncio.gather(
+        db.users.find({"role": "rider"}, {"_id": 0, "id": 1, "active_deliveries": 1}).to_list(None),
+        db.orders.aggregate([
+            {"$match": {"status": "out-for-delivery"}},
+            {"$group": {"_id": "$rider_id", "count": {"$sum": 1}}},
+        ]).to_list(None),
+    )
+    actual = {row['_id']: row['count'] for row in rows}
+    return {
+        rider['id']: (rider.get('active_deliveries'), actual.get(rider['id'], 0))
+        for rider in riders if rider.get('active_deliveries') != actual.get(rider['id'], 0)
+    }
+
+async def verify_rider_loads() -> dict:
+    """
+    Correct riders whose load disagrees with their orders out for delivery.
+    A transition between its order write and its load update looks the same
+    for a moment, so only drift seen twice, RIDER_LOADS_SETTLE_SECONDS apart
+    with the stored load unchanged, is corrected, guarded on that load.
+    Returns {rider_id: correction} for the riders corrected.
+    """
+    first = await rider_load_drift()
+    if not first:
+        return {}
+    await asyncio.sleep(RIDER_LOADS_SETTLE_SECONDS)
+    lasting = {rider_id: loads for rider_id, loads in (await rider_load_drift()).items() if first.get(rider_id) == loads}
+    if not lasting:
+        return {}
+    await db.users.bulk_write([
+        UpdateOne({"id": rider_id, "active_deliveries": stored}, {"$set": {"active_deliveries": actual}})
+        for rider_id, (stored, actual) in lasting.items()
+    ], ordered=False)
+    corrections = {rider_id: actual - (stored or 0) for rider_id, (stored, actual) in lasting.items()}
+    logger.warning(f"Corrected delivery loads of {len(corrections)} riders: {corrections}")
+    return corrections
+
+async def verify_rider_loads_periodically():
+    while True:
+        await asyncio.sleep(RIDER_LOADS_VERIFY_SECONDS)
+        try:
+            await verify_rider_loads()
+        except Exception:
+            logger.exception("Rider load verification failed")
+
+async def transition_order(order_id: str, update_data: dict) -> Optional[dict]:
+    """
+    Apply ``update_data`` to an order and move it between rider loads.
+    Returns the order's previous status and rider, or None if it is missing.
+    """
+    timestamp_field = STATUS_TIMESTAMP_FIELDS.get(update_data.get('status'))
+    if timestamp_field:
+        update_data = {**update_data, timestamp_field: update_data['updated_at']}
+    async with counted_write() as counts:
+        before = await db.orders.find_one_and_update(
+            {"id": order_id}, {"$set": update_data},
+            projection={**ROLLUP_ORDER_PROJECTION, "rider_id": 1, "delivery_slot": 1}
+        )
+        if before is not None and 'status' in update_data:
+            counts.update(status_change_counters(
+                before.get('status'), update_data['status'], before.get('total_amount')
+            ))
+    if before is not None:
+        await apply_rider_loads([(active_rider(before), active_rider({**before, **update_data}))],
+                                update_data['updated_at'])
+        if 'status' in update_data:
+            await apply_order_rollups([(before, before.get('status'), update_data['status'])])
+        if timestamp_field == "delivered_at":
+            # Kept on the order so rider on-time rates are a plain count
+            on_time = delivered_on_time(before.get('delivery_slot'), update_data['delivered_at'])
+            if on_time is not None:
+                await db.orders.update_one({"id": order_id}, {"$set": {"delivered_on_time": on_time}})
+    return before
+
 @api_router.patch("/orders/{order_id}/status")
 async def update_order_status(order_id: str, status_update: OrderStatusUpdate, current_user: dict = Depends(get_current_user)):
     order = await db.orders.find_one({"id": order_id})
@@ -1029,7 +1684,7 @@ async def update_order_status(order_id: str, status_update: OrderStatusUpdate, c
     if status_update.status == "out-for-delivery" and current_user['role'] == 'rider':
         update_data["rider_id"] = current_user['id']
     
-    await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    await transition_order(order_id, update_data)
     return {"message": "Order status updated", "status": status_update.status}
 
 @api_router.post("/orders/{order_id}/rating")
@@ -1092,7 +1747,7 @@ async def update_vendor_order_status(order_id: str, status_update: OrderStatusUp
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    await transition_order(order_id, update_data)
     return {"message": "Order status updated", "status": status_update.status}
 
 @api_router.get("/rider/orders", response_model=List[Order])
@@ -1128,7 +1783,7 @@ async def update_rider_order_status(order_id: str, status_update: OrderStatusUpd
     if status_update.status == "out-for-delivery" and not order.get('rider_id'):
         update_data["rider_id"] = current_user['id']
     
-    await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    await transition_order(order_id, update_data)
     return {"message": "Order status updated", "status": status_update.status}
 
 @api_router.post("/vendor/mark-all-ready")
@@ -1141,21 +1796,49 @@ async def mark_all_orders_ready(current_user: dict = Depends(get_current_user)):
     restaurants = await db.restaurants.find({"vendor_id": current_user['id']}).to_list(100)
     restaurant_ids = [r['id'] for r in restaurants]
     
-    # Update all orders that are in placed, confirmed, or preparing status
-    result = await db.orders.update_many(
-        {
-            "restaurant_id": {"$in": restaurant_ids},
-            "status": {"$in": ["placed", "confirmed", "preparing"]}
-        },
-        {
-            "$set": {
-                "status": "ready",
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-        }
-    )
+    # Update all orders that are in placed, confirmed, or preparing status,
+    # one status at a time so each count moves the right counters and rollups
+    now = datetime.now(timezone.utc).isoformat()
+    
+    async def mark(status):
+        orders = await db.orders.find(
+            {"restaurant_id": {"$in": restaurant_ids}, "status": status}, ROLLUP_ORDER_PROJECTION
+        ).to_list(None)
+        if not orders:
+            return status, orders, 0
+        result = await db.orders.update_many(
+            {"id": {"$in": [o['id'] for o in orders]}, "status": status},
+            {"$set": {"status": "ready", "updated_at": now}}
+        )
+        return status, orders, result.modified_count
+    
+    changes, stale_days = [], set()
+    async with counted_write() as counts:
+        for status, orders, modified in await asyncio.gather(*[mark(s) for s in ["placed", "confirmed", "preparing"]]):
+            counts[f"orders.{status}"] = -modified
+            counts["orders.ready"] = counts.get("orders.ready", 0) + modified
+            if modified == len(orders):
+                changes += [(order, status, "ready") for order in orders]
+            else:
+                # Some moved on meanwhile; recount the days they were placed on instead
+                stale_days.update(rollup_day(o['placed_at'], DELIVERY_TIMEZONE) for o in orders if o.get('placed_at'))
+    marked = counts.get("orders.ready", 0)
+    await apply_order_rollups(changes)
+    if stale_days:
+        await rebuild_order_rollups(date.fromisoformat(min(stale_days)), date.fromisoformat(max(stale_days)))
+    
+    return {"message": f"Marked {marked} orders as ready"}
+
+@api_router.get("/vendor/analytics/daily")
+async def get_vendor_daily_analytics(start: date, end: date, current_user: dict = Depends(get_current_user)):
+    """Orders and revenue per local day for the vendor's restaurants, from the daily rollups"""
+    if current_user['role'] != 'vendor':
+        raise HTTPException(status_code=403, detail="Only vendors can access this endpoint")
     
-    return {"message": f"Marked {result.modified_count} orders as ready"}
+    validate_analytics_range(start, end)
+    restaurants = await db.restaurants.find({"vendor_id": current_user['id']}, {"_id": 0, "id": 1}).to_list(100)
+    days = summarize_rollups(await load_rollups(start, end, [r['id'] for r in restaurants]))
+    return {"start": start, "end": end, "days": days, "totals": rollup_totals(days)}
 
 @api_router.get("/vendor/orders/ready/csv")
 async def download_ready_orders_csv(current_user: dict = Depends(get_current_user)):
@@ -1249,23 +1932,57 @@ async def get_rider_completed_orders(current_user: dict = Depends(get_current_us
     return orders
 
 # Rider Routes
+async def load_available_riders(max_active_deliveries: int = 0, limit: Optional[int] = None,
+                                rider_ids: Optional[List[str]] = None) -> List[dict]:
+    """
+    Riders with at most ``max_active_deliveries`` orders out for delivery
+    (by default, riders not on a delivery), lightest load first and then
+    longest since their last assignment; only those in ``rider_ids`` if given
+    """
+    # Served by the (role, active_deliveries, last_assigned_at) index; a rider
+    # inserted without a load yet sorts first, as one with none
+    query = {"role": "rider", "active_deliveries": {"$not": {"$gt": max_active_deliveries}}}
+    if rider_ids is not None:
+        query["id"] = {"$in": rider_ids}
+    cursor = db.users.find(
+        query, {"_id": 0, "password": 0, "search_keys": 0}
+    ).sort([("active_deliveries", 1), ("last_assigned_at", 1)])
+    return await cursor.to_list(limit)
+
 @api_router.get("/riders/available")
-async def get_available_riders(current_user: dict = Depends(get_current_user)):
-    """Get list of available riders (not currently on delivery)"""
+async def get_available_riders(
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    limit: Optional[int] = None,
+    max_active_deliveries: int = 0,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get list of available riders (not currently on delivery), lightest load
+    first. Raise max_active_deliveries to include riders already carrying
+    that many orders.
+    When latitude/longitude are given, only riders with a known location are
+    returned, nearest first, optionally within radius_km and capped at limit.
+    """
     if current_user['role'] not in ['vendor', 'admin']:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Get all riders
-    all_riders = await db.users.find({"role": "rider"}, {"_id": 0, "password": 0}).to_list(100)
+    if latitude is None or longitude is None:
+        return await load_available_riders(max_active_deliveries, limit)
     
-    # Get riders currently on delivery (status = out-for-delivery)
-    busy_orders = await db.orders.find({"status": "out-for-delivery"}, {"_id": 0, "rider_id": 1}).to_list(1000)
-    busy_rider_ids = [order['rider_id'] for order in busy_orders if order.get('rider_id')]
+    available_riders = await load_available_riders(max_active_deliveries)
     
-    # Filter out busy riders
-    available_riders = [rider for rider in all_riders if rider['id'] not in busy_rider_ids]
+    located = [r for r in available_riders if r.get('latitude') is not None and r.get('longitude') is not None]
+    index = SpatialIndex.from_points([(r['latitude'], r['longitude']) for r in located])
+    if radius_km is not None:
+        hits = index.within_radius(latitude, longitude, radius_km)
+    else:
+        hits = index.nearest(latitude, longitude, k=len(located))
+    if limit is not None:
+        hits = hits[:limit]
     
-    return available_riders
+    return [{**located[i], "distance_km": round(dist_km, 2)} for i, dist_km in hits]
 
 @api_router.patch("/orders/{order_id}/assign-rider")
 async def assign_rider_to_order(order_id: str, assignment: RiderAssignment, current_user: dict = Depends(get_current_user)):
@@ -1296,7 +2013,7 @@ async def assign_rider_to_order(order_id: str, assignment: RiderAssignment, curr
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    await transition_order(order_id, update_data)
     
     return {
         "message": "Rider assigned successfully",
@@ -1305,18 +2022,37 @@ async def assign_rider_to_order(order_id: str, assignment: RiderAssignment, curr
     }
 
 # Route Optimization
-@api_router.post("/vendor/optimize-routes", response_model=RouteOptimizationResponse)
-async def optimize_delivery_routes(
-    request: RouteOptimizationRequest,
-    current_user: dict = Depends(get_current_user)
-):
-    """
-    Optimize delivery routes for multiple orders using Google Maps Distance Matrix API.
-    This creates balanced routes for each rider based on distances.
-    """
+MAX_ROUTING_TIME_BUDGET_MS = 10000
+
+# Background solves for large batches; see route_jobs.py
+route_jobs = RouteJobManager()
+
+def validate_routing_options(algorithm: str, objective: str, time_budget_ms: int):
+    if algorithm not in ROUTING_ALGORITHMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown algorithm '{algorithm}'. Choose one of: {', '.join(ROUTING_ALGORITHMS)}"
+        )
+    
+    if objective not in ROUTING_OBJECTIVES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown objective '{objective}'. Choose one of: {', '.join(ROUTING_OBJECTIVES)}"
+        )
+    
+    if not 0 < time_budget_ms <= MAX_ROUTING_TIME_BUDGET_MS:
+        raise HTTPException(status_code=400, detail=f"time_budget_ms must be between 1 and {MAX_ROUTING_TIME_BUDGET_MS}")
+
+async def prepare_route_optimization(request: RouteOptimizationRequest, current_user: dict):
+    """Validate an optimization request and load its ready, geolocated orders"""
     if current_user['role'] != 'vendor':
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    if request.num_riders < 1:
+        raise HTTPException(status_code=400, detail="num_riders must be at least 1")
+    
+    validate_routing_options(request.algorithm, request.objective, request.time_budget_ms)
+    
     # Note: This function works with or without Google Maps API key
     # It uses haversine distance calculation for route optimization
     
@@ -1329,6 +2065,8 @@ async def optimize_delivery_routes(
     if len(orders) == 0:
         raise HTTPException(status_code=404, detail="No ready orders found")
     
+    await geocode_missing_orders(orders)
+    
     # Filter orders with valid coordinates
     valid_orders = [
         o for o in orders 
@@ -1338,101 +2076,458 @@ async def optimize_delivery_routes(
     if len(valid_orders) == 0:
         raise HTTPException(status_code=400, detail="No orders with valid delivery locations")
     
-    # Simplified routing algorithm using distance-based clustering
-    # For production, you would use Google Cloud Fleet Routing API
-    
-    # Use simple clustering: assign orders to riders in a round-robin with nearest neighbor
-    num_riders = request.num_riders
-    max_orders = request.max_orders_per_rider or (len(valid_orders) // num_riders + 1)
-    
-    # Simple greedy nearest-neighbor assignment
-    routes = [[] for _ in range(num_riders)]
-    assigned = [False] * len(valid_orders)
+    return valid_orders
+
+async def geocode_missing_orders(orders: List[dict]) -> int:
+    """
+    Fill in delivery coordinates from the typed address for orders without a
+    map pin, on the order dicts and in the database. Returns how many resolved.
+    """
+    missing = [o for o in orders if not (o.get('delivery_latitude') and o.get('delivery_longitude'))]
+    queries = {
+        o['id']: address_query(o.get('delivery_address'), o.get('house_number'), o.get('building_name'))
+        for o in missing
+    }
+    queries = {order_id: query for order_id, query in queries.items() if query}
+    if not queries:
+        return 0
+    
+    # Lookups block on the network, so keep them off the event loop
+    points = await asyncio.to_thread(geocoder.geocode_many, queries.values())
+    updates = []
+    for order in missing:
+        point = points.get(queries.get(order['id']))
+        if point is None:
+            continue
+        order.update(delivery_latitude=point[0], delivery_longitude=point[1], location_source="geocoded")
+        updates.append(db.orders.update_one(
+            {"id": order['id']},
+            {"$set": {"delivery_latitude": point[0], "delivery_longitude": point[1], "location_source": "geocoded"}}
+        ))
+    await asyncio.gather(*updates)
     
-    # Start with first order for each rider
-    for rider_idx in range(min(num_riders, len(valid_orders))):
-        routes[rider_idx].append(valid_orders[rider_idx])
-        assigned[rider_idx] = True
+    if len(updates) < len(missing):
+        logger.warning(f"{len(missing) - len(updates)} orders could not be geocoded and are left out of routing")
+    return len(updates)
+
+async def route_distances(request: RouteOptimizationRequest, coords):
+    """Distance matrix for the stops and its source (road or haversine)"""
+    if request.road_distances:
+        # Distance Matrix calls block, so keep them off the event loop
+        return await asyncio.to_thread(road_distances.matrix, coords)
+    return distance_matrix(coords), "haversine"
+
+async def load_pickup_points(valid_orders: List[dict]):
+    """
+    Restaurants the orders are collected from, their coordinates and, for each
+    order, the index of its restaurant
+    """
+    restaurant_ids = list(dict.fromkeys(o['restaurant_id'] for o in valid_orders))
+    restaurants = await db.restaurants.find(
+        {"id": {"$in": restaurant_ids}},
+        {"_id": 0, "id": 1, "name": 1, "latitude": 1, "longitude": 1}
+    ).to_list(None)
+    by_id = {r['id']: r for r in restaurants}
+    
+    missing = [
+        by_id.get(rid, {}).get('name', rid) for rid in restaurant_ids
+        if by_id.get(rid, {}).get('latitude') is None or by_id.get(rid, {}).get('longitude') is None
+    ]
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Restaurants without pickup coordinates: {', '.join(missing)}"
+        )
     
-    # Assign remaining orders to nearest existing route
-    for order_idx in range(len(valid_orders)):
-        if assigned[order_idx]:
-            continue
-            
-        order = valid_orders[order_idx]
-        order_loc = (order['delivery_latitude'], order['delivery_longitude'])
-        
-        # Find best rider (least orders or nearest)
-        best_rider = 0
-        min_dist = float('inf')
-        
-        for rider_idx in range(num_riders):
-            if len(routes[rider_idx]) >= max_orders:
-                continue
-                
-            if len(routes[rider_idx]) == 0:
-                best_rider = rider_idx
-                break
-                
-            # Calculate distance to last order in this route
-            last_order = routes[rider_idx][-1]
-            last_loc = (last_order['delivery_latitude'], last_order['delivery_longitude'])
-            dist = haversine_distance(order_loc, last_loc)
-            
-            if dist < min_dist:
-                min_dist = dist
-                best_rider = rider_idx
-        
-        routes[best_rider].append(order)
-        assigned[order_idx] = True
+    restaurants = [by_id[rid] for rid in restaurant_ids]
+    index = {rid: i for i, rid in enumerate(restaurant_ids)}
+    pickup_coords = np.array([[r['latitude'], r['longitude']] for r in restaurants])
+    pickup_of = [index[o['restaurant_id']] for o in valid_orders]
+    return restaurants, pickup_coords, pickup_of
+
+def trip_pace(points, departure: datetime, window_end: datetime):
+    """Learned pace over ``points`` for every clock hour from departure to the window's end"""
+    hours = math.ceil(max(0.0, (window_end - departure).total_seconds()) / 3600) + 1
+    return travel_model.pace(points, departure, hours)
+
+def build_route_response(valid_orders: List[dict], plan, algorithm: str, objective: str,
+                         distance_source: str, departure: datetime, window_end: datetime,
+                         restaurants: Optional[List[dict]] = None,
+                         riders: Optional[List[RepairRoute]] = None,
+                         unassigned_order_ids: Optional[List[str]] = None) -> RouteOptimizationResponse:
+    """
+    Turn a RoutePlan (stop indices, pickups, km and ETAs per route) into the
+    API response. ``riders`` keeps the rider numbering of a repaired plan.
+    """
+    def clock(minutes: float) -> str:
+        return (departure + timedelta(minutes=minutes)).isoformat()
     
-    # Calculate route statistics
     optimized_routes = []
-    for rider_idx, route_orders in enumerate(routes):
-        if not route_orders:
+    for rider_idx, route in enumerate(plan.routes):
+        if not route:
             continue
-            
-        # Calculate total distance for this route
-        total_distance = 0
-        for i in range(len(route_orders) - 1):
-            loc1 = (route_orders[i]['delivery_latitude'], route_orders[i]['delivery_longitude'])
-            loc2 = (route_orders[i+1]['delivery_latitude'], route_orders[i+1]['delivery_longitude'])
-            total_distance += haversine_distance(loc1, loc2)
         
-        # Estimate duration (assuming 30 km/h average speed + 5 min per stop)
-        estimated_minutes = int((total_distance / 30) * 60 + len(route_orders) * 5)
+        route_orders = [valid_orders[i] for i in route]
+        route_pickups = [restaurants[p]['id'] for p in plan.pickups[rider_idx]] if restaurants else []
         
         optimized_routes.append(OptimizedRoute(
-            rider_index=rider_idx + 1,
+            rider_index=riders[rider_idx].rider_index if riders else rider_idx + 1,
+            rider_id=riders[rider_idx].rider_id if riders else None,
             order_ids=[o['id'] for o in route_orders],
             orders=route_orders,
-            total_distance_km=round(total_distance, 2),
-            estimated_duration_minutes=estimated_minutes
+            total_distance_km=round(plan.route_km[rider_idx], 2),
+            estimated_duration_minutes=int(plan.finish_minutes[rider_idx]),
+            pickup_restaurant_ids=route_pickups,
+            stop_etas=[clock(m) for m in plan.etas[rider_idx]],
+            finish_time=clock(plan.finish_minutes[rider_idx])
         ))
     
+    finishes = [m for route, m in zip(plan.routes, plan.finish_minutes) if route]
     return RouteOptimizationResponse(
         routes=optimized_routes,
         total_orders=len(valid_orders),
-        total_riders=len(optimized_routes)
+        total_riders=len(optimized_routes),
+        algorithm=algorithm,
+        distance_source=distance_source,
+        include_pickups=restaurants is not None,
+        objective=objective,
+        window_start=departure.isoformat(),
+        window_end=window_end.isoformat(),
+        latest_finish=clock(max(finishes)) if finishes else None,
+        unserviceable_order_ids=[valid_orders[i]['id'] for i in plan.unserved],
+        unassigned_order_ids=unassigned_order_ids or []
     )
 
-def haversine_distance(loc1: tuple, loc2: tuple) -> float:
-    """Calculate distance between two lat/lng points in kilometers"""
-    lat1, lon1 = loc1
-    lat2, lon2 = loc2
+# Order details riders need at each stop, copied into stored plans
+ROUTE_PLAN_STOP_FIELDS = (
+    "customer_name", "delivery_address", "house_number", "building_name",
+    "delivery_latitude", "delivery_longitude", "special_instructions",
+)
+
+async def save_route_plan(response: RouteOptimizationResponse, created_by: str, source: str,
+                          repaired_from: Optional[str] = None) -> RouteOptimizationResponse:
+    """
+    Store a computed plan in route_plans, with each route's stops in visiting
+    order and their ETAs, so riders can later read their manifest directly.
+    Sets and returns the response's plan_id.
+    """
+    routes = []
+    for route in response.routes:
+        stops = [
+            {"order_id": order['id'], "sequence": sequence, "eta": eta,
+             **{field: order.get(field) for field in ROUTE_PLAN_STOP_FIELDS}}
+            for sequence, (order, eta) in enumerate(zip(route.orders, route.stop_etas), start=1)
+        ]
+        routes.append({
+            "rider_index": route.rider_index,
+            "rider_id": route.rider_id,
+            "pickup_restaurant_ids": route.pickup_restaurant_ids,
+            "total_distance_km": route.total_distance_km,
+            "estimated_duration_minutes": route.estimated_duration_minutes,
+            "finish_time": route.finish_time,
+            "stops": stops,
+        })
+    
+    plan_id = str(uuid.uuid4())
+    await db.route_plans.insert_one({
+        "id": plan_id,
+        "created_by": created_by,
+        "source": source,  # optimize, job, repair or pooled
+        "repaired_from": repaired_from,
+        "algorithm": response.algorithm,
+        "objective": response.objective,
+        "distance_source": response.distance_source,
+        "include_pickups": response.include_pickups,
+        "window_start": response.window_start,
+        "window_end": response.window_end,
+        "latest_finish": response.latest_finish,
+        "total_distance_km": round(sum(route.total_distance_km for route in response.routes), 2),
+        "unserviceable_order_ids": response.unserviceable_order_ids,
+        "routes": routes,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    })
+    response.plan_id = plan_id
+    return response
+
+@api_router.post("/vendor/optimize-routes", response_model=RouteOptimizationResponse)
+async def optimize_delivery_routes(
+    request: RouteOptimizationRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Optimize delivery routes for multiple orders using Google Maps Distance Matrix API.
+    This creates balanced routes for each rider based on distances.
+    Solves inline, so it is meant for small batches; large batches should use
+    the background job endpoints below.
+    """
+    valid_orders = await prepare_route_optimization(request, current_user)
     
-    R = 6371  # Earth radius in kilometers
+    # "greedy" is the original nearest-last-stop heuristic; "sweep" and "kmeans"
+    # seed clusters spatially and improve them with 2-opt/Or-opt local search.
+    # For production, you would use Google Cloud Fleet Routing API
+    num_riders = request.num_riders
+    max_orders = request.max_orders_per_rider or (len(valid_orders) // num_riders + 1)
     
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
+    # All pairwise distances in one vectorized pass (computed on demand for
+    # very large batches); nearest-stop lookups go through a spatial index.
+    # Road distances come from the cached Distance Matrix API when requested.
+    # In pickup mode the restaurants are appended after the delivery points.
+    coords = order_coordinates(valid_orders)
+    restaurants, pickup_coords, pickup_of = None, None, None
+    if request.include_pickups:
+        restaurants, pickup_coords, pickup_of = await load_pickup_points(valid_orders)
+    points = coords if pickup_coords is None else np.vstack([coords, pickup_coords])
+    dist, distance_source = await route_distances(request, points)
+    
+    # Riders leave at the start of the slot; stops they cannot reach before
+    # it closes are reported as unserviceable rather than scheduled late
+    departure, window_end = delivery_window(valid_orders)
+    window_minutes = max(0.0, (window_end - departure).total_seconds() / 60)
+    try:
+        plan = plan_routes(
+            coords, num_riders, max_orders, request.algorithm, request.time_budget_ms, dist,
+            pickup_coords=pickup_coords, pickup_of=pickup_of,
+            objective=request.objective, window_minutes=window_minutes,
+            pace=trip_pace(points, departure, window_end)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    a = (math.sin(dlat / 2) ** 2 +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dlon / 2) ** 2)
+    response = build_route_response(
+        valid_orders, plan, request.algorithm, request.objective, distance_source,
+        departure, window_end, restaurants
+    )
+    return await save_route_plan(response, current_user['id'], "optimize")
+
+@api_router.post("/vendor/optimize-routes/jobs", response_model=RouteOptimizationJob)
+async def submit_route_optimization_job(
+    request: RouteOptimizationRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Start route optimization in a background worker process and return a job id
+    immediately. Poll GET /vendor/optimize-routes/jobs/{job_id} for the result.
+    """
+    valid_orders = await prepare_route_optimization(request, current_user)
     
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    num_riders = request.num_riders
+    max_orders = request.max_orders_per_rider or (len(valid_orders) // num_riders + 1)
     
-    return R * c
+    # Reject impossible requests now rather than as a failed job later
+    if request.algorithm != "greedy":
+        try:
+            check_capacity(len(valid_orders), num_riders, max_orders)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    coords = order_coordinates(valid_orders)
+    restaurants, pickup_coords, pickup_of = None, None, None
+    if request.include_pickups:
+        restaurants, pickup_coords, pickup_of = await load_pickup_points(valid_orders)
+    
+    # Haversine distances are computed by the worker; road distances are
+    # fetched here (they need the API client and cache) and shared with it
+    points = coords if pickup_coords is None else np.vstack([coords, pickup_coords])
+    dist, distance_source = None, "haversine"
+    if request.road_distances:
+        dist, distance_source = await route_distances(request, points)
+    
+    departure, window_end = delivery_window(valid_orders)
+    
+    job_id = route_jobs.submit(
+        coords,
+        num_riders,
+        max_orders,
+        request.algorithm,
+        request.time_budget_ms,
+        owner_id=current_user['id'],
+        context={
+            "orders": valid_orders,
+            "algorithm": request.algorithm,
+            "distance_source": distance_source,
+            "restaurants": restaurants,
+            "objective": request.objective,
+            "departure": departure,
+            "window_end": window_end,
+        },
+        dist=dist,
+        pickup_coords=pickup_coords,
+        pickup_of=pickup_of,
+        objective=request.objective,
+        window_minutes=max(0.0, (window_end - departure).total_seconds() / 60),
+        pace=trip_pace(points, departure, window_end),
+    )
+    
+    return RouteOptimizationJob(
+        job_id=job_id,
+        status="queued",
+        progress=0.0,
+        total_orders=len(valid_orders)
+    )
+
+@api_router.get("/vendor/optimize-routes/jobs/{job_id}", response_model=RouteOptimizationJob)
+async def get_route_optimization_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Progress of a background route optimization job, with the routes once completed"""
+    if current_user['role'] != 'vendor':
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    job = route_jobs.get(job_id)
+    if not job or job['owner_id'] != current_user['id']:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    snapshot = route_jobs.snapshot(job)
+    context = job['context']
+    result = None
+    if snapshot['status'] == 'completed':
+        result = build_route_response(
+            context['orders'], snapshot['result'], context['algorithm'], context['objective'],
+            context['distance_source'], context['departure'], context['window_end'], context['restaurants']
+        )
+        # Stored once: the first poll that sees the result starts the save and
+        # every poll awaits that same task; shielded so a dropped poll cannot cancel it
+        saving = route_jobs.run_once(job, "plan_task", lambda: asyncio.ensure_future(
+            save_route_plan(result.model_copy(), current_user['id'], "job")
+        ))
+        result.plan_id = (await asyncio.shield(saving)).plan_id
+    
+    return RouteOptimizationJob(
+        job_id=job_id,
+        status=snapshot['status'],
+        progress=snapshot['progress'],
+        total_orders=len(context['orders']),
+        result=result,
+        error=snapshot['error']
+    )
+
+# Orders a rider has already collected stay on that rider's route, in order
+LOCKED_ROUTE_STATUSES = ("out-for-delivery",)
+FINISHED_ROUTE_STATUSES = ("delivered", "cancelled")
+
+@api_router.post("/vendor/optimize-routes/repair", response_model=RouteOptimizationResponse)
+async def repair_delivery_routes(
+    request: RouteRepairRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Patch an existing plan without re-solving it: new ready orders and the
+    stops of removed riders go to their cheapest positions. Orders already
+    out for delivery keep their rider and place; finished orders drop out.
+    Riders in the result are a proposal: the stored plan reaches riders'
+    manifests once batch-assign confirms it.
+    """
+    if current_user['role'] != 'vendor':
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    road = request.road_distances
+    if request.plan_id:
+        stored = await db.route_plans.find_one(
+            {"id": request.plan_id, "created_by": current_user['id']},
+            {"_id": 0, "include_pickups": 1, "distance_source": 1,
+             "routes.rider_index": 1, "routes.rider_id": 1, "routes.stops.order_id": 1}
+        )
+        if not stored:
+            raise HTTPException(status_code=404, detail="Route plan not found")
+        # Insertion repair only knows delivery stops; it would drop the pickup legs
+        if stored.get('include_pickups'):
+            raise HTTPException(status_code=400, detail="Plans with restaurant pickups cannot be repaired; optimize again")
+        road = road or stored.get('distance_source') == "road"
+    if not request.routes and request.plan_id:
+        request.routes = [
+            RepairRoute(rider_index=route['rider_index'], rider_id=route.get('rider_id'),
+                        order_ids=[stop['order_id'] for stop in route['stops']])
+            for route in stored['routes']
+        ]
+    
+    if not request.routes:
+        raise HTTPException(status_code=400, detail="routes or plan_id must give the plan to repair")
+    
+    rider_indices = [route.rider_index for route in request.routes]
+    unknown = sorted(set(request.removed_rider_indices) - set(rider_indices))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown rider_index in removed_rider_indices: {unknown}")
+    if len(set(request.removed_rider_indices)) == len(request.routes):
+        raise HTTPException(status_code=400, detail="At least one rider must remain")
+    
+    planned_ids = [order_id for route in request.routes for order_id in route.order_ids]
+    if len(set(planned_ids)) != len(planned_ids):
+        raise HTTPException(status_code=400, detail="An order appears on more than one route")
+    new_ids = [order_id for order_id in dict.fromkeys(request.new_order_ids) if order_id not in planned_ids]
+    
+    # Orders of other vendors' restaurants are treated as unknown
+    restaurants = await db.restaurants.find({"vendor_id": current_user['id']}, {"_id": 0, "id": 1}).to_list(100)
+    restaurant_ids = [r['id'] for r in restaurants]
+    planned = await db.orders.find(
+        {"id": {"$in": planned_ids}, "restaurant_id": {"$in": restaurant_ids}}, {"_id": 0}
+    ).to_list(None)
+    new_orders = await db.orders.find(
+        {"id": {"$in": new_ids}, "restaurant_id": {"$in": restaurant_ids}, "status": "ready"}, {"_id": 0}
+    ).to_list(None)
+    await geocode_missing_orders(new_orders)
+    
+    def located(order):
+        return order.get('delivery_latitude') and order.get('delivery_longitude')
+    
+    # One stop index per order: planned stops in route order, then new ones
+    planned_by_id = {
+        o['id']: o for o in planned
+        if o.get('status') not in FINISHED_ROUTE_STATUSES and located(o)
+    }
+    valid_orders, routes, locked = [], [], set()
+    for route in request.routes:
+        stops = []
+        for order_id in route.order_ids:
+            order = planned_by_id.get(order_id)
+            if order is None:
+                continue
+            if order.get('status') in LOCKED_ROUTE_STATUSES:
+                locked.add(len(valid_orders))
+            stops.append(len(valid_orders))
+            valid_orders.append(order)
+        routes.append(stops)
+    new_orders = [o for o in new_orders if located(o)]
+    insert = list(range(len(valid_orders), len(valid_orders) + len(new_orders)))
+    valid_orders += new_orders
+    
+    if not valid_orders:
+        raise HTTPException(status_code=404, detail="No undelivered orders with valid delivery locations")
+    
+    removed = [rider_indices.index(i) for i in set(request.removed_rider_indices)]
+    remaining_riders = len(routes) - len(removed)
+    max_orders = request.max_orders_per_rider or max(
+        max(len(route) for route in routes), len(valid_orders) // remaining_riders + 1
+    )
+    
+    coords = order_coordinates(valid_orders)
+    distance_source = "haversine"
+    if road:
+        # Distance Matrix calls block, so keep them off the event loop
+        dist, distance_source = await asyncio.to_thread(road_distances.matrix, coords)
+    else:
+        # Distances are evaluated on demand: a repair touches few pairs
+        dist = HaversineRows(coords)
+    routes, unassigned = repair_routes(dist, routes, max_orders, insert, removed, locked)
+    
+    departure, window_end = delivery_window(valid_orders)
+    window_minutes = max(0.0, (window_end - departure).total_seconds() / 60)
+    plan = schedule_routes(dist, len(valid_orders), routes, [[] for _ in routes], window_minutes,
+                           trip_pace(coords, departure, window_end))
+    
+    response = build_route_response(
+        valid_orders, plan, "insertion", "distance", distance_source, departure, window_end,
+        riders=request.routes, unassigned_order_ids=[valid_orders[i]['id'] for i in unassigned]
+    )
+    # Stored without riders, so /rider/manifest keeps serving the confirmed
+    # plan until batch-assign records them on this one
+    proposal = response.model_copy(update={
+        "routes": [route.model_copy(update={"rider_id": None}) for route in response.routes]
+    })
+    response.plan_id = (await save_route_plan(
+        proposal, current_user['id'], "repair", repaired_from=request.plan_id
+    )).plan_id
+    return response
 
 # Batch assign riders to optimized routes
 @api_router.post("/vendor/batch-assign-riders")
@@ -1442,120 +2537,947 @@ async def batch_assign_riders(
 ):
     """
     Assign riders to orders based on optimized routes.
-    Each route should have: rider_id and order_ids
+    Each route should have: rider_id and order_ids. Only ready orders of the
+    vendor's restaurants are assigned; every order gets an entry in results.
     """
     if current_user['role'] != 'vendor':
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    assigned_count = 0
+    routes = [route for route in request.routes if route.rider_id and route.order_ids]
     errors = []
-    
-    for route in request.routes:
-        rider_id = route.rider_id
-        order_ids = route.order_ids
-        
-        if not rider_id or not order_ids:
-            continue
-        
-        # Verify rider exists
-        rider = await db.users.find_one({"id": rider_id, "role": "rider"})
-        if not rider:
-            errors.append(f"Rider {rider_id} not found")
-            continue
-        
-        # Update all orders in this route with sequence
-        for sequence_idx, order_id in enumerate(order_ids, start=1):
-            try:
-                await db.orders.update_one(
-                    {"id": order_id},
+    results = {}
+    
+    def reject(order_id, rider_id, detail):
+        results[order_id] = {"order_id": order_id, "rider_id": rider_id, "status": "rejected", "detail": detail}
+        errors.append(f"Order {order_id}: {detail}")
+    
+    # One query for every rider and one for every order, whatever the batch size
+    rider_ids = {route.rider_id for route in routes}
+    riders = {
+        r['id'] for r in await db.users.find(
+            {"id": {"$in": list(rider_ids)}, "role": "rider"}, {"_id": 0, "id": 1}
+        ).to_list(len(rider_ids))
+    }
+    for rider_id in rider_ids - riders:
+        errors.append(f"Rider {rider_id} not found")
+    
+    requested_ids = list({order_id for route in routes for order_id in route.order_ids})
+    restaurants = await db.restaurants.find({"vendor_id": current_user['id']}, {"_id": 0, "id": 1}).to_list(100)
+    orders = {
+        o['id']: o for o in await db.orders.find(
+            {"id": {"$in": requested_ids}}, ROLLUP_ORDER_PROJECTION
+        ).to_list(len(requested_ids))
+    }
+    restaurant_ids = {r['id'] for r in restaurants}
+    
+    now = datetime.now(timezone.utc).isoformat()
+    operations = []
+    assigned = []  # (order_id, rider_id) in operation order
+    seen = {}  # Ordered: results are reported in request order
+    for route in routes:
+        for sequence_idx, order_id in enumerate(route.order_ids, start=1):
+            order = orders.get(order_id)
+            if order_id in seen:
+                # Only the first route listing an order gets it
+                errors.append(f"Order {order_id}: listed in more than one route")
+                continue
+            seen[order_id] = True
+            if route.rider_id not in riders:
+                reject(order_id, route.rider_id, "rider not found")
+            elif not order or order.get('restaurant_id') not in restaurant_ids:
+                reject(order_id, route.rider_id, "order not found")
+            elif order['status'] != 'ready':
+                reject(order_id, route.rider_id, f"order is {order['status']}, not ready")
+            else:
+                # The status guard keeps an order another request assigned meanwhile untouched
+                operations.append(UpdateOne(
+                    {"id": order_id, "status": "ready"},
                     {"$set": {
-                        "rider_id": rider_id,
+                        "rider_id": route.rider_id,
                         "status": "out-for-delivery",
                         "delivery_sequence": sequence_idx,
-                        "updated_at": datetime.now(timezone.utc).isoformat()
+                        "updated_at": now,
+                        "out_for_delivery_at": now
                     }}
-                )
-                assigned_count += 1
-            except Exception as e:
-                errors.append(f"Failed to assign order {order_id}: {str(e)}")
+                ))
+                assigned.append((order_id, route.rider_id))
+    
+    applied = []  # (order_id, rider_id) of the updates that took effect
+    if operations:
+        async with counted_write() as counts:
+            failed = {}
+            try:
+                # Each update stands alone, so one failing does not stop the rest
+                outcome = await db.orders.bulk_write(operations, ordered=False)
+                matched = outcome.matched_count
+            except BulkWriteError as e:
+                failed = {
+                    assigned[error['index']][0]: error.get('errmsg', "write failed")
+                    for error in e.details.get('writeErrors', [])
+                }
+                matched = e.details.get('nMatched', 0)
+            raced = set()
+            if matched < len(operations) - len(failed):
+                # Rare: find which orders changed between the check and the write
+                current = await db.orders.find(
+                    {"id": {"$in": [order_id for order_id, _ in assigned]}}, {"_id": 0, "id": 1, "rider_id": 1}
+                ).to_list(len(assigned))
+                rider_of = {o['id']: o.get('rider_id') for o in current}
+                raced = {order_id for order_id, rider_id in assigned
+                         if order_id not in failed and rider_of.get(order_id) != rider_id}
+            applied = [(order_id, rider_id) for order_id, rider_id in assigned
+                       if order_id not in failed and order_id not in raced]
+            counts.update({"orders.ready": -len(applied), "orders.out-for-delivery": len(applied)})
+        for order_id, rider_id in assigned:
+            if order_id in failed:
+                reject(order_id, rider_id, f"write failed: {failed[order_id]}")
+            elif order_id in raced:
+                reject(order_id, rider_id, "order was assigned by another request")
+            else:
+                results[order_id] = {"order_id": order_id, "rider_id": rider_id, "status": "assigned", "detail": None}
+        # Ready orders carry no load, so each assignment only adds to its rider's
+        await apply_rider_loads([(None, rider_id) for _, rider_id in applied], now)
+        await apply_order_rollups([(orders[order_id], "ready", "out-for-delivery") for order_id, _ in applied])
+    
+    assigned_count = len(applied)
+    if request.plan_id:
+        # A rider whose orders were all rejected is not on this plan
+        assigned_riders = {rider_id for _, rider_id in applied}
+        await record_plan_riders(
+            request.plan_id, [route for route in routes if route.rider_id in assigned_riders], current_user['id'], errors
+        )
     
     return {
         "message": f"Successfully assigned {assigned_count} orders",
         "assigned_count": assigned_count,
+        "results": [results[order_id] for order_id in seen],
         "errors": errors if errors else None
     }
 
+async def record_plan_riders(plan_id: str, assignments: List[BatchRiderAssignment], vendor_id: str,
+                             errors: List[str]):
+    """Write the assigned rider onto each route of a stored plan, for the rider's manifest"""
+    plan = await db.route_plans.find_one(
+        {"id": plan_id, "created_by": vendor_id}, {"_id": 0, "routes": 1}
+    )
+    if not plan:
+        errors.append(f"Route plan {plan_id} not found")
+        return
+    
+    # Routes are matched by rider_index, or else by their set of orders
+    by_index = {route['rider_index']: route for route in plan['routes']}
+    by_orders = {frozenset(stop['order_id'] for stop in route['stops']): route for route in plan['routes']}
+    for assignment in assignments:
+        route = by_index.get(assignment.rider_index) or by_orders.get(frozenset(assignment.order_ids))
+        if route is None:
+            errors.append(f"No route in plan {plan_id} matches rider {assignment.rider_id}")
+            continue
+        route['rider_id'] = assignment.rider_id
+    
+    await db.route_plans.update_one(
+        {"id": plan_id},
+        {"$set": {"routes": plan['routes'], "assigned_at": datetime.now(timezone.utc).isoformat()}}
+    )
+
+@api_router.get("/rider/manifest")
+async def get_rider_manifest(current_user: dict = Depends(get_current_user)):
+    """
+    The rider's route from the latest plan they are assigned to: stops in
+    visiting order with ETAs, read as stored rather than recomputed
+    """
+    if current_user['role'] != 'rider':
+        raise HTTPException(status_code=403, detail="Only riders can view their manifest")
+    
+    # Served by the (routes.rider_id, created_at) index; $elemMatch returns only this rider's route
+    plan = await db.route_plans.find_one(
+        {"routes.rider_id": current_user['id']},
+        {"_id": 0, "id": 1, "window_start": 1, "window_end": 1, "created_at": 1,
+         "routes": {"$elemMatch": {"rider_id": current_user['id']}}},
+        sort=[("created_at", -1)]
+    )
+    if not plan:
+        raise HTTPException(status_code=404, detail="No route assigned")
+    
+    route = plan['routes'][0]
+    return {
+        "plan_id": plan['id'],
+        "window_start": plan.get('window_start'),
+        "window_end": plan.get('window_end'),
+        "created_at": plan['created_at'],
+        **route,
+    }
+
+@api_router.post("/rider/positions")
+async def ingest_rider_positions(batch: RiderPingBatch, current_user: dict = Depends(get_current_user)):
+    """
+    Record a batch of the rider's GPS pings. The latest position is
+    available immediately; history reaches the database within
+    FLUSH_INTERVAL_SECONDS.
+    """
+    if current_user['role'] != 'rider':
+        raise HTTPException(status_code=403, detail="Only riders can report positions")
+    
+    now = datetime.now(timezone.utc).timestamp()
+    pings = []
+    for ping in batch.pings:
+        if ping.recorded_at is None:
+            recorded_at = now
+        else:
+            recorded_at = ping.recorded_at.replace(tzinfo=ping.recorded_at.tzinfo or timezone.utc).timestamp()
+        # A fast device clock must not pin the rider's latest position in the future
+        pings.append((ping.latitude, ping.longitude, min(recorded_at, now), ping.speed, ping.heading, ping.accuracy))
+    
+    return {"accepted": rider_tracker.ingest(current_user['id'], pings)}
+
+def position_dict(rider_id: str, ping: tuple) -> dict:
+    latitude, longitude, recorded_at, speed, heading, accuracy = ping
+    return {
+        "rider_id": rider_id,
+        "latitude": latitude,
+        "longitude": longitude,
+        "recorded_at": datetime.fromtimestamp(recorded_at, timezone.utc).isoformat(),
+        "speed": speed,
+        "heading": heading,
+        "accuracy": accuracy,
+    }
+
+@api_router.get("/riders/positions")
+async def get_rider_positions(max_age_minutes: int = 15, current_user: dict = Depends(get_current_user)):
+    """Latest position of every rider seen in the last max_age_minutes"""
+    if current_user['role'] not in ['vendor', 'admin']:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # This worker's pings are freshest; other workers' arrive via the flushed last_position
+    positions = {
+        rider_id: position_dict(rider_id, ping)
+        for rider_id, ping in rider_tracker.latest(max_age_seconds=max_age_minutes * 60).items()
+    }
+    cutoff = (datetime.now(timezone.utc) - timedelta(minutes=max_age_minutes)).isoformat()
+    stored = await db.users.find(
+        {"role": "rider", "last_position.recorded_at": {"$gte": cutoff}},
+        {"_id": 0, "id": 1, "last_position": 1}
+    ).to_list(None)
+    for rider in stored:
+        current = positions.get(rider['id'])
+        if current is None or rider['last_position']['recorded_at'] > current['recorded_at']:
+            positions[rider['id']] = {"rider_id": rider['id'], **rider['last_position']}
+    return list(positions.values())
+
+async def flush_rider_positions():
+    """Write buffered pings as one insert_many and moved riders' latest positions as one bulk write"""
+    pending, moved = rider_tracker.take_pending()
+    if not pending and not moved:
+        return
+    try:
+        if pending:
+            # recorded_at is a BSON date here so the TTL index can expire old history
+            await db.rider_positions.insert_many([
+                {
+                    "rider_id": rider_id,
+                    "latitude": ping[0],
+                    "longitude": ping[1],
+                    "recorded_at": datetime.fromtimestamp(ping[2], timezone.utc),
+                    "speed": ping[3],
+                    "heading": ping[4],
+                    "accuracy": ping[5],
+                }
+                for rider_id, ping in pending
+            ], ordered=False)
+            rider_tracker.mark_flushed(len(pending))
+    except BulkWriteError as e:
+        # Rejected documents would fail again; keep what was written and move on
+        logger.warning(f"Dropped {len(e.details.get('writeErrors', []))} rider positions: {e}")
+        rider_tracker.mark_flushed(e.details.get('nInserted', 0))
+    except PyMongoError as e:
+        logger.warning(f"Rider position flush failed, retrying next interval: {e}")
+        rider_tracker.requeue(pending, moved)
+        return
+    
+    if moved:
+        try:
+            await db.users.bulk_write([
+                UpdateOne(
+                    {"id": rider_id, "role": "rider"},
+                    {"$set": {
+                        "last_position": {k: v for k, v in position_dict(rider_id, ping).items() if k != "rider_id"},
+                        "last_position_at": datetime.now(timezone.utc).isoformat(),
+                    }}
+                )
+                for rider_id, ping in moved.items()
+            ], ordered=False)
+        except PyMongoError as e:
+            logger.warning(f"Latest rider position update failed, retrying next interval: {e}")
+            rider_tracker.requeue([], moved)
+
+async def sync_rider_positions():
+    """Add positions other workers flushed since the last sync to this worker's live index"""
+    global rider_positions_synced_at
+    now = datetime.now(timezone.utc)
+    since = rider_positions_synced_at or (now - timedelta(seconds=POSITION_FRESH_SECONDS)).isoformat()
+    # Overlap by one interval so a write landing mid-sync is not skipped
+    rider_positions_synced_at = (now - timedelta(seconds=FLUSH_INTERVAL_SECONDS)).isoformat()
+    riders = await db.users.find(
+        {"role": "rider", "last_position_at": {"$gt": since}},
+        {"_id": 0, "id": 1, "last_position": 1}
+    ).to_list(None)
+    for rider in riders:
+        p = rider['last_position']
+        rider_tracker.observe(rider['id'], (
+            p['latitude'], p['longitude'], datetime.fromisoformat(p['recorded_at']).timestamp(),
+            p.get('speed'), p.get('heading'), p.get('accuracy'),
+        ))
+
+async def flush_rider_positions_periodically():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        try:
+            await flush_rider_positions()
+            await sync_rider_positions()
+        except Exception:
+            logger.exception("Rider position flush crashed")
+
+@api_router.post("/vendor/suggest-riders")
+async def suggest_riders(request: RiderSuggestionRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Rank riders for each order (or, with as_group, for all of them together)
+    by distance from their live position to the pickup, plus LOAD_PENALTY_KM
+    for every order they are already carrying. Distances come from the
+    in-memory rider index; rider loads take one query for the whole request.
+    """
+    if current_user['role'] not in ['vendor', 'admin']:
+        raise HTTPException(status_code=403, detail="Only vendors and admins can assign riders")
+    
+    orders = await db.orders.find(
+        {"id": {"$in": request.order_ids}},
+        {"_id": 0, "id": 1, "restaurant_id": 1, "delivery_latitude": 1, "delivery_longitude": 1}
+    ).to_list(len(request.order_ids))
+    restaurant_query = {"id": {"$in": list({o['restaurant_id'] for o in orders})}}
+    if current_user['role'] == 'vendor':
+        restaurant_query["vendor_id"] = current_user['id']
+    restaurants = {
+        r['id']: r for r in await db.restaurants.find(
+            restaurant_query, {"_id": 0, "id": 1, "latitude": 1, "longitude": 1}
+        ).to_list(None)
+    }
+    orders = [o for o in orders if o['restaurant_id'] in restaurants]
+    if not orders:
+        raise HTTPException(status_code=404, detail="No orders found")
+    
+    # Riders head to the restaurant first; without a pickup pin, use the drop-off
+    pickups = {}
+    for order in orders:
+        restaurant = restaurants[order['restaurant_id']]
+        if restaurant.get('latitude') is not None and restaurant.get('longitude') is not None:
+            pickups[order['id']] = (restaurant['latitude'], restaurant['longitude'])
+        elif order.get('delivery_latitude') and order.get('delivery_longitude'):
+            pickups[order['id']] = (order['delivery_latitude'], order['delivery_longitude'])
+    
+    if request.as_group and pickups:
+        groups = [(list(pickups), tuple(np.mean(list(pickups.values()), axis=0).tolist()))]
+    else:
+        groups = [([order_id], point) for order_id, point in pickups.items()]
+    
+    candidates = [
+        rider_tracker.nearest(lat, lng, k=max(SUGGESTION_CANDIDATES, request.limit), max_km=request.max_km)
+        for _, (lat, lng) in groups
+    ]
+    candidate_ids = list({rider_id for nearby in candidates for rider_id, _ in nearby})
+    riders = {
+        r['id']: r for r in await load_available_riders(request.max_active_deliveries, rider_ids=candidate_ids)
+    }
+    positions = rider_tracker.latest(candidate_ids)
+    
+    suggestions = []
+    for (order_ids, (lat, lng)), nearby in zip(groups, candidates):
+        ranked = sorted(
+            (dist_km + LOAD_PENALTY_KM * riders[rider_id].get('active_deliveries', 0), dist_km, rider_id)
+            for rider_id, dist_km in nearby if rider_id in riders
+        )[:request.limit]
+        suggestions.append({
+            "order_ids": order_ids,
+            "pickup_latitude": lat,
+            "pickup_longitude": lng,
+            "riders": [
+                {
+                    "rider_id": rider_id,
+                    "name": riders[rider_id].get('name'),
+                    "phone": riders[rider_id].get('phone'),
+                    "active_deliveries": riders[rider_id].get('active_deliveries', 0),
+                    "distance_km": round(dist_km, 2),
+                    "score": round(score, 2),
+                    "position_recorded_at": datetime.fromtimestamp(positions[rider_id][2], timezone.utc).isoformat(),
+                }
+                for score, dist_km, rider_id in ranked
+            ],
+        })
+    
+    return {
+        "suggestions": suggestions,
+        "unlocated_order_ids": [o['id'] for o in orders if o['id'] not in pickups],
+        "unknown_order_ids": sorted(set(request.order_ids) - {o['id'] for o in orders}),
+    }
+
+async def rebuild_travel_model():
+    """Fit speed and dwell tables from recent deliveries and publish them to every worker"""
+    global travel_model
+    since = (datetime.now(timezone.utc) - timedelta(days=HISTORY_DAYS)).isoformat()
+    orders = await db.orders.find(
+        {"status": "delivered", "delivered_at": {"$gte": since}, "out_for_delivery_at": {"$exists": True}},
+        {"_id": 0, "rider_id": 1, "restaurant_id": 1, "delivery_latitude": 1, "delivery_longitude": 1,
+         "out_for_delivery_at": 1, "delivered_at": 1}
+    ).to_list(None)
+    restaurant_ids = list({o.get('restaurant_id') for o in orders})
+    restaurants = {
+        r['id']: r for r in await db.restaurants.find(
+            {"id": {"$in": restaurant_ids}}, {"_id": 0, "id": 1, "latitude": 1, "longitude": 1}
+        ).to_list(None)
+    }
+    deliveries = [
+        {
+            "rider_id": o['rider_id'],
+            "latitude": o['delivery_latitude'],
+            "longitude": o['delivery_longitude'],
+            "out_for_delivery_at": datetime.fromisoformat(o['out_for_delivery_at']),
+            "delivered_at": datetime.fromisoformat(o['delivered_at']),
+            "pickup_latitude": restaurants.get(o.get('restaurant_id'), {}).get('latitude'),
+            "pickup_longitude": restaurants.get(o.get('restaurant_id'), {}).get('longitude'),
+        }
+        for o in orders
+        if o.get('rider_id') and o.get('delivery_latitude') and o.get('delivery_longitude')
+    ]
+    
+    def fit():
+        return fit_travel_model(extract_legs(deliveries, DELIVERY_TIMEZONE))
+    
+    tables = await asyncio.to_thread(fit)
+    tables["built_at"] = datetime.now(timezone.utc).isoformat()
+    await db.travel_models.replace_one({"id": "current"}, {"id": "current", **tables}, upsert=True)
+    travel_model = TravelModel(tables)
+    logger.info(f"Travel model rebuilt from {tables['legs']} delivery legs")
+
+async def refresh_travel_model():
+    """Load a model another worker built, or rebuild it once it is due"""
+    global travel_model
+    stored = await db.travel_models.find_one({"id": "current"}, {"_id": 0})
+    due = (datetime.now(timezone.utc) - timedelta(seconds=TRAVEL_MODEL_REBUILD_SECONDS)).isoformat()
+    if stored is None or stored['built_at'] < due:
+        await rebuild_travel_model()
+    elif stored['built_at'] != travel_model.tables.get('built_at'):
+        travel_model = TravelModel(stored)
+
+async def refresh_travel_model_periodically():
+    while True:
+        try:
+            await refresh_travel_model()
+        except Exception:
+            logger.exception("Travel model refresh failed")
+        await asyncio.sleep(TRAVEL_MODEL_CHECK_SECONDS)
+
 # Admin Routes
+@api_router.get("/admin/road-distance-stats")
+async def get_road_distance_stats(current_user: dict = Depends(get_current_user)):
+    """Road-distance cache effectiveness: hit rate and Distance Matrix calls saved (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return road_distances.stats()
+
+@api_router.get("/admin/geocoding-stats")
+async def get_geocoding_stats(current_user: dict = Depends(get_current_user)):
+    """Geocoding cache effectiveness: lookups served from cache vs API calls (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return geocoder.stats()
+
+@api_router.get("/admin/rider-tracking-stats")
+async def get_rider_tracking_stats(current_user: dict = Depends(get_current_user)):
+    """Rider pings received, flushed, buffered and dropped on this worker (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return rider_tracker.stats()
+
+@api_router.get("/admin/travel-model")
+async def get_travel_model(current_user: dict = Depends(get_current_user)):
+    """Learned travel speed and dwell time currently used for ETAs (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return travel_model.summary()
+
+@api_router.post("/admin/travel-model/rebuild")
+async def rebuild_travel_model_now(current_user: dict = Depends(get_current_user)):
+    """Refit the travel model from delivery history now instead of waiting for the schedule (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    await rebuild_travel_model()
+    return travel_model.summary()
+
+def validate_analytics_range(start: date, end: date):
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end - start).days + 1 > MAX_ANALYTICS_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_ANALYTICS_DAYS} days")
+
+async def load_rollups(start: date, end: date, restaurant_ids: Optional[List[str]] = None) -> List[dict]:
+    query = {"date": {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+    if restaurant_ids is not None:
+        query["restaurant_id"] = {"$in": restaurant_ids}
+    return await db.daily_rollups.find(query, {"_id": 0}).to_list(None)
+
+@api_router.get("/admin/analytics/daily")
+async def get_daily_analytics(start: date, end: date, restaurant_id: Optional[str] = None,
+                              current_user: dict = Depends(get_current_user)):
+    """Orders and revenue per local day from the daily rollups, optionally for one restaurant (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    validate_analytics_range(start, end)
+    days = summarize_rollups(await load_rollups(start, end, [restaurant_id] if restaurant_id else None))
+    return {"start": start, "end": end, "days": days, "totals": rollup_totals(days)}
+
+@api_router.get("/admin/analytics/restaurants")
+async def get_restaurant_analytics(start: date, end: date, current_user: dict = Depends(get_current_user)):
+    """Orders and revenue per restaurant over a date range from the daily rollups, highest revenue first (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    validate_analytics_range(start, end)
+    restaurants = summarize_rollups(await load_rollups(start, end), group_by="restaurant_id")
+    names = {
+        r['id']: r.get('name') for r in await db.restaurants.find(
+            {"id": {"$in": [r['restaurant_id'] for r in restaurants]}}, {"_id": 0, "id": 1, "name": 1}
+        ).to_list(None)
+    }
+    for restaurant in restaurants:
+        restaurant['restaurant_name'] = names.get(restaurant['restaurant_id'])
+    restaurants.sort(key=lambda r: r['revenue'], reverse=True)
+    return {"start": start, "end": end, "restaurants": restaurants, "totals": rollup_totals(restaurants)}
+
+@api_router.get("/admin/orders/export")
+async def export_orders(
+    start: date,
+    end: date,
+    format: str = "csv",
+    status: Optional[str] = None,
+    gzip: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Stream every order placed on local days start..end as CSV or NDJSON,
+    oldest first, optionally only some statuses (comma-separated) and
+    gzipped (admin only). Rows go from the cursor straight to the response.
+    """
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    
+    since, until = local_day_bounds(start, end)
+    query = {"placed_at": {"$gte": since, "$lt": until}}
+    statuses = [s.strip() for s in (status or "").split(",") if s.strip()]
+    if statuses:
+        query["status"] = {"$in": statuses}
+    cursor = db.orders.find(query, EXPORT_PROJECTION, batch_size=1000).sort("placed_at", 1)
+    
+    filename = f"orders_{start.isoformat()}_{end.isoformat()}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_chunks(cursor, format, compress=gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@api_router.post("/admin/analytics/rebuild")
+async def rebuild_analytics(start: date, end: date, current_user: dict = Depends(get_current_user)):
+    """Recompute the daily rollups of a date range from the orders (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    validate_analytics_range(start, end)
+    return {"start": start, "end": end, "rows": await rebuild_order_rollups(start, end)}
+
+@api_router.get("/admin/parquet-export")
+async def get_parquet_export_status(current_user: dict = Depends(get_current_user)):
+    """Checkpoint of each Parquet snapshot dataset (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {dataset.name: parquet_exporter.checkpoint(dataset) for dataset in DATASETS}
+
+@api_router.post("/admin/parquet-export/run")
+async def run_parquet_export(current_user: dict = Depends(get_current_user)):
+    """Export changes to the Parquet snapshots now instead of waiting for the schedule (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    exported = await export_parquet_snapshots()
+    if exported is None:
+        raise HTTPException(status_code=409, detail="A Parquet export is already running")
+    return {"rows": exported}
+
+@api_router.post("/admin/optimize-routes/pooled", response_model=PooledRouteResponse)
+async def optimize_pooled_routes(
+    request: PooledRouteRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Optimize every ready order in a service area across all restaurants at
+    once, so riders can collect from several restaurants on one route, and
+    report the rider-km saved against optimizing each restaurant separately
+    (admin only). Routes are capped at the available riders located in the area.
+    """
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if request.radius_km <= 0:
+        raise HTTPException(status_code=400, detail="radius_km must be positive")
+    if request.max_orders_per_rider < 1:
+        raise HTTPException(status_code=400, detail="max_orders_per_rider must be at least 1")
+    if request.num_riders is not None and request.num_riders < 1:
+        raise HTTPException(status_code=400, detail="num_riders must be at least 1")
+    validate_routing_options(request.algorithm, request.objective, request.time_budget_ms)
+    
+    # Only the area's orders are read and geocoded, not every ready order
+    min_lat, max_lat, min_lng, max_lng = bounding_box(request.latitude, request.longitude, request.radius_km)
+    pinned = {"delivery_latitude": {"$gte": min_lat, "$lte": max_lat},
+              "delivery_longitude": {"$gte": min_lng, "$lte": max_lng}}
+    min_lat, max_lat, min_lng, max_lng = bounding_box(
+        request.latitude, request.longitude, request.radius_km + POOLED_UNPINNED_REACH_KM
+    )
+    nearby = await db.restaurants.find(
+        {"latitude": {"$gte": min_lat, "$lte": max_lat}, "longitude": {"$gte": min_lng, "$lte": max_lng}},
+        {"_id": 0, "id": 1}
+    ).to_list(None)
+    unpinned = {"restaurant_id": {"$in": [r['id'] for r in nearby]},
+                "$or": [{"delivery_latitude": {"$in": [None, 0]}}, {"delivery_longitude": {"$in": [None, 0]}}]}
+    orders = await db.orders.find({"status": "ready", "$or": [pinned, unpinned]}, {"_id": 0}).to_list(None)
+    await geocode_missing_orders(orders)
+    located = [o for o in orders if o.get('delivery_latitude') and o.get('delivery_longitude')]
+    area = SpatialIndex.from_points([(o['delivery_latitude'], o['delivery_longitude']) for o in located])
+    in_area = sorted(i for i, _ in area.within_radius(request.latitude, request.longitude, request.radius_km))
+    valid_orders = [located[i] for i in in_area]
+    if not valid_orders:
+        raise HTTPException(status_code=404, detail="No ready orders in the service area")
+    
+    restaurants, pickup_coords, pickup_of = await load_pickup_points(valid_orders)
+    
+    riders = await load_available_riders()
+    rider_index = SpatialIndex.from_points([
+        (r['latitude'], r['longitude']) for r in riders
+        if r.get('latitude') is not None and r.get('longitude') is not None
+    ])
+    riders_available = len(rider_index.within_radius(request.latitude, request.longitude, request.radius_km))
+    
+    if not riders_available:
+        raise HTTPException(status_code=404, detail="No available riders in the service area")
+    
+    max_orders = request.max_orders_per_rider
+    num_riders = min(request.num_riders or -(-len(valid_orders) // max_orders), riders_available)
+    if num_riders * max_orders < len(valid_orders):
+        raise HTTPException(
+            status_code=400,
+            detail=f"{len(valid_orders)} orders need more than the {riders_available} available riders "
+                   f"in the service area at {max_orders} orders each"
+        )
+    departure, window_end = delivery_window(valid_orders)
+    window_minutes = max(0.0, (window_end - departure).total_seconds() / 60)
+    try:
+        # Two solves (pooled and per restaurant); keep them off the event loop
+        coords = order_coordinates(valid_orders)
+        pooled = await asyncio.to_thread(
+            pool_routes, coords, pickup_coords, pickup_of, num_riders, max_orders,
+            request.algorithm, request.time_budget_ms, request.objective, window_minutes,
+            pace=trip_pace(np.vstack([coords, pickup_coords]), departure, window_end)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    response = build_route_response(
+        valid_orders, pooled.plan, request.algorithm, request.objective, "haversine",
+        departure, window_end, restaurants
+    )
+    await save_route_plan(response, current_user['id'], "pooled")
+    pooled_km = sum(pooled.plan.route_km)
+    return PooledRouteResponse(
+        **response.model_dump(),
+        restaurant_count=len(restaurants),
+        riders_available=riders_available,
+        pooled_distance_km=round(pooled_km, 2),
+        separate_distance_km=round(pooled.separate_km, 2),
+        separate_riders=pooled.separate_riders,
+        rider_km_saved=round(pooled.separate_km - pooled_km, 2)
+    )
+
+USER_SEARCH_PAGE_SIZE = 50
+USER_SEARCH_MAX_PAGE_SIZE = 100
+
+async def find_users(q: Optional[str], role: Optional[str], created_after: Optional[datetime],
+                     created_before: Optional[datetime], limit: int, cursor: Optional[str]) -> dict:
+    """One page of users, newest first, and the cursor for the next page (None on the last)"""
+    query = {}
+    if role:
+        query["role"] = role
+    if q and user_search_prefix(q):
+        query["search_keys"] = {"$regex": "^" + re.escape(user_search_prefix(q))}
+    created = {}
+    if created_after is not None:
+        created["$gte"] = utc_isoformat(created_after)
+    if created_before is not None:
+        created["$lt"] = utc_isoformat(created_before)
+    if created:
+        query["created_at"] = created
+    if cursor:
+        # Keyset: strictly after the last user of the previous page
+        created_at, user_id = decode_user_cursor(cursor)
+        query["$or"] = [{"created_at": {"$lt": created_at}}, {"created_at": created_at, "id": {"$lt": user_id}}]
+    
+    users = await db.users.find(query, {"_id": 0, "password": 0, "search_keys": 0}).sort(
+        [("created_at", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_user_cursor(users[limit - 1]) if len(users) > limit else None
+    return {"users": users[:limit], "next_cursor": next_cursor}
+
+@api_router.get("/admin/users")
+async def search_users(
+    q: Optional[str] = None,
+    role: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    limit: int = USER_SEARCH_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Search users by name, email or phone prefix (admin only), newest first,
+    optionally by role and creation date. Pass next_cursor back as cursor
+    for the following page.
+    """
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if not 1 <= limit <= USER_SEARCH_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {USER_SEARCH_MAX_PAGE_SIZE}")
+    
+    return await find_users(q, role, created_after, created_before, limit, cursor)
+
 @api_router.get("/admin/customers")
-async def get_all_customers(current_user: dict = Depends(get_current_user)):
-    """Get all customers (admin only)"""
+async def get_all_customers(
+    response: Response,
+    q: Optional[str] = None,
+    limit: int = USER_SEARCH_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get customers, newest first, one bounded page at a time (admin only).
+    The X-Next-Cursor header carries the cursor for the following page;
+    /admin/users returns it in the body.
+    """
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    customers = await db.users.find({"role": "customer"}, {"_id": 0, "password": 0}).to_list(None)
-    return customers
+    if not 1 <= limit <= USER_SEARCH_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {USER_SEARCH_MAX_PAGE_SIZE}")
+    
+    page = await find_users(q, "customer", None, None, limit, cursor)
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["users"]
+
+# Admin listings are paginated; limit is capped so one response stays small
+ADMIN_PAGE_SIZE = 100
+ADMIN_MAX_PAGE_SIZE = 500
+VENDOR_SORT_FIELDS = ["created_at", "name"]
+
+def validate_page(skip: int, limit: int):
+    if skip < 0:
+        raise HTTPException(status_code=400, detail="skip must not be negative")
+    if not 1 <= limit <= ADMIN_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {ADMIN_MAX_PAGE_SIZE}")
 
 @api_router.get("/admin/vendors")
-async def get_all_vendors(current_user: dict = Depends(get_current_user)):
-    """Get all vendors with their restaurants (admin only)"""
+async def get_all_vendors(
+    skip: int = 0,
+    limit: int = ADMIN_PAGE_SIZE,
+    sort: str = "created_at",
+    descending: bool = False,
+    include_summary: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get vendors with their restaurants (admin only), one page at a time,
+    sorted by created_at or name. include_summary adds each vendor's order
+    count, delivered orders and delivered revenue.
+    """
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    vendors = await db.users.find({"role": "vendor"}, {"_id": 0, "password": 0}).to_list(None)
-    
-    # Get restaurants for each vendor
-    for vendor in vendors:
-        restaurant = await db.restaurants.find_one({"vendor_id": vendor['id']}, {"_id": 0})
-        vendor['restaurant'] = restaurant
+    validate_page(skip, limit)
+    if sort not in VENDOR_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(VENDOR_SORT_FIELDS)}")
     
-    return vendors
+    # Page first so the joins only run for the vendors returned
+    pipeline = [
+        {"$match": {"role": "vendor"}},
+        {"$sort": {sort: -1 if descending else 1, "id": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$lookup": {"from": "restaurants", "localField": "id", "foreignField": "vendor_id", "as": "restaurants"}},
+        {"$addFields": {"restaurant": {"$ifNull": [{"$arrayElemAt": ["$restaurants", 0]}, None]}}},
+    ]
+    if include_summary:
+        # Orders of all the vendor's restaurants, grouped on the server.
+        # localField with pipeline needs MongoDB 5.0, the README's minimum;
+        # unlike a let/$expr join it matches through the restaurant_id index
+        pipeline += [
+            {"$lookup": {
+                "from": "orders",
+                "localField": "restaurants.id",
+                "foreignField": "restaurant_id",
+                "pipeline": [{"$group": {
+                    "_id": None,
+                    "total_orders": {"$sum": 1},
+                    "delivered_orders": {"$sum": {"$cond": [{"$eq": ["$status", "delivered"]}, 1, 0]}},
+                    "revenue": {"$sum": {"$cond": [{"$eq": ["$status", "delivered"]}, "$total_amount", 0]}},
+                }}],
+                "as": "order_summary"
+            }},
+            {"$addFields": {"summary": {"$ifNull": [
+                {"$arrayElemAt": ["$order_summary", 0]},
+                {"total_orders": 0, "delivered_orders": 0, "revenue": 0}
+            ]}}},
+            {"$project": {"order_summary": 0, "summary._id": 0}},
+        ]
+    pipeline.append({"$project": {"_id": 0, "password": 0, "search_keys": 0, "restaurants": 0, "restaurant._id": 0}})
+    
+    return await db.users.aggregate(pipeline).to_list(limit)
+
+RIDER_SORT_FIELDS = ["created_at", "name", "total_deliveries"]
+
+async def rider_delivery_counts(rider_ids: Optional[List[str]] = None) -> dict:
+    """{rider_id: {total_deliveries, active_deliveries}} in one grouped aggregation over orders"""
+    match = {"status": {"$in": ["delivered", "out-for-delivery"]}}
+    if rider_ids is not None:
+        match["rider_id"] = {"$in": rider_ids}
+    rows = await db.orders.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": "$rider_id",
+            "total_deliveries": {"$sum": {"$cond": [{"$eq": ["$status", "delivered"]}, 1, 0]}},
+            "active_deliveries": {"$sum": {"$cond": [{"$eq": ["$status", "out-for-delivery"]}, 1, 0]}},
+        }},
+    ]).to_list(None)
+    return {row.pop('_id'): row for row in rows}
+
+async def rider_performance(rider_ids: List[str]) -> dict:
+    """
+    {rider_id: stats} with deliveries made by the end of their booked slot's
+    window, and the planned distance of the plan routes each rider was given
+    """
+    timed, routes = await asyncio.gather(
+        db.orders.aggregate([
+            {"$match": {"rider_id": {"$in": rider_ids}, "status": "delivered",
+                        "delivered_on_time": {"$in": [True, False]}}},
+            {"$group": {
+                "_id": "$rider_id",
+                "timed_deliveries": {"$sum": 1},
+                "on_time_deliveries": {"$sum": {"$cond": ["$delivered_on_time", 1, 0]}},
+            }},
+        ]).to_list(None),
+        db.route_plans.aggregate([
+            {"$match": {"routes.rider_id": {"$in": rider_ids}}},
+            {"$unwind": "$routes"},
+            {"$match": {"routes.rider_id": {"$in": rider_ids}}},
+            {"$group": {
+                "_id": "$routes.rider_id",
+                "assigned_routes": {"$sum": 1},
+                "planned_distance_km": {"$sum": "$routes.total_distance_km"},
+            }},
+        ]).to_list(None),
+    )
+    timed = {row['_id']: row for row in timed}
+    routes = {row['_id']: row for row in routes}
+    performance = {}
+    for rider_id in rider_ids:
+        on_time = timed.get(rider_id, {})
+        planned = routes.get(rider_id, {})
+        count = on_time.get('timed_deliveries', 0)
+        performance[rider_id] = {
+            "timed_deliveries": count,
+            "on_time_rate": round(on_time['on_time_deliveries'] / count, 3) if count else None,
+            "assigned_routes": planned.get('assigned_routes', 0),
+            "planned_distance_km": round(planned.get('planned_distance_km', 0), 2),
+        }
+    return performance
 
 @api_router.get("/admin/riders")
-async def get_all_riders(current_user: dict = Depends(get_current_user)):
-    """Get all riders (admin only)"""
+async def get_all_riders(
+    skip: int = 0,
+    limit: int = ADMIN_PAGE_SIZE,
+    sort: str = "created_at",
+    descending: bool = False,
+    include_performance: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get riders with delivery stats (admin only), one page at a time, sorted
+    by created_at, name or total_deliveries. include_performance adds each
+    rider's on-time rate and planned route distance.
+    """
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    riders = await db.users.find({"role": "rider"}, {"_id": 0, "password": 0}).to_list(None)
+    validate_page(skip, limit)
+    if sort not in RIDER_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(RIDER_SORT_FIELDS)}")
+    
+    if sort == "total_deliveries":
+        # Ranking needs every rider's count, so count first and page the ids
+        counts = await rider_delivery_counts()
+        rider_ids = [r['id'] for r in await db.users.find({"role": "rider"}, {"_id": 0, "id": 1}).to_list(None)]
+        rider_ids.sort(key=lambda rider_id: (counts.get(rider_id, {}).get('total_deliveries', 0), rider_id),
+                       reverse=descending)
+        page = {rider_id: position for position, rider_id in enumerate(rider_ids[skip:skip + limit])}
+        riders = await db.users.find({"id": {"$in": list(page)}}, {"_id": 0, "password": 0, "search_keys": 0}).to_list(limit)
+        riders.sort(key=lambda rider: page[rider['id']])
+    else:
+        riders = await db.users.find({"role": "rider"}, {"_id": 0, "password": 0, "search_keys": 0}).sort(
+            [(sort, -1 if descending else 1), ("id", 1)]
+        ).skip(skip).limit(limit).to_list(limit)
+        counts = await rider_delivery_counts([rider['id'] for rider in riders])
     
-    # Get delivery stats for each rider
+    performance = await rider_performance([rider['id'] for rider in riders]) if include_performance else {}
     for rider in riders:
-        total_deliveries = await db.orders.count_documents({"rider_id": rider['id'], "status": "delivered"})
-        active_deliveries = await db.orders.count_documents({"rider_id": rider['id'], "status": "out-for-delivery"})
         rider['stats'] = {
-            "total_deliveries": total_deliveries,
-            "active_deliveries": active_deliveries
+            **counts.get(rider['id'], {"total_deliveries": 0, "active_deliveries": 0}),
+            **performance.get(rider['id'], {})
         }
     
     return riders
 
+ACTIVE_ORDER_STATUSES = ["placed", "confirmed", "preparing", "ready", "out-for-delivery"]
+
 @api_router.get("/admin/stats")
 async def get_admin_stats(current_user: dict = Depends(get_current_user)):
-    """Get comprehensive system statistics (admin only)"""
+    """Get comprehensive system statistics (admin only), read from the platform counters"""
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Count users by role
-    total_customers = await db.users.count_documents({"role": "customer"})
-    total_vendors = await db.users.count_documents({"role": "vendor"})
-    total_riders = await db.users.count_documents({"role": "rider"})
+    counters = await db.counters.find_one({"_id": PLATFORM_COUNTERS_ID})
+    if counters is None:
+        await verify_platform_counters()
+        counters = await db.counters.find_one({"_id": PLATFORM_COUNTERS_ID}) or {}
+    users, orders = counters.get('users', {}), counters.get('orders', {})
+    restaurants = counters.get('restaurants', {})
     
-    # Order statistics
-    total_orders = await db.orders.count_documents({})
-    delivered_orders = await db.orders.count_documents({"status": "delivered"})
-    active_orders = await db.orders.count_documents({"status": {"$in": ["placed", "confirmed", "preparing", "ready", "out-for-delivery"]}})
-    
-    # Revenue calculation
-    pipeline = [
-        {"$match": {"status": "delivered"}},
-        {"$group": {"_id": None, "total_revenue": {"$sum": "$total_amount"}}}
-    ]
-    revenue_result = await db.orders.aggregate(pipeline).to_list(None)
-    total_revenue = revenue_result[0]['total_revenue'] if revenue_result else 0
-    
-    # Restaurant count
-    total_restaurants = await db.restaurants.count_documents({})
-    active_restaurants = await db.restaurants.count_documents({"is_active": True})
+    total_customers, total_vendors, total_riders = users.get("customer", 0), users.get("vendor", 0), users.get("rider", 0)
+    delivered_orders = orders.get("delivered", 0)
+    total_revenue = counters.get('revenue', {}).get("delivered", 0)
     
     return {
         "users": {
@@ -1565,21 +3487,29 @@ async def get_admin_stats(current_user: dict = Depends(get_current_user)):
             "total_users": total_customers + total_vendors + total_riders
         },
         "orders": {
-            "total_orders": total_orders,
+            "total_orders": sum(orders.values()),
             "delivered_orders": delivered_orders,
-            "active_orders": active_orders,
-            "cancelled_orders": await db.orders.count_documents({"status": "cancelled"})
+            "active_orders": sum(orders.get(status, 0) for status in ACTIVE_ORDER_STATUSES),
+            "cancelled_orders": orders.get("cancelled", 0)
         },
         "revenue": {
             "total_revenue": total_revenue,
             "average_order_value": total_revenue / delivered_orders if delivered_orders > 0 else 0
         },
         "restaurants": {
-            "total_restaurants": total_restaurants,
-            "active_restaurants": active_restaurants
+            "total_restaurants": restaurants.get("total", 0),
+            "active_restaurants": restaurants.get("active", 0)
         }
     }
 
+@api_router.post("/admin/counters/verify")
+async def verify_counters_now(current_user: dict = Depends(get_current_user)):
+    """Recount the dashboard counters now and report any drift that was corrected (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return await verify_platform_counters()
+
 @api_router.post("/admin/add-wallet-money")
 async def admin_add_wallet_money(request: AddWalletMoneyRequest, current_user: dict = Depends(get_current_user)):
     """Add money to customer wallet (admin only)"""
@@ -1614,11 +3544,14 @@ async def admin_add_wallet_money(request: AddWalletMoneyRequest, current_user: d
         payment_method="admin_credit",
         status="completed",
         description=request.description or f"Admin credit by {current_user['name']}",
+        balance_before=current_balance,
         balance_after=new_balance,
         created_at=datetime.now(timezone.utc)
     )
     
-    await db.wallet_transactions.insert_one(transaction.model_dump())
+    transaction_dict = transaction.model_dump()
+    transaction_dict['created_at'] = transaction_dict['created_at'].isoformat()
+    await db.wallet_transactions.insert_one(transaction_dict)
     
     return {
         "message": "Wallet credited successfully",
@@ -1670,6 +3603,13 @@ async def admin_update_user(
     if not update_fields:
         raise HTTPException(status_code=400, detail="No fields to update")
     
+    if {"name", "email", "phone"} & update_fields.keys():
+        update_fields["search_keys"] = user_search_keys(
+            update_fields.get("name", user.get('name')),
+            update_fields.get("email", user.get('email')),
+            update_fields.get("phone", user.get('phone'))
+        )
+    
     # Update user
     await db.users.update_one(
         {"id": user_id},
@@ -1677,7 +3617,7 @@ async def admin_update_user(
     )
     
     # Get updated user
-    updated_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    updated_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0, "search_keys": 0})
     
     return {
         "message": "User updated successfully",
@@ -1703,19 +3643,25 @@ async def admin_delete_user(user_id: str, current_user: dict = Depends(get_curre
     if user_id == current_user['id']:
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
-    # Delete user
-    await db.users.delete_one({"id": user_id})
-    
-    # If vendor, also delete their restaurant(s) and menu items
-    if user['role'] == 'vendor':
-        restaurants = await db.restaurants.find({"vendor_id": user_id}).to_list(100)
-        restaurant_ids = [r['id'] for r in restaurants]
+    async with counted_write() as counts:
+        # Delete user
+        result = await db.users.delete_one({"id": user_id})
+        counts[f"users.{user['role']}"] = -result.deleted_count
         
-        # Delete menu items
-        await db.menu_items.delete_many({"restaurant_id": {"$in": restaurant_ids}})
-        
-        # Delete restaurants
-        await db.restaurants.delete_many({"vendor_id": user_id})
+        # If vendor, also delete their restaurant(s) and menu items
+        if user['role'] == 'vendor':
+            restaurants = await db.restaurants.find({"vendor_id": user_id}).to_list(100)
+            restaurant_ids = [r['id'] for r in restaurants]
+            
+            # Delete menu items
+            await db.menu_items.delete_many({"restaurant_id": {"$in": restaurant_ids}})
+            
+            # Delete restaurants
+            result = await db.restaurants.delete_many({"vendor_id": user_id})
+            counts.update({
+                "restaurants.total": -result.deleted_count,
+                "restaurants.active": -sum(1 for r in restaurants if r.get('is_active'))
+            })
     
     return {
         "message": f"User {user['name']} ({user['role']}) deleted successfully",
@@ -1735,6 +3681,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 logging.basicConfig(
@@ -1743,6 +3690,153 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    # Plan lookups by id, a vendor's recent plans and each rider's manifest
+    await db.route_plans.create_index("id", unique=True)
+    await db.route_plans.create_index([("created_by", 1), ("created_at", -1)])
+    await db.route_plans.create_index([("routes.rider_id", 1), ("created_at", -1)])
+    # Available riders by load
+    await db.users.create_index([("role", 1), ("active_deliveries", 1), ("last_assigned_at", 1)])
+    await backfill_rider_loads()
+    # A rider's track in time order; history expires after HISTORY_TTL_SECONDS
+    await db.rider_positions.create_index([("rider_id", 1), ("recorded_at", 1)])
+    await db.rider_positions.create_index("recorded_at", expireAfterSeconds=HISTORY_TTL_SECONDS)
+    # Positions flushed by any worker, for each worker's live index
+    await db.users.create_index([("role", 1), ("last_position_at", 1)])
+    # Recent deliveries for the travel model
+    await db.orders.create_index([("status", 1), ("delivered_at", 1)])
+    # Ready orders pinned inside a pooled routing area
+    await db.orders.create_index([("status", 1), ("delivery_latitude", 1), ("delivery_longitude", 1)])
+    # Admin vendor listing: vendors in page order, joined to restaurants and their orders
+    await db.users.create_index([("role", 1), ("name", 1)])
+    await db.restaurants.create_index("vendor_id")
+    await db.orders.create_index([("restaurant_id", 1), ("placed_at", -1)])
+    # Admin user search: newest first by role, and prefix ranges over search_keys
+    await db.users.create_index([("role", 1), ("created_at", -1), ("id", -1)])
+    await db.users.create_index([("search_keys", 1), ("role", 1), ("created_at", -1)])
+    await backfill_user_search_keys()
+    # Delivery stats per rider for the admin rider listing
+    await db.orders.create_index([("rider_id", 1), ("status", 1)])
+    # Daily rollups by day, and per restaurant; orders by day for rebuilds
+    await db.daily_rollups.create_index([("date", 1), ("restaurant_id", 1), ("status", 1)], unique=True)
+    await db.daily_rollups.create_index([("restaurant_id", 1), ("date", 1)])
+    await db.orders.create_index("placed_at")
+    # Parquet snapshots find what changed since their checkpoint
+    await db.orders.create_index("updated_at")
+    await db.wallet_transactions.create_index("created_at")
+    await db.wallet_transactions.create_index("completed_at")
+
+@app.on_event("startup")
+async def start_rider_position_flusher():
+    global rider_position_flusher
+    await sync_rider_positions()
+    rider_position_flusher = asyncio.create_task(flush_rider_positions_periodically())
+
+@app.on_event("startup")
+async def start_order_rollup_backfill():
+    global order_rollup_backfill
+    order_rollup_backfill = asyncio.create_task(backfill_order_rollups())
+
+@app.on_event("startup")
+async def start_rider_load_verifier():
+    global rider_load_verifier
+    rider_load_verifier = asyncio.create_task(verify_rider_loads_periodically())
+
+@app.on_event("startup")
+async def start_counters_verifier():
+    global counters_verifier
+    counters_verifier = asyncio.create_task(verify_platform_counters_periodically())
+
+@app.on_event("startup")
+async def start_parquet_export():
+    global parquet_export_scheduler
+    parquet_export_scheduler = asyncio.create_task(export_parquet_snapshots_periodically())
+
+@app.on_event("startup")
+async def start_travel_model_refresh():
+    global travel_model_refresher
+    travel_model_refresher = asyncio.create_task(refresh_travel_model_periodically())
+
+async def backfill_user_search_keys():
+    """Add search_keys to users created before user search, a thousand per write"""
+    cursor = db.users.find(
+        {"search_keys": {"$exists": False}}, {"_id": 0, "id": 1, "name": 1, "email": 1, "phone": 1}
+    )
+    operations, count = [], 0
+    async for user in cursor:
+        operations.append(UpdateOne(
+            {"id": user['id']},
+            {"$set": {"search_keys": user_search_keys(user.get('name'), user.get('email'), user.get('phone'))}}
+        ))
+        if len(operations) == 1000:
+            await db.users.bulk_write(operations, ordered=False)
+            count += len(operations)
+            operations = []
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+        count += len(operations)
+    if count:
+        logger.info(f"Backfilled search keys for {count} users")
+
+async def backfill_rider_loads():
+    """Count active deliveries for riders created before loads were tracked"""
+    riders = await db.users.find(
+        {"role": "rider", "active_deliveries": {"$exists": False}}, {"_id": 0, "id": 1}
+    ).to_list(None)
+    if not riders:
+        return
+    rider_ids = [r['id'] for r in riders]
+    counts = {
+        row['_id']: row['count'] for row in await db.orders.aggregate([
+            {"$match": {"status": "out-for-delivery", "rider_id": {"$in": rider_ids}}},
+            {"$group": {"_id": "$rider_id", "count": {"$sum": 1}}},
+        ]).to_list(None)
+    }
+    await db.users.bulk_write([
+        UpdateOne(
+            {"id": rider_id, "active_deliveries": {"$exists": False}},
+            {"$set": {"active_deliveries": counts.get(rider_id, 0), "last_assigned_at": None}}
+        )
+        for rider_id in rider_ids
+    ], ordered=False)
+    logger.info(f"Backfilled delivery loads for {len(rider_ids)} riders")
+
+@app.on_event("shutdown")
+async def stop_rider_position_flusher():
+    # Registered before the client closes so buffered pings are written
+    if rider_position_flusher is not None:
+        rider_position_flusher.cancel()
+    await flush_rider_positions()
+
+@app.on_event("shutdown")
+async def stop_rider_load_verifier():
+    if rider_load_verifier is not None:
+        rider_load_verifier.cancel()
+
+@app.on_event("shutdown")
+async def stop_counters_verifier():
+    if counters_verifier is not None:
+        counters_verifier.cancel()
+
+@app.on_event("shutdown")
+async def stop_parquet_export():
+    if parquet_export_scheduler is not None:
+        parquet_export_scheduler.cancel()
+
+@app.on_event("shutdown")
+async def stop_travel_model_refresh():
+    if travel_model_refresher is not None:
+        travel_model_refresher.cancel()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+@app.on_event("shutdown")
+async def shutdown_route_jobs():
+    route_jobs.shutdown()
+
+@app.on_event("shutdown")
+async def shutdown_geocoder():
+    geocoder.shutdown()
\ No newline at end of file
@@ -0,0 +1,284 @@
+"""
+Grid-based spatial index over lat/lng points.
+
+Points are bucketed into square cells of a fixed size in km using an
+equirectangular projection around a reference latitude, which is accurate
+to well under a percent at city scale. Queries expand ring by ring from the
+query cell and rank candidates by exact haversine distance. Inserts, moves
+and removals are O(1), so the index suits both one-off route solves and
+live positions that change every few seconds.
+"""
+import heapq
+import math
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LNG_EQUATOR = 111.320
+DEFAULT_CELL_KM = 1.0
+# Planar ring bounds are shrunk slightly so projection error can never make
+# a query stop before the true nearest point has been seen
+RING_SLACK = 0.95
+
+
+def _haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dlng / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _km_to_hav(km: float) -> float:
+    """Haversine term a = sin^2(d / 2R) for a distance d; monotonic in d"""
+    return math.sin(min(km / (2 * EARTH_RADIUS_KM), math.pi / 2)) ** 2
+
+
+def _hav_to_km(a: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """Uniform-grid index supporting k-nearest and radius queries"""
+
+    def __init__(self, cell_km: float = DEFAULT_CELL_KM, reference_lat: Optional[float] = None):
+        if cell_km <= 0:
+            raise ValueError("cell_km must be positive")
+        self.cell_km = cell_km
+        self.reference_lat = reference_lat
+        # cell -> key -> (lat, lng, lat_rad, lng_rad, cos_lat)
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, ...]]] = {}
+        self._points: Dict[Hashable, Tuple[Tuple[int, int], float, float]] = {}
+        self._bounds: Optional[List[int]] = None  # min_cx, min_cy, max_cx, max_cy
+
+    @classmethod
+    def from_points(cls, coords, cell_km: Optional[float] = None, keys=None) -> "SpatialIndex":
+        """Build an index over an (N, 2) lat/lng array, keyed by row index by default"""
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if cell_km is None:
+            cell_km = suggest_cell_km(coords)
+        reference_lat = float(coords[:, 0].mean()) if len(coords) else None
+        index = cls(cell_km, reference_lat)
+        keys = range(len(coords)) if keys is None else keys
+        for key, (lat, lng) in zip(keys, coords.tolist()):
+            index.insert(key, lat, lng)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._points
+
+    def position(self, key: Hashable) -> Optional[Tuple[float, float]]:
+        entry = self._points.get(key)
+        return (entry[1], entry[2]) if entry else None
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        scale_lng = KM_PER_DEG_LNG_EQUATOR * math.cos(math.radians(self.reference_lat))
+        return (
+            math.floor(lng * scale_lng / self.cell_km),
+            math.floor(lat * KM_PER_DEG_LAT / self.cell_km),
+        )
+
+    def insert(self, key: Hashable, lat: float, lng: float):
+        """Add a point, or move it if the key is already indexed"""
+        if self.reference_lat is None:
+            self.reference_lat = lat
+        cell = self._cell(lat, lng)
+        old = self._points.get(key)
+        if old is not None and old[0] != cell:
+            self._discard_from_cell(key, old[0])
+        lat_rad = math.radians(lat)
+        self._cells.setdefault(cell, {})[key] = (lat, lng, lat_rad, math.radians(lng), math.cos(lat_rad))
+        self._points[key] = (cell, lat, lng)
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            b = self._bounds
+            b[0], b[1] = min(b[0], cell[0]), min(b[1], cell[1])
+            b[2], b[3] = max(b[2], cell[0]), max(b[3], cell[1])
+
+    def remove(self, key: Hashable) -> bool:
+        entry = self._points.pop(key, None)
+        if entry is None:
+            return False
+        self._discard_from_cell(key, entry[0])
+        return True
+
+    def _discard_from_cell(self, key: Hashable, cell: Tuple[int, int]):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _ring(self, cx: int, cy: int, r: int) -> Iterator[Tuple[int, int]]:
+        """Occupied cells at Chebyshev distance exactly r from (cx, cy)"""
+        min_cx, min_cy, max_cx, max_cy = self._bounds
+        if r == 0:
+            if (cx, cy) in self._cells:
+                yield (cx, cy)
+            return
+        x_lo, x_hi = max(cx - r, min_cx), min(cx + r, max_cx)
+        for y in (cy - r, cy + r):
+            if min_cy <= y <= max_cy:
+                for x in range(x_lo, x_hi + 1):
+                    if (x, y) in self._cells:
+                        yield (x, y)
+        y_lo, y_hi = max(cy - r + 1, min_cy), min(cy + r - 1, max_cy)
+        for x in (cx - r, cx + r):
+            if min_cx <= x <= max_cx:
+                for y in range(y_lo, y_hi + 1):
+                    if (x, y) in self._cells:
+                        yield (x, y)
+
+    def _max_ring(self, cx: int, cy: int) -> int:
+        min_cx, min_cy, max_cx, max_cy = self._bounds
+        return max(cx - min_cx, max_cx - cx, cy - min_cy, max_cy - cy, 0)
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int = 1,
+        max_km: Optional[float] = None,
+        predicate: Optional[Callable[[Hashable], bool]] = None,
+    ) -> List[Tuple[Hashable, float]]:
+        """
+        Up to k (key, distance_km) pairs closest to the query point, nearest
+        first. ``predicate`` filters keys; ``max_km`` bounds the search.
+        """
+        if not self._points or k <= 0:
+            return []
+        cx, cy = self._cell(lat, lng)
+        max_ring = self._max_ring(cx, cy)
+        lat_r, lng_r = math.radians(lat), math.radians(lng)
+        cos_lat = math.cos(lat_r)
+        max_a = _km_to_hav(max_km) if max_km is not None else None
+        sin = math.sin
+        # Candidates are ranked by the haversine term, which orders the same
+        # way as distance; heap is a max-heap via negation
+        heap: List[Tuple[float, int, Hashable]] = []
+        tiebreak = 0
+        r = 0
+        while r <= max_ring:
+            for cell in self._ring(cx, cy, r):
+                for key, (_, _, plat_r, plng_r, pcos) in self._cells[cell].items():
+                    if predicate is not None and not predicate(key):
+                        continue
+                    a = sin((plat_r - lat_r) / 2) ** 2 + cos_lat * pcos * sin((plng_r - lng_r) / 2) ** 2
+                    if max_a is not None and a > max_a:
+                        continue
+                    tiebreak += 1
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-a, -tiebreak, key))
+                    elif a < -heap[0][0]:
+                        heapq.heapreplace(heap, (-a, -tiebreak, key))
+            # Everything not yet scanned lies at least r cells away
+            cleared_km = r * self.cell_km * RING_SLACK
+            if len(heap) == k and -heap[0][0] <= _km_to_hav(cleared_km):
+                break
+            if max_km is not None and cleared_km > max_km:
+                break
+            r += 1
+        return [(key, _hav_to_km(-neg_a)) for neg_a, _, key in sorted(heap, key=lambda e: (-e[0], -e[1]))]
+
+    def within_radius(self, lat: float, lng: float, radius_km: float) -> List[Tuple[Hashable, float]]:
+        """All (key, distance_km) pairs within radius_km of the query point, nearest first"""
+        if not self._points:
+            return []
+        cx, cy = self._cell(lat, lng)
+        reach = min(math.ceil(radius_km / (self.cell_km * RING_SLACK)) + 1, self._max_ring(cx, cy))
+        found = []
+        for r in range(reach + 1):
+            for cell in self._ring(cx, cy, r):
+                for key, (plat, plng, *_) in self._cells[cell].items():
+                    d = _haversine(lat, lng, plat, plng)
+                    if d <= radius_km:
+                        found.append((key, d))
+        found.sort(key=lambda item: item[1])
+        return found
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    (min_lat, max_lat, min_lng, max_lng) of a box containing every point
+    within radius_km, for prefiltering a database query before exact distances
+    """
+    dlat = radius_km / KM_PER_DEG_LAT
+    # Longitude degrees shrink away from the equator; size them at the box's far edge
+    far_lat = min(abs(lat) + dlat, 89.0)
+    dlng = min(radius_km / (KM_PER_DEG_LNG_EQUATOR * math.cos(math.radians(far_lat))), 180.0)
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def suggest_cell_km(coords, points_per_cell: float = 2.0) -> float:
+    """Cell size giving roughly ``points_per_cell`` points per occupied cell"""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) < 2:
+        return DEFAULT_CELL_KM
+    scale_lng = KM_PER_DEG_LNG_EQUATOR * math.cos(math.radians(float(coords[:, 0].mean())))
+    height = float(np.ptp(coords[:, 0])) * KM_PER_DEG_LAT
+    width = float(np.ptp(coords[:, 1])) * scale_lng
+    area = max(height, 0.01) * max(width, 0.01)
+    return max(math.sqrt(area * points_per_cell / len(coords)), 0.05)
+
+
+def knn_graph(coords, k: int) -> List[List[int]]:
+    """
+    The k nearest other points for every row of an (N, 2) lat/lng array,
+    nearest first. Points are bucketed on the same grid as SpatialIndex and
+    each cell's members are resolved together with one NumPy distance block
+    against the surrounding cells, growing the block until it provably
+    contains every member's k nearest.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+
+    cell_km = suggest_cell_km(coords, points_per_cell=k)
+    scale_lng = KM_PER_DEG_LNG_EQUATOR * math.cos(math.radians(float(coords[:, 0].mean())))
+    cx = np.floor(coords[:, 1] * scale_lng / cell_km).astype(np.int64)
+    cy = np.floor(coords[:, 0] * KM_PER_DEG_LAT / cell_km).astype(np.int64)
+    lat = np.radians(coords[:, 0])
+    lng = np.radians(coords[:, 1])
+    unit = np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+    order = np.lexsort((cy, cx))
+    cells: Dict[Tuple[int, int], np.ndarray] = {}
+    keys = np.column_stack([cx[order], cy[order]])
+    boundaries = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+    for group in np.split(order, boundaries):
+        cells[(int(cx[group[0]]), int(cy[group[0]]))] = group
+    max_span = int(max(np.ptp(cx), np.ptp(cy))) + 1
+
+    result: List[List[int]] = [[] for _ in range(n)]
+    for (x, y), members in cells.items():
+        r = 1
+        while True:
+            blocks = [cells[(i, j)] for i in range(x - r, x + r + 1)
+                      for j in range(y - r, y + r + 1) if (i, j) in cells]
+            candidates = np.concatenate(blocks)
+            dot = unit[members] @ unit[candidates].T
+            dist = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip((1.0 - dot) * 0.5, 0.0, 1.0)))
+            dist[members[:, None] == candidates[None, :]] = np.inf
+            if len(candidates) > k:
+                part = np.argpartition(dist, k - 1, axis=1)[:, :k]
+                kth = np.take_along_axis(dist, part, axis=1).max()
+                if kth <= r * cell_km * RING_SLACK or r >= max_span:
+                    break
+            elif r >= max_span:
+                part = np.argsort(dist, axis=1)[:, :k]
+                break
+            r += 1
+        part_dist = np.take_along_axis(dist, part, axis=1)
+        ranked = np.take_along_axis(part, np.argsort(part_dist, axis=1, kind="stable"), axis=1)
+        for row, member in enumerate(members.tolist()):
+            result[member] = candidates[ranked[row]].tolist()
+    return result
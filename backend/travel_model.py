@@ -0,0 +1,157 @@
+"""
+Travel speed and dwell time learned from past deliveries.
+
+Every delivered order contributes one leg: from its restaurant (starting
+when it went out for delivery) or from the rider's previous drop-off, to its
+own drop-off at the time it was marked delivered. Leg time is modelled as
+minutes = km * minutes_per_km + dwell_minutes and fitted by least squares
+per area (a grid cell of the destination) and local hour. Buckets with too
+few legs fall back to the hour across all areas, then to every leg, then to
+the fixed defaults in routing.
+
+Distances are haversine km, the same as the optimizer's default matrix, so
+the learned speed absorbs the road detour factor.
+
+Fitting runs as a background job; requests only read the fitted tables
+through TravelModel.pace, which is a handful of dictionary lookups per stop.
+"""
+import math
+from datetime import datetime, tzinfo
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from routing import AVERAGE_SPEED_KMPH, STOP_SERVICE_MINUTES, Pace, haversine_distance
+
+AREA_CELL_DEG = 0.05  # About 5.5 km
+MIN_LEG_SAMPLES = 30  # Legs a bucket needs before its own fit is trusted
+MAX_LEG_MINUTES = 90  # A longer gap between drop-offs is a break, not a leg
+HISTORY_DAYS = 28
+SPEED_BOUNDS_KMPH = (5.0, 60.0)
+DWELL_BOUNDS_MINUTES = (1.0, 20.0)
+
+
+class Leg(NamedTuple):
+    km: float
+    minutes: float
+    area: str  # area_key of the destination
+    hour: int  # Local hour the leg started
+
+
+def area_key(lat: float, lng: float) -> str:
+    return f"{math.floor(lat / AREA_CELL_DEG)}:{math.floor(lng / AREA_CELL_DEG)}"
+
+
+def extract_legs(deliveries: Iterable[dict], tz: tzinfo) -> List[Leg]:
+    """
+    Legs from delivered orders. Each delivery needs rider_id, latitude,
+    longitude, out_for_delivery_at and delivered_at (aware datetimes), and
+    optionally pickup_latitude/pickup_longitude for its restaurant.
+    """
+    by_rider: Dict[str, List[dict]] = {}
+    for delivery in deliveries:
+        by_rider.setdefault(delivery['rider_id'], []).append(delivery)
+
+    legs = []
+    for rider_deliveries in by_rider.values():
+        rider_deliveries.sort(key=lambda d: d['delivered_at'])
+        previous = None
+        for delivery in rider_deliveries:
+            end = (delivery['latitude'], delivery['longitude'])
+            # Continuing a trip: the previous drop-off was made after this order left
+            if previous is not None and previous['delivered_at'] >= delivery['out_for_delivery_at']:
+                start_at = previous['delivered_at']
+                start = (previous['latitude'], previous['longitude'])
+            elif delivery.get('pickup_latitude') is not None and delivery.get('pickup_longitude') is not None:
+                start_at = delivery['out_for_delivery_at']
+                start = (delivery['pickup_latitude'], delivery['pickup_longitude'])
+            else:
+                start = None
+            previous = delivery
+            if start is None:
+                continue
+            minutes = (delivery['delivered_at'] - start_at).total_seconds() / 60
+            if 0 < minutes <= MAX_LEG_MINUTES:
+                legs.append(Leg(haversine_distance(start, end), minutes, area_key(*end),
+                                start_at.astimezone(tz).hour))
+    return legs
+
+
+def _fit(legs: List[Leg]) -> Tuple[float, float]:
+    """Least-squares (minutes_per_km, dwell_minutes) within plausible bounds"""
+    km = np.array([leg.km for leg in legs])
+    minutes = np.array([leg.minutes for leg in legs])
+    lo_mpk, hi_mpk = 60 / SPEED_BOUNDS_KMPH[1], 60 / SPEED_BOUNDS_KMPH[0]
+    if np.ptp(km) > 0.1:
+        (minutes_per_km, dwell), *_ = np.linalg.lstsq(np.column_stack([km, np.ones_like(km)]), minutes, rcond=None)
+    else:
+        # Legs of one length cannot separate speed from dwell; keep the default speed
+        minutes_per_km = 60 / AVERAGE_SPEED_KMPH
+        dwell = float(np.mean(minutes - km * minutes_per_km))
+    minutes_per_km = float(np.clip(minutes_per_km, lo_mpk, hi_mpk))
+    dwell = float(np.clip(dwell, *DWELL_BOUNDS_MINUTES))
+    return minutes_per_km, dwell
+
+
+def fit_travel_model(legs: List[Leg]) -> dict:
+    """Lookup tables, as stored in Mongo, for TravelModel"""
+    def entry(bucket):
+        minutes_per_km, dwell = _fit(bucket)
+        return {"minutes_per_km": round(minutes_per_km, 4), "dwell_minutes": round(dwell, 3), "legs": len(bucket)}
+
+    by_hour: Dict[int, List[Leg]] = {}
+    by_cell: Dict[str, List[Leg]] = {}
+    for leg in legs:
+        by_hour.setdefault(leg.hour, []).append(leg)
+        by_cell.setdefault(f"{leg.area}|{leg.hour}", []).append(leg)
+    return {
+        "legs": len(legs),
+        "overall": entry(legs) if len(legs) >= MIN_LEG_SAMPLES else None,
+        "hours": {str(h): entry(b) for h, b in by_hour.items() if len(b) >= MIN_LEG_SAMPLES},
+        "cells": {key: entry(b) for key, b in by_cell.items() if len(b) >= MIN_LEG_SAMPLES},
+    }
+
+
+class TravelModel:
+    """Read side of the fitted tables; without tables it reproduces the fixed defaults"""
+
+    def __init__(self, tables: Optional[dict] = None):
+        tables = tables or {}
+        self.tables = tables
+        default = {"minutes_per_km": 60 / AVERAGE_SPEED_KMPH, "dwell_minutes": STOP_SERVICE_MINUTES}
+        self._overall = tables.get("overall") or default
+        self._hours = {int(h): e for h, e in (tables.get("hours") or {}).items()}
+        self._cells = tables.get("cells") or {}
+
+    def lookup(self, lat: float, lng: float, hour: int) -> Tuple[float, float]:
+        """(minutes_per_km, dwell_minutes) around a point at a local hour"""
+        entry = self._cells.get(f"{area_key(lat, lng)}|{hour}") or self._hours.get(hour) or self._overall
+        return entry["minutes_per_km"], entry["dwell_minutes"]
+
+    def pace(self, points, departure: datetime, hours: int = 4) -> Pace:
+        """Pace over ``points`` (lat, lng rows) for a trip leaving at ``departure`` (local time)"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        hours = max(1, hours)
+        # Stops share areas, so each (area, hour) is looked up once
+        areas = [area_key(lat, lng) for lat, lng in points.tolist()]
+        unique = sorted(set(areas))
+        column = {area: i for i, area in enumerate(unique)}
+        rows = np.array([column[area] for area in areas], dtype=np.intp)
+        table = np.empty((2, len(unique), hours))
+        for h in range(hours):
+            hour = (departure.hour + h) % 24
+            for i, area in enumerate(unique):
+                entry = self._cells.get(f"{area}|{hour}") or self._hours.get(hour) or self._overall
+                table[0, i, h], table[1, i, h] = entry["minutes_per_km"], entry["dwell_minutes"]
+        return Pace(table[0][rows], table[1][rows], departure.minute + departure.second / 60)
+
+    def summary(self) -> dict:
+        overall = self._overall
+        return {
+            "legs": self.tables.get("legs", 0),
+            "built_at": self.tables.get("built_at"),
+            "average_speed_kmph": round(60 / overall["minutes_per_km"], 1),
+            "dwell_minutes": round(overall["dwell_minutes"], 1),
+            "hours": sorted(self._hours),
+            "cells": len(self._cells),
+        }
@@ -9,14 +9,20 @@ import { Input } from '@/components/ui/input';
 import { toast } from 'sonner';
 import { ArrowLeft, Package, Store, Bike, Users, TrendingUp, Wallet, UserCircle, Edit, Trash2 } from 'lucide-react';
 
+// Admin listings come one page at a time
+const PAGE_SIZE = 100;
+
 const AdminDashboard = () => {
   const navigate = useNavigate();
   const auth = useAuth();
   const [orders, setOrders] = useState([]);
   const [restaurants, setRestaurants] = useState([]);
   const [customers, setCustomers] = useState([]);
+  const [customersCursor, setCustomersCursor] = useState(null);
   const [vendors, setVendors] = useState([]);
+  const [moreVendors, setMoreVendors] = useState(false);
   const [riders, setRiders] = useState([]);
+  const [moreRiders, setMoreRiders] = useState(false);
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState({});
   const [showAddMoneyDialog, setShowAddMoneyDialog] = useState(false);
@@ -45,16 +51,19 @@ const AdminDashboard = () => {
       const [ordersRes, restaurantsRes, customersRes, vendorsRes, ridersRes, statsRes] = await Promise.all([
         axios.get(`${API}/orders`),
         axios.get(`${API}/restaurants`),
-        axios.get(`${API}/admin/customers`),
-        axios.get(`${API}/admin/vendors`),
-        axios.get(`${API}/admin/riders`),
+        axios.get(`${API}/admin/users`, { params: { role: 'customer', limit: PAGE_SIZE } }),
+        axios.get(`${API}/admin/vendors`, { params: { limit: PAGE_SIZE } }),
+        axios.get(`${API}/admin/riders`, { params: { limit: PAGE_SIZE } }),
         axios.get(`${API}/admin/stats`)
       ]);
       setOrders(ordersRes.data);
       setRestaurants(restaurantsRes.data);
-      setCustomers(customersRes.data);
+      setCustomers(customersRes.data.users);
+      setCustomersCursor(customersRes.data.next_cursor);
       setVendors(vendorsRes.data);
+      setMoreVendors(vendorsRes.data.length === PAGE_SIZE);
       setRiders(ridersRes.data);
+      setMoreRiders(ridersRes.data.length === PAGE_SIZE);
       setStats(statsRes.data);
     } catch (error) {
       console.error('Failed to fetch data:', error);
@@ -62,6 +71,51 @@ const AdminDashboard = () => {
     }
   };
 
+  const loadMoreCustomers = async () => {
+    setLoading({ ...loading, customers: true });
+    try {
+      const response = await axios.get(`${API}/admin/users`, {
+        params: { role: 'customer', limit: PAGE_SIZE, cursor: customersCursor }
+      });
+      setCustomers([...customers, ...response.data.users]);
+      setCustomersCursor(response.data.next_cursor);
+    } catch (error) {
+      toast.error('Failed to load more customers');
+    } finally {
+      setLoading({ ...loading, customers: false });
+    }
+  };
+
+  const loadMoreVendors = async () => {
+    setLoading({ ...loading, vendors: true });
+    try {
+      const response = await axios.get(`${API}/admin/vendors`, {
+        params: { skip: vendors.length, limit: PAGE_SIZE }
+      });
+      setVendors([...vendors, ...response.data]);
+      setMoreVendors(response.data.length === PAGE_SIZE);
+    } catch (error) {
+      toast.error('Failed to load more vendors');
+    } finally {
+      setLoading({ ...loading, vendors: false });
+    }
+  };
+
+  const loadMoreRiders = async () => {
+    setLoading({ ...loading, riders: true });
+    try {
+      const response = await axios.get(`${API}/admin/riders`, {
+        params: { skip: riders.length, limit: PAGE_SIZE }
+      });
+      setRiders([...riders, ...response.data]);
+      setMoreRiders(response.data.length === PAGE_SIZE);
+    } catch (error) {
+      toast.error('Failed to load more riders');
+    } finally {
+      setLoading({ ...loading, riders: false });
+    }
+  };
+
   const updateOrderStatus = async (orderId, newStatus) => {
     setLoading({ ...loading, [orderId]: true });
     try {
@@ -479,6 +533,13 @@ const AdminDashboard = () => {
                   ))
                 )}
               </div>
+              {customersCursor && (
+                <div className="p-4 border-t text-center">
+                  <Button variant="outline" onClick={loadMoreCustomers} disabled={loading.customers} data-testid="load-more-customers-btn">
+                    {loading.customers ? 'Loading...' : 'Load more customers'}
+                  </Button>
+                </div>
+              )}
             </div>
           </TabsContent>
 
@@ -551,6 +612,13 @@ const AdminDashboard = () => {
                   ))
                 )}
               </div>
+              {moreVendors && (
+                <div className="p-4 border-t text-center">
+                  <Button variant="outline" onClick={loadMoreVendors} disabled={loading.vendors} data-testid="load-more-vendors-btn">
+                    {loading.vendors ? 'Loading...' : 'Load more vendors'}
+                  </Button>
+                </div>
+              )}
             </div>
           </TabsContent>
 
@@ -621,6 +689,13 @@ const AdminDashboard = () => {
                   ))
                 )}
               </div>
+              {moreRiders && (
+                <div className="p-4 border-t text-center">
+                  <Button variant="outline" onClick={loadMoreRiders} disabled={loading.riders} data-testid="load-more-riders-btn">
+                    {loading.riders ? 'Loading...' : 'Load more riders'}
+                  </Button>
+                </div>
+              )}
             </div>
           </TabsContent>
         </Tabs>
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Offline tests for batched, cached geocoding in backend/geocoding.py
+A local stub geocoder stands in for the Google Geocoding API
+"""
+
+import json
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import googlemaps
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+from geocoding import GeocodeCache, Geocoder, address_key, address_query  # noqa: E402
+
+# Stub answers: normalised address -> (lat, lng); anything else is ZERO_RESULTS
+KNOWN_ADDRESSES = {
+    address_key(f"{i}, Sea View Towers, Linking Road, Bandra West, Mumbai"): (19.06 + i / 1000, 72.83 + i / 1000)
+    for i in range(1, 21)
+}
+LOOKUP_DELAY_SECONDS = 0.05
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+
+class StubGeocodeHandler(BaseHTTPRequestHandler):
+    """Answers /maps/api/geocode/json from KNOWN_ADDRESSES"""
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(LOOKUP_DELAY_SECONDS)
+
+        if server.fail:
+            body = {"status": "UNKNOWN_ERROR", "results": []}
+        else:
+            point = KNOWN_ADDRESSES.get(address_key(params["address"][0]))
+            if point is None:
+                body = {"status": "ZERO_RESULTS", "results": []}
+            else:
+                body = {"status": "OK", "results": [{"geometry": {"location": {"lat": point[0], "lng": point[1]}}}]}
+        with server.lock:
+            server.in_flight -= 1
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubGeocoder:
+    def __enter__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubGeocodeHandler)
+        self.httpd.lock = threading.Lock()
+        self.httpd.calls = 0
+        self.httpd.in_flight = 0
+        self.httpd.max_in_flight = 0
+        self.httpd.fail = False
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        host, port = self.httpd.server_address
+        self.client = googlemaps.Client(key="AIzaFakeKeyForTests", base_url=f"http://{host}:{port}",
+                                        retry_over_query_limit=False, retry_timeout=1)
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def test_address_key_normalises_formatting():
+    query = address_query("Linking Road,  Bandra West, Mumbai", "12", "Sea View Towers")
+    assert query == "12, Sea View Towers, Linking Road,  Bandra West, Mumbai"
+    assert address_key(query) == address_key("12 ,sea-view towers,LINKING ROAD, Bandra West ,Mumbai.")
+    assert address_query("Sea View Towers, Mumbai", None, "sea view towers, mumbai") == "sea view towers, mumbai"
+    log("✅ Address keys ignore case, punctuation and spacing")
+
+
+def test_batched_lookups_and_persistent_cache():
+    addresses = [f"{i}, Sea View Towers, Linking Road, Bandra West, Mumbai" for i in range(1, 21)]
+    with tempfile.TemporaryDirectory() as tmp, StubGeocoder() as stub:
+        cache_path = Path(tmp) / "geocode.sqlite3"
+        geocoder = Geocoder(stub.client, GeocodeCache(cache_path), max_workers=8)
+        start = time.perf_counter()
+        points = geocoder.geocode_many(addresses + [addresses[0].upper()])
+        elapsed = time.perf_counter() - start
+        assert stub.httpd.calls == 20  # The upper-case repeat shares a key
+        assert stub.httpd.max_in_flight > 1
+        assert elapsed < 20 * LOOKUP_DELAY_SECONDS / 2
+        assert points[addresses[4]] == KNOWN_ADDRESSES[address_key(addresses[4])]
+        geocoder.shutdown()
+
+        # Repeat customers resolve from the cache, even after a restart
+        reopened = Geocoder(stub.client, GeocodeCache(cache_path))
+        again = reopened.geocode_many(addresses)
+        assert stub.httpd.calls == 20
+        assert again == {a: points[a] for a in addresses}
+        assert reopened.stats()["cache_hit_rate"] == 1.0
+        reopened.shutdown()
+    log(f"✅ 20 addresses geocoded concurrently in {elapsed * 1000:.0f} ms and cached across restarts")
+
+
+def test_unknown_addresses_and_failures():
+    with StubGeocoder() as stub:
+        geocoder = Geocoder(stub.client, GeocodeCache(":memory:"))
+        assert geocoder.geocode_many(["Nowhere Lane"]) == {"Nowhere Lane": None}
+        geocoder.geocode_many(["Nowhere Lane"])
+        assert stub.httpd.calls == 1  # Misses are cached too
+        assert geocoder.stats()["not_found"] == 1
+
+        stub.httpd.fail = True
+        assert geocoder.geocode_many(["Other Street"]) == {"Other Street": None}
+        stub.httpd.fail = False
+        assert geocoder.geocode_many(["Other Street"]) == {"Other Street": None}
+        assert stub.httpd.calls == 3  # API errors are not cached
+        assert geocoder.stats()["failures"] == 1
+        geocoder.shutdown()
+
+    offline = Geocoder(client=None)
+    assert offline.geocode_many(["12, Sea View Towers"]) == {"12, Sea View Towers": None}
+    log("✅ Unknown addresses are cached as misses; API errors are retried later")
+
+
+if __name__ == "__main__":
+    log("🚀 Starting geocoding tests")
+    tests = [
+        test_address_key_normalises_formatting,
+        test_batched_lookups_and_persistent_cache,
+        test_unknown_addresses_and_failures,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            log(f"❌ {test.__name__} failed: {e}")
+    log(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
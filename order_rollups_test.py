@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Offline tests for daily order rollups in backend/order_rollups.py
+No backend server or database needed
+"""
+
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+from order_rollups import rollup_day, rollup_deltas, rollup_totals, summarize_rollups  # noqa: E402
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+
+def order(order_id, placed_at, amount=100.0, fee=10.0, quantities=(1,), restaurant_id="r1"):
+    return {
+        "id": order_id, "restaurant_id": restaurant_id, "placed_at": placed_at,
+        "total_amount": amount, "delivery_fee": fee, "items": [{"quantity": q} for q in quantities],
+    }
+
+
+def apply(rows, deltas):
+    for key, values in deltas.items():
+        row = rows.setdefault(key, dict.fromkeys(values, 0))
+        for field, value in values.items():
+            row[field] += value
+
+
+def test_day_is_local_placement_date():
+    # 20:00 UTC is already the next morning in India
+    assert rollup_day("2026-10-05T20:00:00+00:00", IST) == "2026-10-06"
+    assert rollup_day("2026-10-05T18:00:00+00:00", IST) == "2026-10-05"
+    log("✅ Orders are bucketed by the local day they were placed")
+
+
+def test_status_changes_move_values_between_rows():
+    first = order("o1", "2026-10-05T02:00:00+00:00", quantities=(2, 1))
+    second = order("o2", "2026-10-05T03:00:00+00:00", amount=50.0)
+    rows = {}
+    apply(rows, rollup_deltas([(first, None, "placed"), (second, None, "placed")], IST))
+    apply(rows, rollup_deltas([(first, "placed", "delivered"), (second, "placed", "cancelled")], IST))
+    # A write that does not change the status leaves the rollups alone
+    assert rollup_deltas([(first, "delivered", "delivered")], IST) == {}
+
+    live = {key: row for key, row in rows.items() if any(row.values())}
+    rebuilt = rollup_deltas([(first, None, "delivered"), (second, None, "cancelled")], IST)
+    assert live == rebuilt
+    assert rebuilt[("2026-10-05", "r1", "delivered")] == {"orders": 1, "revenue": 100.0, "delivery_fees": 10.0, "items": 3}
+    log("✅ Incremental updates end where a rebuild from scratch does")
+
+
+def test_summaries_count_revenue_on_delivery():
+    rows = [
+        {"date": "2026-10-05", "restaurant_id": "r1", "status": "delivered", "orders": 3, "revenue": 300.0, "delivery_fees": 30.0, "items": 6},
+        {"date": "2026-10-05", "restaurant_id": "r2", "status": "placed", "orders": 2, "revenue": 80.0, "delivery_fees": 20.0, "items": 2},
+        {"date": "2026-10-06", "restaurant_id": "r1", "status": "cancelled", "orders": 1, "revenue": 50.0, "delivery_fees": 10.0, "items": 1},
+    ]
+    days = summarize_rollups(rows)
+    assert [d["date"] for d in days] == ["2026-10-05", "2026-10-06"]
+    assert days[0]["revenue"] == 300.0 and days[0]["booked_revenue"] == 380.0
+    assert days[1]["cancelled_orders"] == 1 and days[1]["booked_revenue"] == 0
+    restaurants = summarize_rollups(rows, group_by="restaurant_id")
+    assert rollup_totals(restaurants) == rollup_totals(days)
+    assert rollup_totals(days)["orders"] == 6
+    log("✅ Revenue counts delivered orders; cancelled ones only add to the order count")
+
+
+if __name__ == "__main__":
+    log("🚀 Starting order rollup tests")
+    tests = [
+        test_day_is_local_placement_date,
+        test_status_changes_move_values_between_rows,
+        test_summaries_count_revenue_on_delivery,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            log(f"❌ {test.__name__} failed: {e}")
+    log(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
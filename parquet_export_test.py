@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Offline tests for Parquet snapshots in backend/parquet_export.py
+No backend server or database needed
+"""
+
+import sys
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+from parquet_export import ORDERS, WALLET_TRANSACTIONS, ParquetExporter, change_query, read_dataset  # noqa: E402
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+
+def order(order_id, placed_at, status="placed", updated_at=None):
+    return {
+        "id": order_id, "status": status, "customer_id": "c1", "restaurant_id": "r1",
+        "total_amount": 120, "delivery_fee": 10.0, "placed_at": placed_at,
+        "updated_at": updated_at or placed_at, "review": "not exported",
+        "items": [{"menu_item_id": "m1", "name": "Idli", "quantity": 2, "price": 40}],
+    }
+
+
+def test_records_land_in_local_day_partitions():
+    with tempfile.TemporaryDirectory() as root:
+        exporter = ParquetExporter(Path(root), IST)
+        # 20:00 UTC is already the next morning in India
+        written = exporter.write_batch(ORDERS, [
+            order("o1", "2026-10-05T20:00:00+00:00"),
+            order("o2", "2026-10-05T10:00:00+00:00"),
+        ], "run1")
+        assert sorted(path.parent.name for path in written) == ["date=2026-10-05", "date=2026-10-06"]
+        frame = read_dataset(Path(root), ORDERS, start=date(2026, 10, 6))
+        assert list(frame["id"]) == ["o1"]
+        assert frame["date"][0] == "2026-10-06"
+        assert frame["total_amount"][0] == 120.0 and frame["items"][0][0]["quantity"] == 2
+        assert "review" not in frame.columns
+    log("✅ Records are partitioned by the local day they were created")
+
+
+def test_changed_records_are_appended_and_read_once():
+    with tempfile.TemporaryDirectory() as root:
+        exporter = ParquetExporter(Path(root), IST)
+        placed = "2026-10-05T02:00:00+00:00"
+        exporter.write_batch(ORDERS, [order("o1", placed), order("o2", placed)], "run1")
+        exporter.write_batch(ORDERS, [order("o1", placed, "delivered", "2026-10-05T06:00:00+00:00")], "run2")
+        frame = read_dataset(Path(root), ORDERS)
+        assert len(frame) == 2
+        latest = frame.set_index("id")
+        assert latest.loc["o1", "status"] == "delivered" and latest.loc["o2", "status"] == "placed"
+    log("✅ A record exported again is read back in its latest version")
+
+
+def test_checkpoint_advances_only_on_commit():
+    with tempfile.TemporaryDirectory() as root:
+        exporter = ParquetExporter(Path(root), IST)
+        assert exporter.checkpoint(WALLET_TRANSACTIONS) == {}
+        until = "2026-10-06T00:00:00+00:00"
+        # Rows stamped with BSON datetimes are matched as well as ISO strings
+        assert change_query(WALLET_TRANSACTIONS, None, until) == {"$or": [
+            {"created_at": {"$lt": until}},
+            {"created_at": {"$lt": datetime(2026, 10, 6, tzinfo=timezone.utc)}},
+            {"completed_at": {"$lt": until}},
+            {"completed_at": {"$lt": datetime(2026, 10, 6, tzinfo=timezone.utc)}},
+        ]}
+        txn = {"id": "t1", "user_id": "u1", "amount": 500, "status": "pending",
+               "created_at": "2026-10-05T02:00:00+00:00"}
+        # A failed run removes its files and leaves the checkpoint where it was
+        exporter.discard(exporter.write_batch(WALLET_TRANSACTIONS, [txn], "run1"))
+        assert not list(Path(root).rglob("*.parquet"))
+        assert exporter.checkpoint(WALLET_TRANSACTIONS) == {}
+
+        exporter.write_batch(WALLET_TRANSACTIONS, [txn], "run2")
+        exporter.commit(WALLET_TRANSACTIONS, "2026-10-06T00:00:00+00:00", 1)
+        exporter.commit(WALLET_TRANSACTIONS, "2026-10-07T00:00:00+00:00", 0)
+        checkpoint = exporter.checkpoint(WALLET_TRANSACTIONS)
+        assert checkpoint["exported_until"] == "2026-10-07T00:00:00+00:00"
+        assert checkpoint["rows"] == 1 and checkpoint["last_run_rows"] == 0
+        assert len(read_dataset(Path(root), WALLET_TRANSACTIONS)) == 1
+
+        with exporter.locked() as first, exporter.locked() as second:
+            assert first and not second
+    log("✅ The checkpoint moves only when a run commits, one run at a time")
+
+
+if __name__ == "__main__":
+    log("🚀 Starting Parquet export tests")
+    tests = [
+        test_records_land_in_local_day_partitions,
+        test_changed_records_are_appended_and_read_once,
+        test_checkpoint_advances_only_on_commit,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            log(f"❌ {test.__name__} failed: {e}")
+    log(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Offline tests for live rider positions in backend/rider_tracking.py
+No backend server or database needed
+"""
+
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+from rider_tracking import RiderTracker  # noqa: E402
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+
+def ping(t, lat=19.07, lng=72.87):
+    return (lat, lng, t, None, None, None)
+
+
+def test_latest_ignores_late_pings():
+    tracker = RiderTracker()
+    assert tracker.ingest("r1", [ping(100, lat=19.0), ping(110, lat=19.1)]) == 2
+    # An older batch arriving after reconnecting still goes to history
+    tracker.ingest("r1", [ping(105, lat=19.05)])
+    assert tracker.latest()["r1"][0] == 19.1
+    assert tracker.latest(max_age_seconds=60) == {}
+
+    pending, moved = tracker.take_pending()
+    assert [p[2] for _, p in pending] == [100, 110, 105]
+    assert moved == {"r1": ping(110, lat=19.1)}
+    assert tracker.take_pending() == ([], {})
+    assert tracker.stats()["stale"] == 1
+    log("✅ Late pings are kept for history but do not move the rider back")
+
+
+def test_buffer_cap_drops_oldest():
+    tracker = RiderTracker(max_buffered=5)
+    tracker.ingest("r1", [ping(t) for t in range(4)])
+    tracker.ingest("r2", [ping(t) for t in range(10, 14)])
+    pending, _ = tracker.take_pending()
+    assert [p[2] for _, p in pending] == [3, 10, 11, 12, 13]
+    assert tracker.stats()["dropped"] == 3
+    log("✅ A full buffer drops the oldest pings first")
+
+
+def test_requeued_batch_is_written_first():
+    tracker = RiderTracker()
+    tracker.ingest("r1", [ping(1), ping(2)])
+    pending, moved = tracker.take_pending()
+    tracker.ingest("r2", [ping(3)])
+    tracker.requeue(pending, moved)
+
+    pending, moved = tracker.take_pending()
+    assert [(r, p[2]) for r, p in pending] == [("r1", 1), ("r1", 2), ("r2", 3)]
+    assert set(moved) == {"r1", "r2"}
+    log("✅ A failed flush is retried ahead of newer pings")
+
+
+def test_nearest_skips_stale_positions():
+    tracker = RiderTracker()
+    now = time.time()
+    tracker.ingest("near-stale", [ping(now - 3600, lat=19.0700)])
+    tracker.ingest("mid", [ping(now, lat=19.0750)])
+    # Positions flushed by another worker only replace older ones
+    assert tracker.observe("far", ping(now - 5, lat=19.0900))
+    assert not tracker.observe("mid", ping(now - 60, lat=19.5))
+
+    nearest = tracker.nearest(19.0700, 72.87, k=5)
+    assert [rider_id for rider_id, _ in nearest] == ["mid", "far"]
+    assert abs(nearest[0][1] - 0.55) < 0.01
+    assert [r for r, _ in tracker.nearest(19.0700, 72.87, k=5, max_km=1.0)] == ["mid"]
+    log("✅ Nearest riders come from fresh positions, including other workers'")
+
+
+if __name__ == "__main__":
+    log("🚀 Starting rider tracking tests")
+    tests = [
+        test_latest_ignores_late_pings,
+        test_buffer_cap_drops_oldest,
+        test_requeued_batch_is_written_first,
+        test_nearest_skips_stale_positions,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            log(f"❌ {test.__name__} failed: {e}")
+    log(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the cached road-distance provider in backend/road_distance.py
+A local fake Distance Matrix server stands in for the Google API
+"""
+
+import json
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import googlemaps
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+from road_distance import (  # noqa: E402
+    MAX_ELEMENTS_PER_REQUEST,
+    MAX_POINTS_PER_SIDE,
+    DistanceCache,
+    RoadDistanceProvider,
+)
+from routing import haversine_distance, haversine_matrix  # noqa: E402
+
+MUMBAI_CENTER = (19.0760, 72.8777)
+ROAD_FACTOR = 1.3  # Fake road distance: 30% longer than straight line
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+
+class FakeDistanceMatrixHandler(BaseHTTPRequestHandler):
+    """Answers /maps/api/distancematrix/json with scaled haversine distances"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        origins = [tuple(map(float, p.split(","))) for p in params["origins"][0].split("|")]
+        destinations = [tuple(map(float, p.split(","))) for p in params["destinations"][0].split("|")]
+        server = self.server
+        server.calls += 1
+        server.max_elements = max(server.max_elements, len(origins) * len(destinations))
+        server.max_side = max(server.max_side, len(origins), len(destinations))
+
+        if server.fail:
+            body = {"status": "UNKNOWN_ERROR", "rows": []}
+        else:
+            rows = []
+            for o in origins:
+                elements = []
+                for d in destinations:
+                    if d in server.unroutable:
+                        elements.append({"status": "ZERO_RESULTS"})
+                        continue
+                    meters = round(haversine_distance(o, d) * ROAD_FACTOR * 1000)
+                    elements.append({"status": "OK", "distance": {"value": meters, "text": ""},
+                                     "duration": {"value": meters // 8, "text": ""}})
+                rows.append({"elements": elements})
+            body = {"status": "OK", "rows": rows}
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeDistanceMatrixServer:
+    def __enter__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeDistanceMatrixHandler)
+        self.httpd.calls = 0
+        self.httpd.max_elements = 0
+        self.httpd.max_side = 0
+        self.httpd.fail = False
+        self.httpd.unroutable = set()
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        host, port = self.httpd.server_address
+        self.client = googlemaps.Client(key="AIzaFakeKeyForTests", base_url=f"http://{host}:{port}",
+                                        retry_over_query_limit=False, retry_timeout=1)
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_points(n, seed=9):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        MUMBAI_CENTER[0] + rng.normal(0, 0.05, n),
+        MUMBAI_CENTER[1] + rng.normal(0, 0.05, n),
+    ]).round(4)
+
+
+def test_no_key_falls_back_to_haversine():
+    provider = RoadDistanceProvider(client=None)
+    points = make_points(20)
+    dist, source = provider.matrix(points)
+    assert source == "haversine"
+    assert np.allclose(dist, haversine_matrix(points))
+    assert provider.stats()["fallback_matrices"] == 1
+    log("✅ Without an API key distances fall back to haversine")
+
+
+def test_chunked_requests_and_persistent_cache():
+    points = make_points(30)
+    with tempfile.TemporaryDirectory() as tmp, FakeDistanceMatrixServer() as fake:
+        cache_path = Path(tmp) / "cache.sqlite3"
+        provider = RoadDistanceProvider(fake.client, DistanceCache(cache_path))
+        dist, source = provider.matrix(points)
+        assert source == "road"
+        assert np.allclose(dist, haversine_matrix(points) * ROAD_FACTOR, atol=2e-3)
+        assert fake.httpd.max_elements <= MAX_ELEMENTS_PER_REQUEST
+        assert fake.httpd.max_side <= MAX_POINTS_PER_SIDE
+        first_calls = fake.httpd.calls
+        assert first_calls == 9  # 30 points in 10 x 10 blocks
+
+        # A fresh provider on the same cache file makes no API calls
+        reopened = RoadDistanceProvider(fake.client, DistanceCache(cache_path))
+        again, _ = reopened.matrix(points)
+        assert fake.httpd.calls == first_calls
+        assert np.array_equal(again, dist)
+        stats = reopened.stats()
+        assert stats["cache_hit_rate"] == 1.0
+        assert stats["api_calls_saved"] == first_calls
+
+        # Only the pairs involving a new stop are fetched
+        more = np.vstack([points, [[19.1, 72.9]]])
+        reopened.matrix(more)
+        assert fake.httpd.calls == first_calls + 4
+    log("✅ Requests stay within element limits and the cache persists across restarts")
+
+
+def test_expired_entries_are_refetched():
+    points = make_points(5)
+    with FakeDistanceMatrixServer() as fake:
+        provider = RoadDistanceProvider(fake.client, DistanceCache(":memory:", ttl_seconds=-1))
+        provider.matrix(points)
+        provider.matrix(points)
+        assert fake.httpd.calls == 2
+        assert provider.cache.purge_expired() == 20
+    log("✅ Entries older than the TTL are fetched again")
+
+
+def test_api_failures_and_unroutable_pairs_use_haversine():
+    points = make_points(6)
+    with FakeDistanceMatrixServer() as fake:
+        fake.httpd.unroutable.add(tuple(points[0]))
+        provider = RoadDistanceProvider(fake.client, DistanceCache(":memory:"))
+        dist, _ = provider.matrix(points)
+        straight = haversine_matrix(points)
+        assert np.allclose(dist[1:, 0], straight[1:, 0])
+        assert np.allclose(dist[0, 1:], straight[0, 1:] * ROAD_FACTOR, atol=2e-3)
+
+        fake.httpd.fail = True
+        other = make_points(4, seed=1)
+        dist, source = provider.matrix(other)
+        assert source == "road"
+        assert np.allclose(dist, haversine_matrix(other), atol=1e-3)
+    log("✅ Unroutable pairs and API errors fall back to haversine")
+
+
+if __name__ == "__main__":
+    log("🚀 Starting road distance tests")
+    tests = [
+        test_no_key_falls_back_to_haversine,
+        test_chunked_requests_and_persistent_cache,
+        test_expired_entries_are_refetched,
+        test_api_failures_and_unroutable_pairs_use_haversine,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            log(f"❌ {test.__name__} failed: {e}")
+    log(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
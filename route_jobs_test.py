@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Offline tests for background route optimization jobs in backend/route_jobs.py
+Solves run in a real process pool; no backend server or database needed
+"""
+
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+from route_jobs import RouteJobManager  # noqa: E402
+from routing import haversine_matrix, route_distance  # noqa: E402
+
+MUMBAI_CENTER = (19.0760, 72.8777)
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+
+def make_points(n, seed=5):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        MUMBAI_CENTER[0] + rng.normal(0, 0.05, n),
+        MUMBAI_CENTER[1] + rng.normal(0, 0.05, n),
+    ])
+
+
+def wait_for(manager, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        snapshot = manager.snapshot(manager.get(job_id))
+        if snapshot["status"] not in ("queued", "running"):
+            return snapshot
+        assert 0.0 <= snapshot["progress"] <= 1.0
+        time.sleep(0.1)
+    raise AssertionError(f"Job {job_id} did not finish in {timeout}s")
+
+
+def test_job_returns_complete_routes():
+    points = make_points(200)
+    manager = RouteJobManager(max_workers=1)
+    try:
+        job_id = manager.submit(points, 10, 21, "sweep", 500, owner_id="vendor-1")
+        assert manager.get(job_id)["owner_id"] == "vendor-1"
+        snapshot = wait_for(manager, job_id)
+        assert snapshot["status"] == "completed", snapshot
+        assert snapshot["progress"] == 1.0
+
+        plan = snapshot["result"]
+        assert sorted(stop for route in plan.routes for stop in route) == list(range(len(points)))
+        dist = haversine_matrix(points)
+        assert np.allclose(plan.route_km, [route_distance(dist, r) for r in plan.routes])
+        # The shared-memory block is released once the job finishes
+        assert manager.get(job_id)["shm"] is None
+    finally:
+        manager.shutdown()
+    log("✅ Background job solves every stop and frees shared memory")
+
+
+def test_failed_job_reports_error():
+    manager = RouteJobManager(max_workers=1)
+    try:
+        job_id = manager.submit(make_points(50), 2, 10, "kmeans", 200, owner_id="vendor-1")
+        snapshot = wait_for(manager, job_id)
+        assert snapshot["status"] == "failed", snapshot
+        assert "exceed the capacity" in snapshot["error"]
+    finally:
+        manager.shutdown()
+    log("✅ Solver errors surface as failed jobs")
+
+
+def test_run_once_shares_one_task():
+    class Attempt:
+        def __init__(self, error=None):
+            self.error = error
+
+        def done(self):
+            return True
+
+        def cancelled(self):
+            return False
+
+        def exception(self):
+            return self.error
+
+    manager = RouteJobManager(max_workers=1)
+    job, started = {}, []
+
+    def start(error=None):
+        started.append(Attempt(error))
+        return started[-1]
+
+    failed = manager.run_once(job, "plan_task", lambda: start(RuntimeError("insert failed")))
+    # A failed attempt is replaced; a successful one is shared from then on
+    retried = manager.run_once(job, "plan_task", start)
+    assert retried is not failed
+    assert manager.run_once(job, "plan_task", start) is retried
+    assert len(started) == 2
+    log("✅ A job's follow-up task starts once and again only after failing")
+
+
+if __name__ == "__main__":
+    log("🚀 Starting route job tests")
+    tests = [
+        test_job_returns_complete_routes,
+        test_failed_job_reports_error,
+        test_run_once_shares_one_task,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            log(f"❌ {test.__name__} failed: {e}")
+    log(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the capacitated route solver in backend/routing.py
+Runs without a backend server or database
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+from routing import (  # noqa: E402
+    ROUTING_ALGORITHMS,
+    haversine_distance,
+    haversine_matrix,
+    plan_routes,
+    pool_routes,
+    repair_routes,
+    route_distance,
+    solve_routes,
+)
+
+# Clustered Mumbai-area delivery points
+MUMBAI_CENTER = (19.0760, 72.8777)
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+
+def make_points(n, seed=7):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        MUMBAI_CENTER[0] + rng.normal(0, 0.05, n),
+        MUMBAI_CENTER[1] + rng.normal(0, 0.05, n),
+    ])
+
+
+def test_distance_matrix_matches_haversine():
+    points = make_points(30)
+    dist = haversine_matrix(points)
+    for i in range(len(points)):
+        for j in range(len(points)):
+            expected = haversine_distance(tuple(points[i]), tuple(points[j]))
+            assert abs(dist[i, j] - expected) < 1e-3, (i, j, dist[i, j], expected)
+    log("✅ Distance matrix matches pairwise haversine")
+
+
+def test_every_algorithm_visits_each_stop_once():
+    points = make_points(120)
+    for algorithm in ROUTING_ALGORITHMS:
+        routes = solve_routes(points, 8, 16, algorithm, time_budget_ms=500)
+        visited = sorted(stop for route in routes for stop in route)
+        assert visited == list(range(len(points))), algorithm
+    log("✅ Every algorithm visits each stop exactly once")
+
+
+def test_solver_respects_capacity_and_keeps_riders_busy():
+    points = make_points(200)
+    for algorithm in ("sweep", "kmeans"):
+        routes = solve_routes(points, 10, 21, algorithm, time_budget_ms=500)
+        assert len(routes) == 10
+        assert max(len(r) for r in routes) <= 21, algorithm
+        assert min(len(r) for r in routes) > 0, algorithm
+    log("✅ Solver respects max_orders_per_rider")
+
+
+def test_solver_beats_greedy_baseline():
+    points = make_points(300)
+    dist = haversine_matrix(points)
+    greedy_km = sum(route_distance(dist, r) for r in solve_routes(points, 15, 21, "greedy"))
+    for algorithm in ("sweep", "kmeans"):
+        routes = solve_routes(points, 15, 21, algorithm, time_budget_ms=1000)
+        total_km = sum(route_distance(dist, r) for r in routes)
+        log(f"{algorithm}: {total_km:.1f} km vs greedy {greedy_km:.1f} km")
+        assert total_km < greedy_km, algorithm
+    log("✅ Local search improves on the greedy plan")
+
+
+def test_insufficient_capacity_is_rejected():
+    points = make_points(50)
+    try:
+        solve_routes(points, 4, 10, "sweep")
+    except ValueError:
+        log("✅ Over-capacity request rejected")
+        return
+    raise AssertionError("Expected ValueError for 50 orders on 4 x 10 capacity")
+
+
+def test_unknown_algorithm_is_rejected():
+    points = make_points(10)
+    try:
+        solve_routes(points, 2, 10, "simulated-annealing")
+    except ValueError:
+        log("✅ Unknown algorithm rejected")
+        return
+    raise AssertionError("Expected ValueError for unknown algorithm")
+
+
+def test_pickup_routes_start_at_their_restaurants():
+    points = make_points(150)
+    restaurants = np.array([[19.02, 72.84], [19.12, 72.90], [19.08, 72.95]])
+    pickup_of = [i % 3 for i in range(len(points))]
+    dist = haversine_matrix(np.vstack([points, restaurants]))
+    n = len(points)
+    for num_riders in (9, 2):  # Two riders for three restaurants forces shared routes
+        plan = plan_routes(points, num_riders, 80, "sweep", 500,
+                           pickup_coords=restaurants, pickup_of=pickup_of)
+        assert sorted(stop for route in plan.routes for stop in route) == list(range(n))
+        for route, route_pickups, km in zip(plan.routes, plan.pickups, plan.route_km):
+            assert {pickup_of[stop] for stop in route} == set(route_pickups)
+            # Reported km cover the pickup legs as well as the deliveries
+            full_path = [n + p for p in route_pickups] + route
+            assert abs(km - route_distance(dist, full_path)) < 1e-9
+        assert len(plan.routes) == num_riders
+    log("✅ Pickup routes start at the restaurants of their orders")
+
+
+def test_makespan_objective_finishes_earlier():
+    points = make_points(300)
+    finishes = {}
+    for objective in ("distance", "makespan"):
+        plan = plan_routes(points, 15, 21, "sweep", 1000, objective=objective)
+        finishes[objective] = max(plan.finish_minutes)
+    log(f"latest finish: {finishes['makespan']:.0f} min (makespan) vs {finishes['distance']:.0f} min (distance)")
+    assert finishes["makespan"] < finishes["distance"]
+    log("✅ Makespan objective brings the last delivery forward")
+
+
+def test_time_window_cuts_late_stops():
+    points = make_points(120)
+    full = plan_routes(points, 4, 30, "sweep", 300)
+    window = 90
+    plan = plan_routes(points, 4, 30, "sweep", 300, window_minutes=window)
+    assert plan.unserved, "expected some stops to miss a 90 minute window"
+    assert all(eta <= window for etas in plan.etas for eta in etas)
+    served = sorted(stop for route in plan.routes for stop in route)
+    assert sorted(served + plan.unserved) == list(range(len(points)))
+    # ETAs follow the legs: 30 km/h driving plus 5 minutes at each earlier stop
+    dist = haversine_matrix(points)
+    route = full.routes[0]
+    expected = sum(dist[route[k], route[k + 1]] for k in range(3)) * 2 + 3 * 5
+    assert abs(full.etas[0][3] - expected) < 1e-6
+    assert abs(full.finish_minutes[0] - (full.etas[0][-1] + 5)) < 1e-9
+    log(f"✅ {len(plan.unserved)} stops beyond the window reported as unserved")
+
+
+def test_repair_inserts_new_stops_and_keeps_locked_ones():
+    points = make_points(130)
+    dist = haversine_matrix(points)
+    plan = plan_routes(points[:120], 6, 21, "sweep", 300, dist=dist[:120, :120])
+    # Rider 1 has already collected its first two stops
+    locked = set(plan.routes[1][:2])
+    routes, unassigned = repair_routes(dist, plan.routes, 26, insert=range(120, 130),
+                                       removed=[1], locked=locked)
+    assert unassigned == []
+    assert sorted(stop for route in routes for stop in route) == list(range(130))
+    assert routes[1] == plan.routes[1][:2]
+    assert max(len(route) for route in routes) <= 26
+
+    # Redistributing one rider's stops should not blow up the plan
+    repaired_km = sum(route_distance(dist, route) for route in routes)
+    assert repaired_km < sum(plan.route_km) * 1.5
+
+    # Without spare capacity the extra stops are reported, not forced in
+    capacity = max(len(route) for route in plan.routes)
+    free = sum(capacity - len(route) for route in plan.routes)
+    full, unassigned = repair_routes(dist, plan.routes, capacity, insert=range(120, 130))
+    assert len(unassigned) == 10 - free
+    assert max(len(route) for route in full) == capacity
+    log(f"✅ Repair slots in new stops ({repaired_km:.1f} km) and leaves locked stops in place")
+
+
+def test_pooling_nearby_restaurants_saves_rider_km():
+    points = make_points(120, seed=3)
+    # Three restaurants about a kilometre apart, each with a full load of orders
+    restaurants = np.array([[19.070, 72.868], [19.077, 72.877], [19.066, 72.884]])
+    pickup_of = [i % 3 for i in range(120)]
+    pooled = pool_routes(points, restaurants, pickup_of, 6, 20, "sweep", 600)
+    plan = pooled.plan
+    assert sorted(stop for route in plan.routes for stop in route) == list(range(120))
+    assert any(len(pickups) > 1 for pickups in plan.pickups)
+    for route, pickups in zip(plan.routes, plan.pickups):
+        assert {pickup_of[stop] for stop in route} <= set(pickups)
+    assert pooled.separate_riders == 6
+    saved = pooled.separate_km - sum(plan.route_km)
+    assert saved > 0
+    log(f"✅ Pooling three restaurants saves {saved:.1f} rider-km of {pooled.separate_km:.1f}")
+
+
+if __name__ == "__main__":
+    log("🚀 Starting route solver tests")
+    tests = [
+        test_distance_matrix_matches_haversine,
+        test_every_algorithm_visits_each_stop_once,
+        test_solver_respects_capacity_and_keeps_riders_busy,
+        test_solver_beats_greedy_baseline,
+        test_insufficient_capacity_is_rejected,
+        test_unknown_algorithm_is_rejected,
+        test_pickup_routes_start_at_their_restaurants,
+        test_makespan_objective_finishes_earlier,
+        test_time_window_cuts_late_stops,
+        test_repair_inserts_new_stops_and_keeps_locked_ones,
+        test_pooling_nearby_restaurants_saves_rider_km,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            log(f"❌ {test.__name__} failed: {e}")
+    log(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
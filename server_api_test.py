@@ -0,0 +1,645 @@
+#!/usr/bin/env python3
+"""
+Offline tests for API handlers in backend/server.py
+Runs against an in-memory database (mongomock_motor, installed by
+backend/requirements-dev.txt); no backend server or MongoDB needed.
+Startup tasks are not run.
+"""
+
+import asyncio
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import server  # noqa: E402
+from rider_tracking import RiderTracker  # noqa: E402
+from parquet_export import WALLET_TRANSACTIONS, ParquetExporter, read_dataset  # noqa: E402
+
+client = TestClient(server.app)
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+
+def fresh_db():
+    """An empty database for one test"""
+    server.db = AsyncMongoMockClient()["server_api_test"]
+    return server.db
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_user(role, **fields):
+    user_id = str(uuid.uuid4())
+    name = fields.pop("name", f"{role} {user_id[:6]}")
+    email = fields.pop("email", f"{user_id[:8]}@example.com")
+    return {
+        "id": user_id, "email": email, "name": name, "role": role, "password": "x",
+        "created_at": "2026-01-01T00:00:00+00:00", "wallet_balance": 0.0,
+        "search_keys": server.user_search_keys(name, email, fields.get("phone")), **fields,
+    }
+
+
+def auth(user):
+    return {"Authorization": "Bearer " + server.create_access_token({"user_id": user['id'], "role": user['role']})}
+
+
+def test_customer_pages_follow_the_cursor():
+    db = fresh_db()
+    admin = make_user("admin")
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    # Pairs share a timestamp, so the cursor has to break ties on id
+    customers = [make_user("customer", created_at=(start + timedelta(minutes=i // 2)).isoformat()) for i in range(120)]
+    run(db.users.insert_many([admin, *customers]))
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        response = client.get("/api/admin/customers", params={"limit": 50, **({"cursor": cursor} if cursor else {})},
+                              headers=auth(admin))
+        assert response.status_code == 200
+        page = response.json()
+        assert isinstance(page, list) and len(page) <= 50
+        assert all("password" not in user and "search_keys" not in user for user in page)
+        seen += [user['id'] for user in page]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert pages == 3
+    assert len(seen) == len(set(seen)) == 120
+    expected = sorted(customers, key=lambda user: (user['created_at'], user['id']), reverse=True)
+    assert seen == [user['id'] for user in expected]
+
+    assert client.get("/api/admin/customers", params={"limit": 500}, headers=auth(admin)).status_code == 400
+    assert client.get("/api/admin/customers", params={"cursor": "not-a-cursor"}, headers=auth(admin)).status_code == 400
+    assert client.get("/api/admin/customers", headers=auth(customers[0])).status_code == 403
+    log("✅ Customer pages are capped and the cursor walks every customer once")
+
+
+def test_user_search_returns_its_cursor():
+    db = fresh_db()
+    admin = make_user("admin")
+    ashas = [make_user("customer", name=f"Asha Patel {i}", created_at=f"2026-02-0{i + 1}T00:00:00+00:00")
+             for i in range(5)]
+    run(db.users.insert_many([admin, make_user("rider", name="Asha Rider"), *ashas]))
+
+    first = client.get("/api/admin/users", params={"q": "asha", "role": "customer", "limit": 3},
+                       headers=auth(admin)).json()
+    assert [user['name'] for user in first['users']] == ["Asha Patel 4", "Asha Patel 3", "Asha Patel 2"]
+    assert server.decode_user_cursor(first['next_cursor']) == (ashas[2]['created_at'], ashas[2]['id'])
+    second = client.get("/api/admin/users", params={"q": "patel", "role": "customer", "limit": 3,
+                                                    "cursor": first['next_cursor']}, headers=auth(admin)).json()
+    assert [user['name'] for user in second['users']] == ["Asha Patel 1", "Asha Patel 0"]
+    assert second['next_cursor'] is None
+    log("✅ User search pages by keyset and matches any name word")
+
+
+def test_vendor_pages_carry_their_restaurant():
+    db = fresh_db()
+    admin = make_user("admin")
+    vendors = [make_user("vendor", name=f"Vendor {i:03d}") for i in range(130)]
+    run(db.users.insert_many([admin, *vendors]))
+    run(db.restaurants.insert_many([
+        {"id": f"r{i}", "vendor_id": vendor['id'], "name": f"Kitchen {i}", "is_active": True}
+        for i, vendor in enumerate(vendors[:10])
+    ]))
+
+    first = client.get("/api/admin/vendors", params={"sort": "name"}, headers=auth(admin)).json()
+    assert len(first) == server.ADMIN_PAGE_SIZE
+    assert first[0]['name'] == "Vendor 000" and first[0]['restaurant']['name'] == "Kitchen 0"
+    assert "_id" not in first[0]['restaurant'] and "password" not in first[0]
+    rest = client.get("/api/admin/vendors", params={"sort": "name", "skip": len(first)}, headers=auth(admin)).json()
+    assert len(rest) == 30 and rest[-1]['name'] == "Vendor 129" and rest[-1]['restaurant'] is None
+    last = client.get("/api/admin/vendors", params={"sort": "name", "descending": True, "limit": 1},
+                        headers=auth(admin)).json()
+    assert [vendor['name'] for vendor in last] == ["Vendor 129"]
+
+    assert client.get("/api/admin/vendors", params={"sort": "email"}, headers=auth(admin)).status_code == 400
+    assert client.get("/api/admin/vendors", params={"skip": -1}, headers=auth(admin)).status_code == 400
+    assert client.get("/api/admin/vendors", headers=auth(vendors[0])).status_code == 403
+    log("✅ Vendor pages are bounded and each vendor carries its restaurant")
+
+
+def test_rider_pages_rank_by_deliveries():
+    db = fresh_db()
+    admin = make_user("admin")
+    riders = [make_user("rider", name=f"Rider {i:03d}") for i in range(110)]
+    run(db.users.insert_many([admin, *riders]))
+    run(db.orders.insert_many(
+        [{"id": f"d{i}", "rider_id": riders[i % 3]['id'], "status": "delivered"} for i in range(6)]
+        + [{"id": "active", "rider_id": riders[2]['id'], "status": "out-for-delivery"},
+           {"id": "gone", "rider_id": riders[2]['id'], "status": "cancelled"}]
+    ))
+
+    first = client.get("/api/admin/riders", headers=auth(admin)).json()
+    assert len(first) == server.ADMIN_PAGE_SIZE
+    rest = client.get("/api/admin/riders", params={"skip": len(first)}, headers=auth(admin)).json()
+    assert len(rest) == 10
+    assert len({rider['id'] for rider in first + rest}) == 110
+
+    ranked = client.get("/api/admin/riders", params={"sort": "total_deliveries", "descending": True, "limit": 3},
+                        headers=auth(admin)).json()
+    assert {rider['id'] for rider in ranked} == {rider['id'] for rider in riders[:3]}
+    stats = {rider['id']: rider['stats'] for rider in ranked}
+    assert stats[riders[2]['id']] == {"total_deliveries": 2, "active_deliveries": 1}
+    assert all("password" not in rider for rider in ranked)
+    assert client.get("/api/admin/riders", params={"limit": 0}, headers=auth(admin)).status_code == 400
+
+    run(db.orders.update_many({"id": {"$in": ["d0", "d3"]}}, {"$set": {"delivered_on_time": True}}))
+    run(db.route_plans.insert_one({"id": "p1", "routes": [
+        {"rider_id": riders[0]['id'], "total_distance_km": 12.5}, {"rider_id": None, "total_distance_km": 3.0}
+    ]}))
+    page = client.get("/api/admin/riders", params={"sort": "name", "limit": 1, "include_performance": True},
+                      headers=auth(admin)).json()
+    assert page[0]['stats'] == {
+        "total_deliveries": 2, "active_deliveries": 0, "timed_deliveries": 2, "on_time_rate": 1.0,
+        "assigned_routes": 1, "planned_distance_km": 12.5,
+    }
+    log("✅ Rider pages are bounded and ranked by one grouped count")
+
+
+def seed_ready_orders(db, vendor, count, restaurant_id="r1", seed=1):
+    """A restaurant of ``vendor`` with ``count`` ready orders around Mumbai"""
+    rng = random.Random(seed)
+    run(db.restaurants.insert_one({"id": restaurant_id, "vendor_id": vendor['id'], "name": "Kitchen", "is_active": True}))
+    orders = [{
+        "id": f"{restaurant_id}-o{i}", "status": "ready", "restaurant_id": restaurant_id, "customer_name": "Asha",
+        "total_amount": 100.0, "delivery_fee": 10.0, "placed_at": "2026-10-05T02:00:00+00:00",
+        "delivery_slot": "2030-01-05 Morning (7-11 AM)",
+        "delivery_latitude": 19.07 + rng.gauss(0, 0.03), "delivery_longitude": 72.87 + rng.gauss(0, 0.03),
+    } for i in range(count)]
+    run(db.orders.insert_many(orders))
+    return [order['id'] for order in orders]
+
+
+def test_finished_job_is_stored_once():
+    db = fresh_db()
+    vendor = make_user("vendor")
+    run(db.users.insert_one(vendor))
+    order_ids = seed_ready_orders(db, vendor, 30)
+    body = {"order_ids": order_ids, "num_riders": 3, "algorithm": "sweep", "time_budget_ms": 100}
+    job = client.post("/api/vendor/optimize-routes/jobs", json=body, headers=auth(vendor)).json()
+    save_route_plan = server.save_route_plan
+
+    async def slow_save(*args, **kwargs):
+        # Give the other polls time to arrive while the plan is being stored
+        await asyncio.sleep(0.05)
+        return await save_route_plan(*args, **kwargs)
+    server.save_route_plan = slow_save
+    try:
+        deadline = time.time() + 60
+        while server.route_jobs.snapshot(server.route_jobs.get(job['job_id']))['status'] in ("queued", "running"):
+            assert time.time() < deadline, "job did not finish"
+            time.sleep(0.1)
+
+        async def poll_together():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as concurrent:
+                return await asyncio.gather(*[
+                    concurrent.get(f"/api/vendor/optimize-routes/jobs/{job['job_id']}", headers=auth(vendor))
+                    for _ in range(4)
+                ])
+        polls = [response.json() for response in run(poll_together())]
+        polls.append(client.get(f"/api/vendor/optimize-routes/jobs/{job['job_id']}", headers=auth(vendor)).json())
+        assert all(poll['status'] == "completed" for poll in polls)
+        assert len({poll['result']['plan_id'] for poll in polls}) == 1
+        assert run(db.route_plans.count_documents({})) == 1
+        # Jobs are only visible to the vendor who submitted them
+        other = make_user("vendor")
+        run(db.users.insert_one(other))
+        assert client.get(f"/api/vendor/optimize-routes/jobs/{job['job_id']}", headers=auth(other)).status_code == 404
+    finally:
+        server.save_route_plan = save_route_plan
+        server.route_jobs.shutdown()
+    log("✅ Concurrent polls of a finished job store one plan")
+
+
+def test_batch_assign_reports_every_rejection():
+    db = fresh_db()
+    vendor, other_vendor = make_user("vendor"), make_user("vendor")
+    riders = [make_user("rider", active_deliveries=0, last_assigned_at=None) for _ in range(3)]
+    run(db.users.insert_many([vendor, other_vendor, *riders]))
+    mine = seed_ready_orders(db, vendor, 6)
+    theirs = seed_ready_orders(db, other_vendor, 1, restaurant_id="r2")
+    run(db.orders.update_one({"id": mine[5]}, {"$set": {"status": "preparing"}}))
+    # An earlier delivery of riders[2] holds sequence 1, so writing a second one fails
+    run(db.orders.insert_one({"id": "earlier", "status": "out-for-delivery", "restaurant_id": "r1",
+                              "rider_id": riders[2]['id'], "delivery_sequence": 1}))
+    run(db.orders.create_index([("rider_id", 1), ("delivery_sequence", 1)], unique=True, sparse=True))
+    run(db.route_plans.insert_one({"id": "plan-1", "created_by": vendor['id'], "routes": [
+        {"rider_index": i, "rider_id": None, "stops": []} for i in (1, 2, 3)
+    ]}))
+
+    response = client.post("/api/vendor/batch-assign-riders", headers=auth(vendor), json={"plan_id": "plan-1", "routes": [
+        {"rider_index": 1, "rider_id": riders[0]['id'], "order_ids": [mine[0], mine[1], theirs[0], mine[5]]},
+        {"rider_index": 2, "rider_id": "no-such-rider", "order_ids": [mine[2]]},
+        {"rider_index": 3, "rider_id": riders[2]['id'], "order_ids": [mine[3], mine[0]]},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    results = {result['order_id']: result for result in body['results']}
+    assert [results[order_id]['status'] for order_id in (mine[0], mine[1])] == ["assigned", "assigned"]
+    assert results[theirs[0]]['detail'] == "order not found"
+    assert results[mine[5]]['detail'] == "order is preparing, not ready"
+    assert results[mine[2]]['detail'] == "rider not found"
+    assert results[mine[3]]['status'] == "rejected" and results[mine[3]]['detail'].startswith("write failed")
+    assert body['assigned_count'] == 2 and any("more than one route" in error for error in body['errors'])
+
+    assert run(db.orders.find_one({"id": theirs[0]}))['status'] == "ready"
+    assert run(db.orders.find_one({"id": mine[3]}))['status'] == "ready"
+    loads = {user['id']: user['active_deliveries'] for user in run(db.users.find({"role": "rider"}).to_list(None))}
+    assert loads == {riders[0]['id']: 2, riders[1]['id']: 0, riders[2]['id']: 0}
+    # Only the rider who got orders is recorded on the plan
+    plan = run(db.route_plans.find_one({"id": "plan-1"}))
+    assert [route['rider_id'] for route in plan['routes']] == [riders[0]['id'], None, None]
+    assert counters(db)['orders'] == {"ready": -2, "out-for-delivery": 2}
+    log("✅ Batch assignment applies what it can and reports each rejection")
+
+
+def test_rider_loads_follow_transitions():
+    db = fresh_db()
+    first, second = make_user("rider", active_deliveries=0, last_assigned_at=None), make_user("rider")
+    run(db.users.insert_many([first, second]))
+    seed_ready_orders(db, make_user("vendor"), 3)
+
+    def loads():
+        return {rider['id']: rider.get('active_deliveries') for rider in run(db.users.find({"role": "rider"}).to_list(None))}
+
+    # A rider inserted without a load is available like one with none
+    assert {rider['id'] for rider in run(server.load_available_riders())} == {first['id'], second['id']}
+
+    now = datetime.now(timezone.utc).isoformat()
+    for order_id in ("r1-o0", "r1-o1"):
+        run(server.transition_order(order_id, {"status": "out-for-delivery", "rider_id": first['id'], "updated_at": now}))
+    assert loads() == {first['id']: 2, second['id']: None}
+    assert [rider['id'] for rider in run(server.load_available_riders(max_active_deliveries=1))] == [second['id']]
+    # Handing an order to another rider moves it between their loads
+    run(server.transition_order("r1-o1", {"rider_id": second['id'], "updated_at": now}))
+    assert loads() == {first['id']: 1, second['id']: 1}
+    run(server.transition_order("r1-o0", {"status": "delivered", "updated_at": now}))
+    run(server.transition_order("r1-o1", {"status": "cancelled", "updated_at": now}))
+    assert loads() == {first['id']: 0, second['id']: 0}
+
+    # Drift that lasts is corrected; a rider already right is left alone
+    run(db.users.update_one({"id": first['id']}, {"$set": {"active_deliveries": 3}}))
+    server.RIDER_LOADS_SETTLE_SECONDS, settle = 0, server.RIDER_LOADS_SETTLE_SECONDS
+    try:
+        assert run(server.verify_rider_loads()) == {first['id']: -3}
+        assert run(server.verify_rider_loads()) == {}
+    finally:
+        server.RIDER_LOADS_SETTLE_SECONDS = settle
+    assert loads() == {first['id']: 0, second['id']: 0}
+    log("✅ Rider loads move with each transition and drift is corrected")
+
+
+def counters(db):
+    return run(db.counters.find_one({"_id": server.PLATFORM_COUNTERS_ID})) or {}
+
+
+def test_status_changes_move_counters():
+    db = fresh_db()
+    # A new order only adds to its status
+    assert server.status_change_counters(None, "placed", 120.0) == {"orders.placed": 1}
+    assert server.status_change_counters("ready", "ready", 120.0) == {}
+    assert server.status_change_counters("out-for-delivery", "delivered", 120.0) == {
+        "orders.out-for-delivery": -1, "orders.delivered": 1, "revenue.delivered": 120.0,
+    }
+    run(db.orders.insert_one({"id": "o1", "status": "placed", "restaurant_id": "r1", "total_amount": 120.0,
+                              "placed_at": "2026-10-05T02:00:00+00:00"}))
+    run(db.counters.insert_one({"_id": server.PLATFORM_COUNTERS_ID, "orders": {"placed": 1}, "version": 0}))
+
+    now = datetime.now(timezone.utc).isoformat()
+    run(server.transition_order("o1", {"status": "delivered", "updated_at": now}))
+    run(server.transition_order("o1", {"status": "delivered", "updated_at": now}))
+    stored = counters(db)
+    assert stored['orders'] == {"placed": 0, "delivered": 1}
+    assert stored['revenue'] == {"delivered": 120.0}
+    assert stored['in_flight'] == 0 and stored['version'] == 4
+    log("✅ Status changes move one order between counters, once")
+
+
+def test_verify_overwrites_only_quiet_recounts():
+    db = fresh_db()
+    admin = make_user("admin")
+    run(db.users.insert_many([admin, make_user("customer"), make_user("customer")]))
+    run(db.orders.insert_one({"id": "o1", "status": "delivered", "total_amount": 80.0}))
+    run(db.counters.insert_one({"_id": server.PLATFORM_COUNTERS_ID, "users": {"customer": 5}, "version": 7}))
+    server.COUNTERS_QUIET_ATTEMPTS, attempts = 1, server.COUNTERS_QUIET_ATTEMPTS
+    try:
+        report = client.post("/api/admin/counters/verify", headers=auth(admin)).json()
+        assert report['applied'] and report['drift']["users.customer"] == -3
+        stored = counters(db)
+        assert stored['users'] == {"admin": 1, "customer": 2} and stored['revenue'] == {"delivered": 80.0}
+
+        async def verify_during_write():
+            async with server.counted_write() as counts:
+                await db.users.insert_one(make_user("rider"))
+                # The recount sees the rider before its counter does
+                report = await server.verify_platform_counters()
+                counts["users.rider"] = 1
+            return report
+        assert not run(verify_during_write())['applied']
+        assert counters(db)['users'] == {"admin": 1, "customer": 2, "rider": 1}
+
+        # A worker that died mid-write leaves its mark; it is cleared once it has held for a whole run
+        server.counters_stuck_in_flight = 0
+        run(db.counters.update_one({"_id": server.PLATFORM_COUNTERS_ID}, {"$inc": {"in_flight": 1}}))
+        assert not run(server.verify_platform_counters())['applied']
+        assert run(server.verify_platform_counters())['applied']
+        assert counters(db)['in_flight'] == 0
+    finally:
+        server.COUNTERS_QUIET_ATTEMPTS = attempts
+        server.counters_stuck_in_flight = 0
+    vendor = make_user("vendor")
+    run(db.users.insert_one(vendor))
+    assert client.post("/api/admin/counters/verify", headers=auth(vendor)).status_code == 403
+    log("✅ The verifier corrects drift but never a recount that raced a write")
+
+
+def test_admin_stats_read_the_counters():
+    db = fresh_db()
+    admin = make_user("admin")
+    run(db.users.insert_many([admin, make_user("customer"), make_user("vendor"), make_user("rider")]))
+    run(db.restaurants.insert_many([{"id": "r1", "is_active": True}, {"id": "r2", "is_active": False}]))
+    run(db.orders.insert_many([
+        {"id": "o1", "status": "delivered", "total_amount": 80.0},
+        {"id": "o2", "status": "delivered", "total_amount": 120.0},
+        {"id": "o3", "status": "preparing", "total_amount": 60.0},
+        {"id": "o4", "status": "cancelled", "total_amount": 40.0},
+    ]))
+    # The first read has no counters yet and recounts them
+    stats = client.get("/api/admin/stats", headers=auth(admin)).json()
+    assert stats['users'] == {"total_customers": 1, "total_vendors": 1, "total_riders": 1, "total_users": 3}
+    assert stats['orders'] == {"total_orders": 4, "delivered_orders": 2, "active_orders": 1, "cancelled_orders": 1}
+    assert stats['revenue'] == {"total_revenue": 200.0, "average_order_value": 100.0}
+    assert stats['restaurants'] == {"total_restaurants": 2, "active_restaurants": 1}
+    assert counters(db)['in_flight'] == 0
+
+    # Later reads come from the counters alone
+    run(db.counters.update_one({"_id": server.PLATFORM_COUNTERS_ID}, {"$inc": {"orders.delivered": 1}}))
+    stats = client.get("/api/admin/stats", headers=auth(admin)).json()
+    assert stats['orders']['delivered_orders'] == 3 and stats['orders']['total_orders'] == 5
+    customer = run(db.users.find_one({"role": "customer"}))
+    assert client.get("/api/admin/stats", headers=auth(customer)).status_code == 403
+    log("✅ Dashboard stats come from the platform counters, recounted only when missing")
+
+
+def test_repair_stays_within_the_vendors_orders():
+    db = fresh_db()
+    vendor, other = make_user("vendor"), make_user("vendor")
+    run(db.users.insert_many([vendor, other]))
+    own = seed_ready_orders(db, vendor, 6)
+    foreign = seed_ready_orders(db, other, 2, restaurant_id="r2", seed=2)
+    rider = make_user("rider")
+    body = {
+        "routes": [{"rider_index": 0, "rider_id": rider['id'], "order_ids": own[:3] + foreign[:1]},
+                   {"rider_index": 1, "order_ids": own[3:5]}],
+        "new_order_ids": [own[5], foreign[1]],
+    }
+    response = client.post("/api/vendor/optimize-routes/repair", json=body, headers=auth(vendor))
+    assert response.status_code == 200, response.text
+    result = response.json()
+    routed = sorted(order['id'] for route in result['routes'] for order in route['orders'])
+    assert routed == sorted(own)
+    assert result['routes'][0]['rider_id'] == rider['id']
+
+    # The repaired plan is stored as a proposal, not as any rider's manifest
+    stored = run(db.route_plans.find_one({"id": result['plan_id']}))
+    assert stored['created_by'] == vendor['id'] and stored['source'] == "repair"
+    assert all(route['rider_id'] is None for route in stored['routes'])
+
+    # Only the vendor's own plans can be repaired, and not those with pickup legs
+    repair_other = client.post("/api/vendor/optimize-routes/repair", json={"plan_id": result['plan_id']},
+                               headers=auth(other))
+    assert repair_other.status_code == 404
+    run(db.route_plans.update_one({"id": result['plan_id']}, {"$set": {"include_pickups": True}}))
+    repair_pickups = client.post("/api/vendor/optimize-routes/repair", json={"plan_id": result['plan_id']},
+                                 headers=auth(vendor))
+    assert repair_pickups.status_code == 400
+    log("✅ Repair only touches the vendor's orders and stores a rider-free proposal")
+
+
+def test_parquet_export_picks_up_datetime_stamps():
+    db = fresh_db()
+    admin, customer = make_user("admin"), make_user("customer")
+    run(db.users.insert_many([admin, customer]))
+    # An older row stamped with a BSON datetime beside the usual ISO string
+    run(db.wallet_transactions.insert_many([
+        {"id": "t1", "user_id": customer['id'], "amount": 100.0, "status": "completed",
+         "created_at": "2026-10-05T02:00:00+00:00"},
+        {"id": "t2", "user_id": customer['id'], "amount": 50.0, "status": "completed",
+         "created_at": datetime(2026, 10, 5, 3, 0)},
+    ]))
+    credit = client.post("/api/admin/add-wallet-money", json={"user_id": customer['id'], "amount": 25.0},
+                         headers=auth(admin))
+    assert credit.status_code == 200, credit.text
+    stored = run(db.wallet_transactions.find_one({"payment_method": "admin_credit"}))
+    assert isinstance(stored['created_at'], str)
+
+    exporter = server.parquet_exporter
+    with tempfile.TemporaryDirectory() as root:
+        server.parquet_exporter = ParquetExporter(Path(root), server.DELIVERY_TIMEZONE)
+        try:
+            until = (datetime.now(timezone.utc) + timedelta(minutes=1)).isoformat()
+            assert run(server.export_parquet_dataset(WALLET_TRANSACTIONS, until)) == 3
+            assert sorted(read_dataset(Path(root), WALLET_TRANSACTIONS)['amount']) == [25.0, 50.0, 100.0]
+        finally:
+            server.parquet_exporter = exporter
+    log("✅ Parquet export includes ledger rows stamped as datetimes or strings")
+
+
+def test_checkout_is_charged_when_rollups_fail():
+    db = fresh_db()
+    customer = make_user("customer", wallet_balance=500.0)
+    run(db.users.insert_one(customer))
+    run(db.restaurants.insert_many([{"id": "r1", "vendor_id": "v1", "name": "Kitchen", "is_active": True},
+                                    {"id": "r2", "vendor_id": "v2", "name": "Bakery", "is_active": True}]))
+    # A corrupt rollup row makes every $inc on today's placed orders fail
+    today = server.rollup_day(datetime.now(timezone.utc).isoformat(), server.DELIVERY_TIMEZONE)
+    run(db.daily_rollups.insert_many([
+        {"date": today, "restaurant_id": restaurant_id, "status": "placed",
+         **dict.fromkeys(server.ROLLUP_FIELDS, "corrupt")} for restaurant_id in ("r1", "r2")
+    ]))
+    item = {"menu_item_id": "m1", "name": "Idli", "quantity": 2, "price": 40.0}
+    ordering_allowed, server.is_ordering_allowed = server.is_ordering_allowed, lambda: True
+    try:
+        single = client.post("/api/orders", json={"restaurant_id": "r1", "items": [item], "delivery_address": "Home"},
+                             headers=auth(customer))
+        assert single.status_code == 200, single.text
+        multi = client.post("/api/orders/multi-vendor", headers=auth(customer), json={
+            "restaurants": [{"restaurant_id": "r1", "items": [item]}, {"restaurant_id": "r2", "items": [item]}],
+            "delivery_address": "Home", "delivery_latitude": 19.07, "delivery_longitude": 72.87,
+        })
+        assert multi.status_code == 200, multi.text
+    finally:
+        server.is_ordering_allowed = ordering_allowed
+    assert run(db.orders.count_documents({})) == 3
+    debits = run(db.wallet_transactions.find({"transaction_type": "debit"}).to_list(None))
+    assert sorted(debit['amount'] for debit in debits) == [91.0, 182.0]
+    assert run(db.users.find_one({"id": customer['id']}))['wallet_balance'] == 500.0 - 91.0 - 182.0
+    log("✅ Orders are charged even when the analytics rollups cannot be updated")
+
+
+def test_checkout_is_charged_when_counters_fail():
+    db = fresh_db()
+    customer = make_user("customer", wallet_balance=500.0)
+    run(db.users.insert_one(customer))
+    run(db.restaurants.insert_one({"id": "r1", "vendor_id": "v1", "name": "Kitchen", "is_active": True}))
+    body = {"restaurant_id": "r1", "delivery_address": "Home",
+            "items": [{"menu_item_id": "m1", "name": "Idli", "quantity": 2, "price": 40.0}]}
+    ordering_allowed, server.is_ordering_allowed = server.is_ordering_allowed, lambda: True
+    try:
+        # The mark fails first, then only the deltas landing with the unmark;
+        # each failure is transient, the bad value goes away afterwards
+        for bad, repaired in (({"in_flight": "bad"}, {"in_flight": 0}), ({"orders": {"placed": "bad"}}, {"orders": {}})):
+            run(db.counters.update_one({"_id": server.PLATFORM_COUNTERS_ID}, {"$set": {"version": 0, **bad}}, upsert=True))
+            response = client.post("/api/orders", json=body, headers=auth(customer))
+            assert response.status_code == 200, response.text
+            run(db.counters.update_one({"_id": server.PLATFORM_COUNTERS_ID}, {"$set": repaired}))
+    finally:
+        server.is_ordering_allowed = ordering_allowed
+    assert run(db.wallet_transactions.count_documents({"transaction_type": "debit"})) == 2
+    assert run(db.users.find_one({"id": customer['id']}))['wallet_balance'] == 500.0 - 2 * 91.0
+
+    # The lost unmark leaves a stuck mark that the verifier clears with the recount
+    assert counters(db)['in_flight'] == 1
+    server.COUNTERS_QUIET_ATTEMPTS, attempts = 1, server.COUNTERS_QUIET_ATTEMPTS
+    try:
+        run(server.verify_platform_counters())
+        assert run(server.verify_platform_counters())['applied']
+    finally:
+        server.COUNTERS_QUIET_ATTEMPTS = attempts
+        server.counters_stuck_in_flight = 0
+    assert counters(db)['orders'] == {"placed": 2} and counters(db)['in_flight'] == 0
+    log("✅ Orders are charged even when the platform counters cannot be written")
+
+
+def test_rider_suggestions_rank_by_distance_and_load():
+    db = fresh_db()
+    vendor, other = make_user("vendor"), make_user("vendor")
+    run(db.users.insert_many([vendor, other]))
+    run(db.restaurants.insert_many([
+        {"id": "r1", "vendor_id": vendor['id'], "name": "Kitchen", "latitude": 19.07, "longitude": 72.87},
+        {"id": "r2", "vendor_id": other['id'], "name": "Bakery", "latitude": 19.07, "longitude": 72.87},
+    ]))
+    run(db.orders.insert_many([{"id": "o1", "restaurant_id": "r1", "status": "ready"},
+                               {"id": "o2", "restaurant_id": "r2", "status": "ready"}]))
+    # Name, km north of the restaurant, orders carried (None: inserted without a load)
+    placements = (("busy", 0.3, 2), ("idle", 2.0, 0), ("new", 3.0, None), ("full", 0.1, 4))
+    riders = {name: make_user("rider", name=name) for name, _, _ in placements}
+    for name, _, load in placements:
+        if load is not None:
+            riders[name]['active_deliveries'] = load
+    run(db.users.insert_many(list(riders.values())))
+    tracker, server.rider_tracker = server.rider_tracker, RiderTracker()
+    try:
+        for name, km, _ in placements:
+            server.rider_tracker.ingest(riders[name]['id'], [(19.07 + km / 111.2, 72.87, time.time(), None, None, None)])
+        response = client.post("/api/vendor/suggest-riders", json={"order_ids": ["o1", "o2"]}, headers=auth(vendor))
+        assert response.status_code == 200, response.text
+        result = response.json()
+        assert result['unknown_order_ids'] == ["o2"]
+        ranked = result['suggestions'][0]['riders']
+        # Distance plus LOAD_PENALTY_KM per order carried; over the load cap is left out
+        assert [r['name'] for r in ranked] == ["idle", "new", "busy"]
+        assert [r['active_deliveries'] for r in ranked] == [0, 0, 2]
+        assert client.post("/api/vendor/suggest-riders", json={"order_ids": ["o2"]},
+                           headers=auth(vendor)).status_code == 404
+    finally:
+        server.rider_tracker = tracker
+    log("✅ Rider suggestions rank by distance and load within the vendor's orders")
+
+
+def test_pooled_routes_stay_inside_the_area():
+    db = fresh_db()
+    admin = make_user("admin")
+    run(db.restaurants.insert_many([
+        {"id": "r1", "vendor_id": "v1", "name": "Kitchen", "latitude": 19.07, "longitude": 72.87},
+        {"id": "r2", "vendor_id": "v2", "name": "Far Kitchen", "latitude": 28.61, "longitude": 77.21},
+    ]))
+    def order(order_id, restaurant_id, point=None, address=None):
+        pin = {"delivery_latitude": point[0], "delivery_longitude": point[1]} if point else {}
+        return {"id": order_id, "status": "ready", "restaurant_id": restaurant_id, "delivery_address": address,
+                "delivery_slot": "2030-01-05 Morning (7-11 AM)", "total_amount": 100.0, **pin}
+    run(db.orders.insert_many([
+        *[order(f"o{i}", "r1", (19.07 + 0.005 * i, 72.87 - 0.004 * i)) for i in range(6)],
+        order("far", "r2", (28.6, 77.2)),
+        order("unpinned", "r1", address="Near Road"),
+        order("unpinned-far", "r2", address="Far Road"),
+    ]))
+    riders = [make_user("rider", latitude=19.07, longitude=72.87, active_deliveries=load) for load in (0, 0, 1)]
+    riders.append(make_user("rider", latitude=28.6, longitude=77.2, active_deliveries=0))
+    run(db.users.insert_many([admin, *riders]))
+
+    class Geocoder:
+        def __init__(self):
+            self.queries = []
+
+        def geocode_many(self, queries):
+            self.queries += list(queries)
+            return {query: (19.072, 72.872) for query in self.queries}
+
+    geocoder, server.geocoder = server.geocoder, Geocoder()
+    try:
+        body = {"latitude": 19.07, "longitude": 72.87, "radius_km": 5, "num_riders": 4, "max_orders_per_rider": 5}
+        response = client.post("/api/admin/optimize-routes/pooled", json=body, headers=auth(admin))
+        assert response.status_code == 200, response.text
+        result = response.json()
+        # Only the area's unpinned order is geocoded; far orders are never read
+        assert len(server.geocoder.queries) == 1 and "Near Road" in server.geocoder.queries[0]
+        routed = {order['id'] for route in result['routes'] for order in route['orders']}
+        assert "unpinned" in routed and "far" not in routed and result['total_orders'] == 7
+        # Four routes were asked for, but only two idle riders are in the area
+        assert result['riders_available'] == 2 and len(result['routes']) <= 2
+
+        body["max_orders_per_rider"] = 3
+        response = client.post("/api/admin/optimize-routes/pooled", json=body, headers=auth(admin))
+        assert response.status_code == 400 and "2 available riders" in response.json()['detail']
+    finally:
+        server.geocoder = geocoder
+    log("✅ Pooled routing reads only the area's orders and plans for its available riders")
+
+
+if __name__ == "__main__":
+    log("🚀 Starting server API tests")
+    tests = [
+        test_customer_pages_follow_the_cursor,
+        test_user_search_returns_its_cursor,
+        test_vendor_pages_carry_their_restaurant,
+        test_rider_pages_rank_by_deliveries,
+        test_finished_job_is_stored_once,
+        test_batch_assign_reports_every_rejection,
+        test_rider_loads_follow_transitions,
+        test_status_changes_move_counters,
+        test_verify_overwrites_only_quiet_recounts,
+        test_admin_stats_read_the_counters,
+        test_repair_stays_within_the_vendors_orders,
+        test_parquet_export_picks_up_datetime_stamps,
+        test_checkout_is_charged_when_rollups_fail,
+        test_checkout_is_charged_when_counters_fail,
+        test_rider_suggestions_rank_by_distance_and_load,
+        test_pooled_routes_stay_inside_the_area,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            log(f"❌ {test.__name__} failed: {e}")
+    log(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
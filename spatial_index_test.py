@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the grid spatial index in backend/spatial_index.py
+Every query is checked against a brute-force haversine scan
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+from routing import haversine_distance, haversine_matrix  # noqa: E402
+from spatial_index import SpatialIndex, bounding_box, knn_graph  # noqa: E402
+
+MUMBAI_CENTER = (19.0760, 72.8777)
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+
+def make_points(n, seed=11):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        MUMBAI_CENTER[0] + rng.normal(0, 0.08, n),
+        MUMBAI_CENTER[1] + rng.normal(0, 0.08, n),
+    ])
+
+
+def brute_force(points, lat, lng):
+    dists = [(i, haversine_distance((lat, lng), tuple(p))) for i, p in enumerate(points)]
+    return sorted(dists, key=lambda item: item[1])
+
+
+def test_nearest_matches_brute_force():
+    points = make_points(500)
+    index = SpatialIndex.from_points(points)
+    queries = make_points(50, seed=3)
+    for lat, lng in queries:
+        expected = [i for i, _ in brute_force(points, lat, lng)[:5]]
+        actual = [key for key, _ in index.nearest(lat, lng, k=5)]
+        assert actual == expected, (actual, expected)
+    log("✅ k-nearest matches brute force")
+
+
+def test_within_radius_matches_brute_force():
+    points = make_points(500)
+    index = SpatialIndex.from_points(points, cell_km=0.5)
+    for lat, lng in make_points(20, seed=5):
+        expected = [i for i, d in brute_force(points, lat, lng) if d <= 2.0]
+        actual = [key for key, _ in index.within_radius(lat, lng, 2.0)]
+        assert actual == expected
+    log("✅ Radius query matches brute force")
+
+
+def test_bounding_box_holds_the_radius():
+    points = make_points(500)
+    for lat, lng in make_points(20, seed=5):
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, 5.0)
+        inside = [i for i, d in brute_force(points, lat, lng) if d <= 5.0]
+        assert inside and all(min_lat <= points[i, 0] <= max_lat and min_lng <= points[i, 1] <= max_lng
+                              for i in inside)
+        # Tight enough to prefilter: about the circle's square, not a whole region
+        assert (max_lat - min_lat) * 110.574 < 10.5
+    log("✅ Bounding box holds every point within the radius")
+
+def test_moves_and_removals():
+    index = SpatialIndex(cell_km=1.0)
+    index.insert("rider-a", 19.07, 72.87)
+    index.insert("rider-b", 19.20, 72.85)
+    assert index.nearest(19.07, 72.87)[0][0] == "rider-a"
+
+    index.insert("rider-b", 19.0701, 72.8701)  # rider-b moves next to the query
+    index.remove("rider-a")
+    assert len(index) == 1
+    assert index.nearest(19.07, 72.87)[0][0] == "rider-b"
+    assert index.position("rider-b") == (19.0701, 72.8701)
+    assert index.nearest(19.07, 72.87, predicate=lambda key: key != "rider-b") == []
+    log("✅ Moves, removals and predicates are honoured")
+
+
+def test_max_km_bounds_the_search():
+    index = SpatialIndex.from_points([(19.07, 72.87), (19.30, 72.87)])
+    hits = index.nearest(19.07, 72.87, k=2, max_km=5)
+    assert [key for key, _ in hits] == [0]
+    log("✅ max_km limits nearest results")
+
+
+def test_knn_graph_matches_dense_matrix():
+    points = make_points(800)
+    dist = haversine_matrix(points)
+    np.fill_diagonal(dist, np.inf)
+    expected = np.argsort(dist, axis=1)[:, :8].tolist()
+    assert knn_graph(points, 8) == expected
+    log("✅ Batched k-NN graph matches the dense matrix")
+
+
+if __name__ == "__main__":
+    log("🚀 Starting spatial index tests")
+    tests = [
+        test_nearest_matches_brute_force,
+        test_within_radius_matches_brute_force,
+        test_bounding_box_holds_the_radius,
+        test_moves_and_removals,
+        test_max_km_bounds_the_search,
+        test_knn_graph_matches_dense_matrix,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            log(f"❌ {test.__name__} failed: {e}")
+    log(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)
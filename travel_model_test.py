@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Offline tests for learned travel speeds in backend/travel_model.py
+Synthetic delivery histories with known speed and dwell; no database needed
+"""
+
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+from routing import arrival_minutes, haversine_matrix, haversine_distance, plan_routes  # noqa: E402
+from travel_model import TravelModel, extract_legs, fit_travel_model  # noqa: E402
+
+MUMBAI_CENTER = (19.0760, 72.8777)
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+
+def make_history(speed_kmph, dwell, riders=20, stops=6, seed=3, day=datetime(2026, 10, 5, 7, 0, tzinfo=IST)):
+    """Trips from one restaurant, timed exactly by speed and dwell plus noise"""
+    rng = np.random.default_rng(seed)
+    pickup = MUMBAI_CENTER
+    deliveries = []
+    for rider in range(riders):
+        left = day + timedelta(minutes=float(rng.uniform(0, 30)))
+        clock, here = left, pickup
+        for _ in range(stops):
+            drop = (MUMBAI_CENTER[0] + rng.normal(0, 0.03), MUMBAI_CENTER[1] + rng.normal(0, 0.03))
+            minutes = haversine_distance(here, drop) / speed_kmph * 60 + dwell + rng.normal(0, 0.5)
+            clock += timedelta(minutes=minutes)
+            deliveries.append({
+                "rider_id": f"rider-{rider}", "latitude": drop[0], "longitude": drop[1],
+                "pickup_latitude": pickup[0], "pickup_longitude": pickup[1],
+                "out_for_delivery_at": left, "delivered_at": clock,
+            })
+            here = drop
+    return deliveries
+
+
+def test_fit_recovers_speed_and_dwell():
+    legs = extract_legs(make_history(speed_kmph=18, dwell=7), IST)
+    assert len(legs) == 120
+    assert {leg.hour for leg in legs} <= {7, 8, 9, 10}
+
+    model = TravelModel(fit_travel_model(legs))
+    minutes_per_km, dwell = model.lookup(*MUMBAI_CENTER, hour=7)
+    assert abs(60 / minutes_per_km - 18) < 1.5, 60 / minutes_per_km
+    assert abs(dwell - 7) < 0.7, dwell
+    # Hours without history use the overall fit
+    assert model.lookup(*MUMBAI_CENTER, hour=15) == (model._overall["minutes_per_km"], model._overall["dwell_minutes"])
+    log("✅ Speed and dwell are recovered from delivery timestamps")
+
+
+def test_default_model_keeps_fixed_etas():
+    rng = np.random.default_rng(8)
+    coords = np.column_stack([MUMBAI_CENTER[0] + rng.normal(0, 0.03, 30),
+                              MUMBAI_CENTER[1] + rng.normal(0, 0.03, 30)])
+    dist = haversine_matrix(coords)
+    path = list(range(30))
+    pace = TravelModel().pace(coords, datetime(2026, 10, 6, 7, 0, tzinfo=IST), hours=5)
+    assert np.allclose(arrival_minutes(dist, path), arrival_minutes(dist, path, pace))
+    log("✅ Without learned tables ETAs match the fixed 30 km/h and 5 min defaults")
+
+
+def test_learned_pace_moves_etas_and_window():
+    slow = TravelModel(fit_travel_model(extract_legs(make_history(speed_kmph=12, dwell=9), IST)))
+    rng = np.random.default_rng(4)
+    coords = np.column_stack([MUMBAI_CENTER[0] + rng.normal(0, 0.03, 60),
+                              MUMBAI_CENTER[1] + rng.normal(0, 0.03, 60)])
+    departure = datetime(2026, 10, 6, 7, 0, tzinfo=IST)
+    fixed = plan_routes(coords, 3, 20, "sweep", 200, window_minutes=240)
+    learned = plan_routes(coords, 3, 20, "sweep", 200, window_minutes=240,
+                          pace=slow.pace(coords, departure, hours=5))
+    assert not fixed.unserved
+    assert max(learned.finish_minutes) > max(fixed.finish_minutes)
+    # Slower riders cannot reach every stop inside the window
+    assert learned.unserved
+    log("✅ Learned speeds stretch ETAs and the delivery window cut-off")
+
+
+if __name__ == "__main__":
+    log("🚀 Starting travel model tests")
+    tests = [
+        test_fit_recovers_speed_and_dwell,
+        test_default_model_keeps_fixed_etas,
+        test_learned_pace_moves_etas_and_window,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            log(f"❌ {test.__name__} failed: {e}")
+    log(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    sys.exit(1 if failed else 0)